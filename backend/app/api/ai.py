@@ -1,7 +1,13 @@
-from fastapi import APIRouter, Depends
-from app.db.database import Session, get_session
+from fastapi import APIRouter, Depends, Response
+from app.db.database import AsyncSession, get_session
+from app.schemas.ai_job import AIJobResponse
 from app.schemas.task_tag import TaskResponseWithTags
-from app.services.ai_service import AIService
+from app.services.ai_jobs import AIJobService
+from app.services.ai_service import (
+    AIService,
+    BatchSmartTagRequest,
+    BatchSmartTagResponse,
+)
 from app.services.task_service import TaskService
 from app.services.tag_service import TagService
 
@@ -14,21 +20,61 @@ def get_ai_service() -> AIService:
 
 
 # Dependency for task_service
-def get_task_service(session: Session = Depends(get_session)) -> TaskService:
+def get_task_service(session: AsyncSession = Depends(get_session)) -> TaskService:
     return TaskService(session=session)
 
 
-def get_tag_service(session: Session = Depends(get_session)) -> TagService:
+def get_tag_service(session: AsyncSession = Depends(get_session)) -> TagService:
     return TagService(session=session)
 
 
-@router.post("/{task_id}", response_model=TaskResponseWithTags)
-def single_smart_tag(
+def get_ai_job_service(session: AsyncSession = Depends(get_session)) -> AIJobService:
+    return AIJobService(session=session)
+
+
+# Declared before "/{task_id}" so that "batch" is not parsed as a task id
+@router.post("/batch", response_model=BatchSmartTagResponse)
+async def batch_smart_tag(
+    batch_request: BatchSmartTagRequest,
+    session: AsyncSession = Depends(get_session),
+    ai_service: AIService = Depends(get_ai_service),
+):
+    return await ai_service.batch_smart_tag(
+        batch_request=batch_request,
+        task_service=TaskService(session),
+        tag_service=TagService(session),
+    )
+
+
+@router.get("/jobs/{job_id}", response_model=AIJobResponse)
+async def get_ai_job(
+    job_id: int, ai_job_service: AIJobService = Depends(get_ai_job_service)
+):
+    return ai_job_service.to_response(await ai_job_service.get_job(job_id))
+
+
+@router.post(
+    "/{task_id}",
+    response_model=TaskResponseWithTags,
+    responses={202: {"model": AIJobResponse, "description": "Job queued"}},
+)
+async def single_smart_tag(
     task_id: int,
-    session: Session = Depends(get_session),
+    # Answer right away with a job to poll at GET /ai/jobs/{id} instead of waiting for the LLM
+    background: bool = False,
+    session: AsyncSession = Depends(get_session),
     ai_service: AIService = Depends(get_ai_service),
 ):
-    return ai_service.single_smart_tag(
+    if background:
+        ai_job_service = AIJobService(session)
+        job = await ai_job_service.enqueue(task_id)
+        return Response(
+            content=ai_job_service.to_response(job).model_dump_json(),
+            status_code=202,
+            media_type="application/json",
+            headers={"Location": f"/ai/jobs/{job.id}"},
+        )
+    return await ai_service.single_smart_tag(
         task_id=task_id,
         task_service=TaskService(session),
         tag_service=TagService(session),
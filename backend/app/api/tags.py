@@ -1,46 +1,68 @@
-from fastapi import APIRouter, Depends, status, Query
+from fastapi import APIRouter, Depends, status, Query, Request
 from typing import Annotated
 
-from app.db.database import Session, get_session
+from app.db.database import AsyncSession, get_session
 from app.schemas.task_tag import TagCreate, TagUpdate, TagResponseWithTasks
+from app.services.pagination import NEXT_CURSOR_HEADER
+from app.services.response_cache import cached_response
 from app.services.tag_service import TagService
 
 router = APIRouter()
 
 
 # Dependency for tag_service
-def get_tag_service(session: Session = Depends(get_session)) -> TagService:
+def get_tag_service(session: AsyncSession = Depends(get_session)) -> TagService:
     return TagService(session=session)
 
 
 @router.post("/", response_model=TagResponseWithTasks)
-def create_tag(tag: TagCreate, tag_service: TagService = Depends(get_tag_service)):
-    return tag_service.create_tag(tag)
+async def create_tag(
+    tag: TagCreate, tag_service: TagService = Depends(get_tag_service)
+):
+    return await tag_service.create_tag(tag)
 
 
+# The GETs of single tags and tag pages answer 304 to an If-None-Match with their current ETag
 @router.get("/tag_page", response_model=list[TagResponseWithTasks])
-def get_tag_page(
+async def get_tag_page(
+    request: Request,
     offset: int = 0,
     limit: Annotated[int, Query(le=100)] = 100,
+    # opaque cursor from the X-Next-Cursor header of the previous page
+    after: str | None = None,
     tag_service: TagService = Depends(get_tag_service),
 ):
-    return tag_service.get_tag_page(offset=offset, limit=limit)
+    async def load():
+        tags = await tag_service.get_tag_page(offset=offset, limit=limit, after=after)
+        headers = {}
+        if tags and len(tags) == limit:
+            headers[NEXT_CURSOR_HEADER] = tag_service.get_tag_page_cursor(tags[-1])
+        return tags, headers
+
+    version = await tag_service.get_tags_version()
+    return await cached_response(request, version, list[TagResponseWithTasks], load)
 
 
 @router.get("/{tag_id}", response_model=TagResponseWithTasks)
-def get_tag(tag_id: int, tag_service: TagService = Depends(get_tag_service)):
-    return tag_service.get_tag(tag_id=tag_id)
+async def get_tag(
+    request: Request, tag_id: int, tag_service: TagService = Depends(get_tag_service)
+):
+    async def load():
+        return await tag_service.get_tag(tag_id=tag_id), {}
+
+    version = await tag_service.get_tag_version(tag_id)
+    return await cached_response(request, version, TagResponseWithTasks, load)
 
 
 @router.delete("/{tag_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_tag(tag_id: int, tag_service: TagService = Depends(get_tag_service)):
-    return tag_service.delete_tag(tag_id=tag_id)
+async def delete_tag(tag_id: int, tag_service: TagService = Depends(get_tag_service)):
+    return await tag_service.delete_tag(tag_id=tag_id)
 
 
 @router.patch("/{tag_id}/edit", response_model=TagResponseWithTasks)
-def edit_tag(
+async def edit_tag(
     tag_id: int,
     tag_update: TagUpdate,
     tag_service: TagService = Depends(get_tag_service),
 ):
-    return tag_service.edit_tag(tag_id=tag_id, tag_update=tag_update)
+    return await tag_service.edit_tag(tag_id=tag_id, tag_update=tag_update)
@@ -1,65 +1,210 @@
-from fastapi import APIRouter, Depends, status, Query
+from datetime import datetime
+from fastapi import APIRouter, Depends, status, Query, Request
+from fastapi.responses import StreamingResponse
 from typing import Annotated
 
-from app.db.database import Session, get_session
-from app.schemas.task_tag import TaskCreate, TaskUpdate, TaskResponseWithTags
-from app.services.task_service import TaskService
+from app.db.database import (
+    AsyncSession,
+    async_sessionmaker,
+    get_session,
+    get_session_maker,
+)
+from app.schemas.task_tag import (
+    TaskBulkUpdate,
+    TaskCreate,
+    TaskFilter,
+    TaskIds,
+    TaskImportResult,
+    TaskTagBulkResponse,
+    TaskTagPairs,
+    TaskUpdate,
+    TaskResponseWithTags,
+)
+from app.services.pagination import NEXT_CURSOR_HEADER
+from app.services.response_cache import cached_response
+from app.services.serialization import iter_lines, json_response
+from app.services.task_service import SearchOrder, TaskService, TaskPageOrder
 
 router = APIRouter()
 
 
 # Dependency for task_service
-def get_task_service(session: Session = Depends(get_session)) -> TaskService:
+def get_task_service(session: AsyncSession = Depends(get_session)) -> TaskService:
     return TaskService(session=session)
 
 
+# Dependency for the task page filters (query parameters, see TaskFilter)
+def get_task_filter(
+    is_done: bool | None = None,
+    scheduled_from: datetime | None = None,
+    scheduled_to: datetime | None = None,
+    created_from: datetime | None = None,
+    created_to: datetime | None = None,
+    has_tags: bool | None = None,
+    tag_ids: Annotated[list[int], Query()] = [],
+) -> TaskFilter:
+    return TaskFilter(
+        is_done=is_done,
+        scheduled_from=scheduled_from,
+        scheduled_to=scheduled_to,
+        created_from=created_from,
+        created_to=created_to,
+        has_tags=has_tags,
+        tag_ids=tag_ids,
+    )
+
+
 @router.post("/", response_model=TaskResponseWithTags)
-def create_task(
+async def create_task(
     task: TaskCreate, task_service: TaskService = Depends(get_task_service)
 ):
-    return task_service.create_task(task)
+    return await task_service.create_task(task)
+
+
+# The bulk routes are declared before the /{task_id} ones, so "bulk" is not read as a task id
+@router.post("/bulk", response_model=TaskIds)
+async def create_tasks(
+    tasks: list[TaskCreate], task_service: TaskService = Depends(get_task_service)
+):
+    return await task_service.create_tasks(tasks)
+
+
+@router.patch("/bulk", response_model=TaskIds)
+async def edit_tasks(
+    task_updates: list[TaskBulkUpdate],
+    task_service: TaskService = Depends(get_task_service),
+):
+    return await task_service.edit_tasks(task_updates)
+
+
+@router.delete("/bulk", response_model=TaskIds)
+async def delete_tasks(
+    task_ids: TaskIds, task_service: TaskService = Depends(get_task_service)
+):
+    return await task_service.delete_tasks(task_ids.ids)
+
+
+@router.get("/export")
+async def export_tasks(
+    session_maker: async_sessionmaker[AsyncSession] = Depends(get_session_maker),
+):
+    # NDJSON: one task (with its tags) per line, streamed without loading the whole table
+    async def stream():
+        async with session_maker() as session:
+            async for chunk in TaskService(session=session).export_tasks():
+                yield chunk
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+@router.post("/import", response_model=TaskImportResult)
+async def import_tasks(
+    request: Request, task_service: TaskService = Depends(get_task_service)
+):
+    # The NDJSON body is read as it arrives, not buffered
+    return await task_service.import_tasks(iter_lines(request.stream()))
+
+
+@router.patch("/bulk/tag", response_model=TaskTagBulkResponse)
+async def tag_many(
+    task_tags: TaskTagPairs, task_service: TaskService = Depends(get_task_service)
+):
+    return await task_service.tag_many(task_tags.pairs)
+
+
+@router.patch("/bulk/untag", response_model=TaskTagBulkResponse)
+async def untag_many(
+    task_tags: TaskTagPairs, task_service: TaskService = Depends(get_task_service)
+):
+    return await task_service.untag_many(task_tags.pairs)
 
 
+# The GETs of single tasks and task pages answer 304 to an If-None-Match with their current ETag
 @router.get("/task_page", response_model=list[TaskResponseWithTags])
-def get_task_page(
+async def get_task_page(
+    request: Request,
     offset: int = 0,
     limit: Annotated[int, Query(le=100)] = 100,
+    # opaque cursor from the X-Next-Cursor header of the previous page
+    after: str | None = None,
+    order_by: TaskPageOrder = "id",
+    filters: TaskFilter = Depends(get_task_filter),
+    task_service: TaskService = Depends(get_task_service),
+):
+    async def load():
+        tasks = await task_service.get_task_page(
+            offset=offset, limit=limit, after=after, order_by=order_by, filters=filters
+        )
+        headers = {}
+        if tasks and len(tasks) == limit:
+            headers[NEXT_CURSOR_HEADER] = task_service.get_task_page_cursor(
+                tasks[-1], order_by=order_by
+            )
+        return tasks, headers
+
+    version = await task_service.get_tasks_version()
+    return await cached_response(request, version, list[TaskResponseWithTags], load)
+
+
+@router.get("/search", response_model=list[TaskResponseWithTags])
+async def search_tasks(
+    q: Annotated[str, Query(min_length=1)],
+    limit: Annotated[int, Query(le=100)] = 20,
+    # cursor from the X-Next-Cursor header of the previous page
+    after: str | None = None,
+    order: SearchOrder = "rank",
     task_service: TaskService = Depends(get_task_service),
 ):
-    return task_service.get_task_page(offset=offset, limit=limit)
+    tasks, next_cursor = await task_service.search_tasks(
+        q, limit=limit, after=after, order=order
+    )
+    headers = {}
+    if next_cursor is not None:
+        headers[NEXT_CURSOR_HEADER] = next_cursor
+    return json_response(tasks, list[TaskResponseWithTags], headers)
 
 
 @router.get("/{task_id}", response_model=TaskResponseWithTags)
-def get_task(task_id: int, task_service: TaskService = Depends(get_task_service)):
-    return task_service.get_task(task_id=task_id)
+async def get_task(
+    request: Request,
+    task_id: int,
+    task_service: TaskService = Depends(get_task_service),
+):
+    async def load():
+        return await task_service.get_task(task_id=task_id), {}
+
+    version = await task_service.get_task_version(task_id)
+    return await cached_response(request, version, TaskResponseWithTags, load)
 
 
 @router.delete("/{task_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_task(task_id: int, task_service: TaskService = Depends(get_task_service)):
-    return task_service.delete_task(task_id=task_id)
+async def delete_task(
+    task_id: int, task_service: TaskService = Depends(get_task_service)
+):
+    return await task_service.delete_task(task_id=task_id)
 
 
 @router.patch("/{task_id}/edit", response_model=TaskResponseWithTags)
-def edit_task(
+async def edit_task(
     task_id: int,
     task_update: TaskUpdate,
     task_service: TaskService = Depends(get_task_service),
 ):
-    return task_service.edit_task(task_id=task_id, task_update=task_update)
+    return await task_service.edit_task(task_id=task_id, task_update=task_update)
 
 
 # Mark as Done can be done via edit_task
 
 
 @router.patch("/{task_id}/tag", response_model=TaskResponseWithTags)
-def tag(
+async def tag(
     task_id: int, tag_id: int, task_service: TaskService = Depends(get_task_service)
 ):
-    return task_service.tag(task_id=task_id, tag_id=tag_id)
+    return await task_service.tag(task_id=task_id, tag_id=tag_id)
 
 
 @router.patch("/{task_id}/untag", response_model=TaskResponseWithTags)
-def untag(
+async def untag(
     task_id: int, tag_id: int, task_service: TaskService = Depends(get_task_service)
 ):
-    return task_service.untag(task_id=task_id, tag_id=tag_id)
+    return await task_service.untag(task_id=task_id, tag_id=tag_id)
@@ -1,4 +1,6 @@
 import os
+from typing import Literal
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 # BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -7,10 +9,117 @@ from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
     DATABASE_URL: str = ""
+    # Create the missing tables when a worker starts (the production server does it once before forking)
+    DB_CREATE_ON_STARTUP: bool = True
+    # Connection pool of the async engine (ignored by in-memory SQLite)
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30.0  # seconds to wait for a free connection
+    DB_POOL_PRE_PING: bool = True  # test connections on checkout, drops the stale ones
+    DB_POOL_RECYCLE: int = 1800  # seconds before replacing a connection, -1: never
+    # Log every SQL statement (slow, for debugging only)
+    DB_ECHO: bool = False
+    # Time every statement: per-request query count/time (Server-Timing header) and slow query logs
+    DB_INSTRUMENTATION: bool = True
+    DB_SLOW_QUERY_MS: float = 200.0
+    # SQLite profile, applied with PRAGMAs on every new connection (ignored by other databases)
+    SQLITE_PRAGMAS_ENABLED: bool = True
+    # WAL: readers don't block the writer and a commit appends to the log instead of rewriting pages
+    SQLITE_JOURNAL_MODE: Literal["WAL", "DELETE", "TRUNCATE", "MEMORY"] = "WAL"
+    # NORMAL is safe in WAL mode (a power loss may only roll back the last commits)
+    SQLITE_SYNCHRONOUS: Literal["OFF", "NORMAL", "FULL", "EXTRA"] = "NORMAL"
+    SQLITE_BUSY_TIMEOUT: int = 5000  # ms to wait for a lock before "database is locked"
+    SQLITE_CACHE_SIZE: int = -64000  # page cache, negative: in KiB (64 MB)
+    SQLITE_MMAP_SIZE: int = 268435456  # bytes memory-mapped (256 MB), 0: off
+    SQLITE_TEMP_STORE: Literal["DEFAULT", "FILE", "MEMORY"] = "MEMORY"
+    SQLITE_FOREIGN_KEYS: bool = True
+    # POST/PATCH/DELETE /tasks/bulk, PATCH /tasks/bulk/tag and /untag
+    TASK_BULK_MAX_ITEMS: int = 10000  # tasks or task-tag pairs per request
+    # GET /tasks/export: rows fetched from the server-side cursor at a time
+    TASK_EXPORT_BATCH_SIZE: int = 1000
+    # POST /tasks/import: tasks per transaction
+    TASK_IMPORT_CHUNK_SIZE: int = 1000
+    # Read endpoints: ORM rows copied into dicts and encoded with orjson, instead of validated into the
+    # response models and encoded by FastAPI (same output)
+    FAST_JSON: bool = True
+    # GET /tasks/{id}, /tasks/task_page, /tags/{id}, /tags/tag_page: serialized bodies kept in memory,
+    # revalidated against the ETag of the rows on every request
+    RESPONSE_CACHE_ENABLED: bool = True
+    RESPONSE_CACHE_MAX_ENTRIES: int = 1000
     VALID_GEMINI_MODELS: list[str] = ["gemini-2.0-flash"]
     VALID_OPENAI_MODELS: list[str] = ["gpt-4o"]
+    # auto: Gemini if its key is set, else OpenAI. fake: local deterministic stand-in, no network
+    LLM_PROVIDER: Literal["auto", "gemini", "openai", "fake"] = "auto"
+    # Asked when the primary provider fails or is slow. auto: the other provider if its key is set
+    LLM_FALLBACK_PROVIDER: Literal["auto", "none", "gemini", "openai", "fake"] = "auto"
+    # Hedging: a call still running after this quantile of its provider's latency also goes to the fallback
+    LLM_HEDGE_ENABLED: bool = True
+    LLM_HEDGE_QUANTILE: float = 0.95
+    LLM_HEDGE_MIN_DELAY: float = 0.5  # seconds, floor of the hedge delay
+    # seconds, until LLM_HEDGE_MIN_SAMPLES calls are known
+    LLM_HEDGE_DEFAULT_DELAY: float = 5.0
+    LLM_HEDGE_MIN_SAMPLES: int = 20
+    LLM_ROUTER_WINDOW: int = 200  # last calls of each provider in the rolling stats
+    # Circuit breaker: a provider failing this many times in a row is skipped for the cooldown (seconds)
+    LLM_BREAKER_FAILURES: int = 5
+    LLM_BREAKER_COOLDOWN: float = 30.0
     GEMINI_API_KEY: str = ""
     OPENAI_API_KEY: str = ""
+    # LLM_PROVIDER=fake: log-normal latency (median in seconds, spread; 0: fixed) and share of failed calls
+    FAKE_LLM_LATENCY: float = 0.5
+    FAKE_LLM_LATENCY_SIGMA: float = 0.5
+    FAKE_LLM_ERROR_RATE: float = 0.0
+    FAKE_LLM_SEED: int = 0
+    # Build the LLM client at startup instead of on the first AI request
+    LLM_WARMUP: bool = True
+    # Seconds before the in-process tag vocabulary is reloaded (picks up other workers' writes), 0: never
+    TAG_VOCABULARY_TTL: float = 300.0
+    # Local tag preselection: the closest tags offered to the LLM, and the similarity above which
+    # the task is tagged without asking the LLM (> 1 to always ask)
+    TAG_PRESELECT_TOP_K: int = 30
+    TAG_SHORTCIRCUIT_THRESHOLD: float = 0.95
+    # Persistent cache of the smart-tag LLM results (SQLite file, next to the app DB by default)
+    LLM_CACHE_ENABLED: bool = True
+    LLM_CACHE_PATH: str = ""
+    LLM_CACHE_TTL: float = 7 * 24 * 3600  # seconds
+    LLM_CACHE_MAX_ENTRIES: int = 10000  # least recently used entries are evicted beyond
+    # Provider calls of one worker process
+    LLM_MAX_CONCURRENCY: int = 8  # calls in flight at the same time
+    LLM_MAX_WAITING: int = 32  # calls waiting for a slot, beyond that we answer 429
+    LLM_TIMEOUT: float = 30.0  # seconds, a slower call is cancelled (504)
+    # Smart-tag prompts: the task text is cut to fit the budget (tokens of the whole prompt for one task,
+    # of each task of a batch)
+    PROMPT_MAX_TOKENS: int = 1500
+    PROMPT_BATCH_TASK_TOKENS: int = 300
+    # Counted with this tiktoken encoding, e.g. o200k_base (the tokenizer extra; downloaded on first use
+    # unless found in TIKTOKEN_CACHE_DIR), "": estimated at 4 characters per token, nothing to download
+    PROMPT_TOKENIZER_ENCODING: str = ""
+    # POST /ai/batch
+    AI_BATCH_MAX_TASKS: int = 1000  # tasks per request
+    AI_BATCH_CHUNK_SIZE: int = 20  # tasks per prompt
+    AI_BATCH_CONCURRENCY: int = 4  # prompts of one batch in flight at the same time
+    AI_BATCH_TIMEOUT: float = 120.0  # seconds per prompt
+    # POST /ai/{task_id}?background=true: jobs stored in the DB, run by this many workers per process
+    AI_JOB_WORKERS: int = 2  # 0: the jobs only queue up (run by another process)
+    # A busy, slow or failing provider is retried up to this many times, the first retry after
+    # AI_JOB_RETRY_DELAY seconds, doubled on each following one
+    AI_JOB_MAX_ATTEMPTS: int = 3
+    AI_JOB_RETRY_DELAY: float = 2.0
+    AI_JOB_MAX_RETRY_DELAY: float = 60.0
+    # Seconds before a job left running (worker died) is claimed again, renewed every third of it while it runs
+    AI_JOB_LEASE: float = 120.0
+    # Seconds between the checks for due jobs when idle
+    AI_JOB_POLL_INTERVAL: float = 1.0
+    # Production server (gunicorn.conf.py): Uvicorn workers forked from a master that imported the app
+    SERVER_BIND: str = "0.0.0.0:8000"
+    SERVER_WORKERS: int = 0  # 0: one per CPU
+    # Import, warm up and create the schema once in the master, before forking
+    SERVER_PRELOAD: bool = True
+    # Seconds of silence before a worker is restarted (above AI_BATCH_TIMEOUT)
+    SERVER_TIMEOUT: int = 150
+    # Seconds for a worker to finish its requests on restart/shutdown
+    SERVER_GRACEFUL_TIMEOUT: int = 30
+    SERVER_KEEPALIVE: int = 5  # seconds an idle keep-alive connection stays open
     model_config = SettingsConfigDict(env_file=".env")
 
 
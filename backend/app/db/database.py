@@ -1,16 +1,144 @@
-from sqlmodel import SQLModel, Session, create_engine
+from datetime import datetime
+
+from sqlalchemy import Connection, event, inspect, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
 from app.config.config import settings
+from app.db.instrumentation import instrument_engine
+from app.db.search import create_search_index
+from app.db.versions import create_table_versions
+
+# Async drivers for the sync URLs we accept in DATABASE_URL (e.g. 'sqlite:///data/todo.db')
+ASYNC_DRIVERS = {"sqlite": "aiosqlite", "postgresql": "asyncpg"}
+
+
+def get_async_url(url: str) -> str:
+    """Switch a database URL to its async driver, e.g. sqlite:// -> sqlite+aiosqlite://"""
+    url_obj = make_url(url)
+    # drivername is only the backend name when no driver is given, e.g. 'sqlite' vs 'sqlite+pysqlite'
+    if url_obj.drivername in ASYNC_DRIVERS:
+        url_obj = url_obj.set(
+            drivername=f"{url_obj.drivername}+{ASYNC_DRIVERS[url_obj.drivername]}"
+        )
+    return url_obj.render_as_string(hide_password=False)
+
+
+def get_engine_options(url: str) -> dict:
+    url_obj = make_url(url)
+    options = {
+        "echo": settings.DB_ECHO,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+    }
+    if url_obj.get_backend_name() == "sqlite":
+        options["connect_args"] = {"check_same_thread": False}
+        # In-memory SQLite uses a single static connection, there is no pool to size
+        if url_obj.database in (None, "", ":memory:"):
+            return options
+    options |= {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+    }
+    return options
+
+
+def get_sqlite_pragmas() -> dict[str, str | int]:
+    return {
+        "journal_mode": settings.SQLITE_JOURNAL_MODE,
+        "synchronous": settings.SQLITE_SYNCHRONOUS,
+        "busy_timeout": settings.SQLITE_BUSY_TIMEOUT,
+        "cache_size": settings.SQLITE_CACHE_SIZE,
+        "mmap_size": settings.SQLITE_MMAP_SIZE,
+        "temp_store": settings.SQLITE_TEMP_STORE,
+        "foreign_keys": "ON" if settings.SQLITE_FOREIGN_KEYS else "OFF",
+    }
+
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    # Most of the PRAGMAs only last as long as the connection, so they are set on each new one
+    cursor = dbapi_connection.cursor()
+    for name, value in get_sqlite_pragmas().items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+
+def apply_sqlite_pragmas(engine: AsyncEngine):
+    event.listen(engine.sync_engine, "connect", set_sqlite_pragmas)
+
 
-connect_args = {"check_same_thread": False}
-engine = create_engine(url=settings.DATABASE_URL, echo=True, connect_args=connect_args)
+def create_engine(url: str) -> AsyncEngine:
+    async_url = get_async_url(url)
+    engine = create_async_engine(async_url, **get_engine_options(async_url))
+    if make_url(async_url).get_backend_name() == "sqlite" and (
+        settings.SQLITE_PRAGMAS_ENABLED
+    ):
+        apply_sqlite_pragmas(engine)
+    if settings.DB_INSTRUMENTATION:
+        instrument_engine(engine)
+    return engine
+
+
+def create_session_maker(engine: AsyncEngine) -> async_sessionmaker[AsyncSession]:
+    # expire_on_commit=False: attributes can't be lazily reloaded after a commit in async code,
+    # so the objects keep their state and the services return them as they are.
+    return async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+
+engine = create_engine(settings.DATABASE_URL)
+session_maker = create_session_maker(engine)
 
 
 # Dependency for Injection
-def get_session():
-    with Session(engine) as session:
+async def get_session():
+    async with session_maker() as session:
         yield session
 
 
-def create_db_and_tables():
+# Dependency for the streamed responses: the session of get_session is closed before the body is sent,
+# so they open their own
+def get_session_maker() -> async_sessionmaker[AsyncSession]:
+    return session_maker
+
+
+# Values of the columns added to the models since the first release, for the existing rows
+COLUMN_BACKFILLS = {"updated_at": datetime.now}
+
+
+def add_missing_columns(connection: Connection):
+    # create_all skips the existing tables: add the new (nullable, as ALTER TABLE requires) columns
+    inspector = inspect(connection)
+    for table in SQLModel.metadata.sorted_tables:
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            column_type = column.type.compile(connection.dialect)
+            connection.execute(
+                text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}")
+            )
+            if column.name in COLUMN_BACKFILLS:
+                connection.execute(
+                    table.update().values(
+                        {column.name: COLUMN_BACKFILLS[column.name]()}
+                    )
+                )
+
+
+def create_missing_indexes(connection: Connection):
+    for table in SQLModel.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+
+
+async def create_db_and_tables(engine: AsyncEngine = engine):
     """Initialize the tables"""
-    SQLModel.metadata.create_all(engine)
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+        await conn.run_sync(add_missing_columns)
+        # create_all skips the existing tables, along with the indexes added to them since
+        await conn.run_sync(create_missing_indexes)
+        await conn.run_sync(create_search_index)
+        await conn.run_sync(create_table_versions)
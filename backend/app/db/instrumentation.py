@@ -0,0 +1,106 @@
+import logging
+import time
+from contextvars import ContextVar, Token
+from dataclasses import dataclass
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.config.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class QueryStats:
+    count: int = 0
+    total_ms: float = 0.0
+    max_ms: float = 0.0
+    slow: int = 0  # statements above DB_SLOW_QUERY_MS
+
+    def record(self, elapsed_ms: float, is_slow: bool):
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        self.slow += is_slow
+
+
+@dataclass
+class PoolStats:
+    checkouts: int = 0
+
+
+db_pool_stats = PoolStats()
+
+
+def get_pool_status(engine: AsyncEngine) -> dict[str, int]:
+    """Connections in use / opened beyond the pool size (0 for the pools without a size, e.g. NullPool)"""
+    pool = engine.pool
+    return {
+        "checked_out": pool.checkedout() if hasattr(pool, "checkedout") else 0,
+        "overflow": max(pool.overflow(), 0) if hasattr(pool, "overflow") else 0,
+    }
+
+
+# Every statement of the process, and the statements of the current request (set by the middleware in main.py).
+# The sync event hooks run in SQLAlchemy's greenlets, which share the context of the calling task.
+db_query_stats = QueryStats()
+_request_query_stats: ContextVar[QueryStats | None] = ContextVar(
+    "request_query_stats", default=None
+)
+
+
+def start_request_query_stats() -> tuple[QueryStats, Token]:
+    stats = QueryStats()
+    return stats, _request_query_stats.set(stats)
+
+
+def stop_request_query_stats(token: Token):
+    _request_query_stats.reset(token)
+
+
+def get_request_query_stats() -> QueryStats | None:
+    return _request_query_stats.get()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # A stack, as the same connection can run a statement from within another one's events
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed_ms = (time.perf_counter() - conn.info["query_start"].pop()) * 1000
+    is_slow = elapsed_ms >= settings.DB_SLOW_QUERY_MS
+    db_query_stats.record(elapsed_ms, is_slow)
+    request_stats = _request_query_stats.get()
+    if request_stats is not None:
+        request_stats.record(elapsed_ms, is_slow)
+    if is_slow:
+        logger.warning(
+            "Slow query (%.1f ms): %s",
+            elapsed_ms,
+            statement,
+            extra={"duration_ms": round(elapsed_ms, 3), "statement": statement},
+        )
+
+
+def _checkout(dbapi_connection, connection_record, connection_proxy):
+    db_pool_stats.checkouts += 1
+
+
+def _handle_error(exception_context):
+    # after_cursor_execute is not called for a failed statement
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("query_start"):
+        conn.info["query_start"].pop()
+
+
+def instrument_engine(engine: AsyncEngine):
+    """
+    Time every statement run by `engine` (replaces echo=True, which logs them all without timings),
+    and count the pool checkouts
+    """
+    event.listen(engine.sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine.sync_engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine.sync_engine, "handle_error", _handle_error)
+    event.listen(engine.sync_engine, "checkout", _checkout)
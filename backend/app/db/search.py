@@ -0,0 +1,119 @@
+import re
+
+from sqlalchemy import (
+    Column,
+    Connection,
+    Float,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    bindparam,
+    func,
+    literal_column,
+    text,
+)
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+# Full-text search over the task titles and descriptions.
+# SQLite: an FTS5 table whose rowid is the task id, written by TaskService in the same transaction as the task.
+# Postgres: a GIN index on the tsvector of the task itself, nothing to keep in sync.
+
+# Not in SQLModel.metadata: create_all can't create virtual tables
+task_fts = Table(
+    "task_fts",
+    MetaData(),
+    Column("rowid", Integer, primary_key=True),
+    Column("title", String),
+    Column("description", String),
+    Column("rank", Float),  # FTS5 hidden column, bm25 of the row for the current MATCH
+)
+
+WORD_PATTERN = re.compile(r"\w+")
+
+
+def get_fts_query(query: str) -> str:
+    """
+    FTS5 query matching the tasks that contain every word of `query`.
+    Each word is quoted, so the user input can't use the FTS5 syntax (operators, columns, ...)
+    """
+    return " ".join(f'"{word}"' for word in WORD_PATTERN.findall(query))
+
+
+# Written out in SQL (no bound parameters), the queries must repeat the indexed expression exactly
+TASK_TSVECTOR = (
+    "to_tsvector('simple', coalesce(title, '') || ' ' || coalesce(description, ''))"
+)
+
+
+def get_task_tsvector():
+    return literal_column(TASK_TSVECTOR)
+
+
+def get_tsquery(query: str):
+    return func.plainto_tsquery(literal_column("'simple'"), query)
+
+
+def is_postgres(bind) -> bool:
+    """`bind`: an engine or a connection"""
+    return bind.dialect.name == "postgresql"
+
+
+def create_search_index(connection: Connection):
+    """Create the search index if missing, and fill it with the existing tasks"""
+    if is_postgres(connection):
+        connection.execute(
+            text(
+                f"CREATE INDEX IF NOT EXISTS ix_task_search ON task USING gin ({TASK_TSVECTOR})"
+            )
+        )
+        return
+    exists = connection.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'task_fts'")
+    ).first()
+    if exists:
+        return
+    connection.execute(
+        text(
+            "CREATE VIRTUAL TABLE task_fts USING fts5("
+            "title, description, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+    )
+    connection.execute(
+        text(
+            "INSERT INTO task_fts (rowid, title, description) "
+            "SELECT id, title, description FROM task"
+        )
+    )
+
+
+def drop_search_index(connection: Connection):
+    if is_postgres(connection):
+        connection.execute(text("DROP INDEX IF EXISTS ix_task_search"))
+    else:
+        connection.execute(text("DROP TABLE IF EXISTS task_fts"))
+
+
+async def index_tasks(session: AsyncSession, task_ids: list[int]):
+    """(Re)index the tasks from their current rows, pending ORM changes must be flushed first"""
+    if is_postgres(session.get_bind()) or not task_ids:
+        return
+    await unindex_tasks(session, task_ids)
+    await session.exec(
+        text(
+            "INSERT INTO task_fts (rowid, title, description) "
+            "SELECT id, title, description FROM task WHERE id IN :ids"
+        ).bindparams(bindparam("ids", expanding=True)),
+        params={"ids": task_ids},
+    )
+
+
+async def unindex_tasks(session: AsyncSession, task_ids: list[int]):
+    if is_postgres(session.get_bind()) or not task_ids:
+        return
+    await session.exec(
+        text("DELETE FROM task_fts WHERE rowid IN :ids").bindparams(
+            bindparam("ids", expanding=True)
+        ),
+        params={"ids": task_ids},
+    )
@@ -0,0 +1,86 @@
+from datetime import datetime
+
+from sqlalchemy import Connection, Table, insert, select, update
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.schemas.link import TaskTagLink
+from app.schemas.table_version import TableVersion
+from app.schemas.task_tag import Tag, Task
+
+# The `updated_at` column of the tasks and tags is the version behind their ETags.
+# A task is served with its tags and a tag with its tasks, so a write also bumps the rows on the other side
+# of the changed links. These helpers write the table directly (no ORM load), in the caller's transaction.
+# The pages are versioned by a counter per table (TableVersion), bumped in the transaction of every write.
+
+_task = Task.__table__
+_tag = Tag.__table__
+_table_version = TableVersion.__table__
+VERSIONED_TABLES = [_task, _tag]
+
+
+async def _touch(session: AsyncSession, table: Table, ids):
+    """`ids`: a list or a subquery"""
+    await session.exec(
+        update(table).where(table.c.id.in_(ids)).values(updated_at=datetime.now())
+    )
+
+
+async def touch_tasks(session: AsyncSession, task_ids: list[int]):
+    if task_ids:
+        await _touch(session, _task, task_ids)
+
+
+async def touch_tags(session: AsyncSession, tag_ids: list[int]):
+    if tag_ids:
+        await _touch(session, _tag, tag_ids)
+
+
+async def touch_tags_of_tasks(session: AsyncSession, task_ids: list[int]):
+    if task_ids:
+        tag_ids = select(TaskTagLink.tag_id).where(TaskTagLink.task_id.in_(task_ids))
+        await _touch(session, _tag, tag_ids)
+
+
+async def touch_tasks_of_tags(session: AsyncSession, tag_ids: list[int]):
+    if tag_ids:
+        task_ids = select(TaskTagLink.task_id).where(TaskTagLink.tag_id.in_(tag_ids))
+        await _touch(session, _task, task_ids)
+
+
+async def get_row_version(session: AsyncSession, table: Table, id: int) -> str | None:
+    """Version of one row (primary key lookup), None if it doesn't exist"""
+    statement = select(table.c.updated_at).where(table.c.id == id)
+    updated_at = (await session.exec(statement)).scalar_one_or_none()
+    return None if updated_at is None else updated_at.isoformat()
+
+
+def create_table_versions(connection: Connection):
+    """The counter rows of the versioned tables, if missing"""
+    existing = set(connection.execute(select(_table_version.c.name)).scalars())
+    rows = [
+        {"name": table.name, "version": 0}
+        for table in VERSIONED_TABLES
+        if table.name not in existing
+    ]
+    if rows:
+        connection.execute(insert(_table_version), rows)
+
+
+async def bump_table_versions(session: AsyncSession):
+    """
+    Called by the writes before they commit. Every write of the tasks or the tags bumps both counters:
+    a task page embeds the tags of its tasks and a tag page their tasks. The row lock is held until the commit
+    """
+    await session.exec(
+        update(_table_version)
+        .where(_table_version.c.name.in_([table.name for table in VERSIONED_TABLES]))
+        .values(version=_table_version.c.version + 1)
+    )
+
+
+async def get_table_version(session: AsyncSession, table: Table) -> str:
+    """Version of a whole table: its write counter, a primary key lookup whatever the size of the table"""
+    statement = select(_table_version.c.version).where(
+        _table_version.c.name == table.name
+    )
+    return str((await session.exec(statement)).scalar_one_or_none())
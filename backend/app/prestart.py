@@ -0,0 +1,76 @@
+import asyncio
+import importlib
+import time
+
+from sqlalchemy.orm import configure_mappers
+
+from app.config.config import settings
+from app.db.database import create_db_and_tables, engine
+from app.schemas.task_tag import TagResponseWithTasks, TaskResponseWithTags
+from app.services.ai_service import get_llm_providers
+from app.services.prompts import get_tokenizer
+from app.services.serialization import get_serializer
+
+# Run once by the production server (gunicorn.conf.py) in the master process, after the app is imported and
+# before the workers are forked: the workers start with the modules, tokenizer and serializers already loaded
+# (shared copy-on-write), and the schema is created once instead of by every worker at the same time.
+# Nothing holding a connection or a thread (DB pool, LLM clients, caches) is created here: that stays per worker.
+
+# The provider SDKs, only imported by get_llm on the first AI request otherwise (a few seconds each),
+# and the modules their client constructors import on top
+PROVIDER_MODULES = {
+    "gemini": ["langchain_google_genai"],
+    "openai": ["langchain_openai", "openai.resources", "httpcore"],
+    "fake": ["app.services.fake_llm"],
+}
+
+# The response models of the cached read endpoints
+RESPONSE_MODELS = [
+    TaskResponseWithTags,
+    list[TaskResponseWithTags],
+    TagResponseWithTasks,
+    list[TagResponseWithTasks],
+]
+
+
+def preload_imports() -> dict[str, float]:
+    """Import and build what every worker needs, seconds per step"""
+    timings = {}
+    start = time.perf_counter()
+    for provider, *_ in get_llm_providers():
+        for module in PROVIDER_MODULES.get(provider, []):
+            importlib.import_module(module)
+    timings["provider_sdks"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    get_tokenizer()
+    timings["tokenizer"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    configure_mappers()
+    for response_model in RESPONSE_MODELS:
+        get_serializer(response_model)
+    timings["models"] = time.perf_counter() - start
+    return timings
+
+
+def prepare_database() -> float:
+    """Create the schema, then close the connections: a forked worker must not reuse them"""
+    start = time.perf_counter()
+
+    async def run():
+        await create_db_and_tables()
+        await engine.dispose()
+
+    asyncio.run(run())
+    return time.perf_counter() - start
+
+
+def prestart() -> dict[str, float]:
+    """Schema and preloading, seconds per step"""
+    timings = {}
+    if settings.DB_CREATE_ON_STARTUP:
+        timings["schema"] = prepare_database()
+        # The forked workers inherit the settings: their lifespan skips the schema
+        settings.DB_CREATE_ON_STARTUP = False
+    return timings | preload_imports()
@@ -0,0 +1,50 @@
+from datetime import datetime
+from typing import Literal
+
+from sqlalchemy import Index, text
+from sqlmodel import Field, SQLModel
+
+from .task_tag import TaskResponseWithTags
+
+AIJobStatus = Literal["queued", "running", "done", "failed"]
+
+# A task has at most one job waiting or running: the later requests get that job
+ACTIVE_JOB = text("status IN ('queued', 'running')")
+
+
+class AIJob(SQLModel, table=True):
+    __table_args__ = (
+        # The queue: the next job to run
+        Index("ix_aijob_status_run_after", "status", "run_after"),
+        Index(
+            "ux_aijob_active_task_id",
+            "task_id",
+            unique=True,
+            sqlite_where=ACTIVE_JOB,
+            postgresql_where=ACTIVE_JOB,
+        ),
+    )
+
+    id: int | None = Field(default=None, primary_key=True)
+    # No foreign key: a task can be deleted while its job waits, the job then fails
+    task_id: int
+    status: str = "queued"  # AIJobStatus
+    attempts: int = 0
+    # JSON of the tagged task (TaskResponseWithTags) / detail of the last error
+    result: str | None = None
+    error: str | None = None
+    created_at: datetime = Field(default_factory=datetime.now)
+    # Set when the job is claimed by a worker (lease) and on every status change
+    updated_at: datetime = Field(default_factory=datetime.now)
+    run_after: datetime = Field(default_factory=datetime.now)  # retry backoff
+
+
+class AIJobResponse(SQLModel):
+    id: int
+    task_id: int
+    status: AIJobStatus
+    attempts: int
+    result: TaskResponseWithTags | None = None
+    error: str | None = None
+    created_at: datetime
+    updated_at: datetime
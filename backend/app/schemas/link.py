@@ -1,6 +1,10 @@
+from sqlalchemy import Index
 from sqlmodel import Field, SQLModel
 
 
 class TaskTagLink(SQLModel, table=True):
+    # The primary key (task_id, tag_id) finds the tags of a task, this index the tasks of a tag
+    __table_args__ = (Index("ix_tasktaglink_tag_id_task_id", "tag_id", "task_id"),)
+
     task_id: int = Field(default=None, primary_key=True, foreign_key="task.id")
     tag_id: int = Field(default=None, primary_key=True, foreign_key="tag.id")
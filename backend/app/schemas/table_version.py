@@ -0,0 +1,7 @@
+from sqlmodel import Field, SQLModel
+
+
+class TableVersion(SQLModel, table=True):
+    # One row per versioned table (task, tag): a counter bumped by every write, the ETag of its pages
+    name: str = Field(primary_key=True)
+    version: int = 0
@@ -1,5 +1,7 @@
+from sqlalchemy import Index
 from sqlmodel import Field, SQLModel, Relationship
 from datetime import datetime
+from typing import Literal
 from .link import TaskTagLink
 
 # from typing import TYPE_CHECKING
@@ -23,11 +25,36 @@ class TaskCreate(TaskBase):
 
 
 class Task(TaskBase, table=True):
+    # Serves the is_done filter, alone or with a scheduled_for range / order
+    __table_args__ = (
+        Index("ix_task_is_done_scheduled_for", "is_done", "scheduled_for"),
+    )
+
     id: int | None = Field(default=None, primary_key=True)
-    created_at: datetime = Field(default_factory=datetime.now)
+    created_at: datetime = Field(
+        default_factory=datetime.now, index=True
+    )  # index to filter and sort by creation date
+    # Bumped by the services on every change of the task or of its tags, version of the ETags (app/db/versions.py)
+    updated_at: datetime = Field(default_factory=datetime.now, index=True)
     tags: list["Tag"] = Relationship(back_populates="tasks", link_model=TaskTagLink)
 
 
+# The scheduled_for pages sort the NULLs first ascending, last descending (app/services/pagination.py). SQLite
+# does so by default, a Postgres btree is NULLS LAST by default: without these indexes every page is a sort
+_task = Task.__table__
+Index(
+    "ix_task_scheduled_for_nulls_first",
+    _task.c.scheduled_for.asc().nulls_first(),
+    _task.c.id,
+).ddl_if(dialect="postgresql")
+Index(
+    "ix_task_is_done_scheduled_for_nulls_first",
+    _task.c.is_done,
+    _task.c.scheduled_for.asc().nulls_first(),
+    _task.c.id,
+).ddl_if(dialect="postgresql")
+
+
 class TaskResponse(TaskBase):
     id: int
     created_at: datetime
@@ -45,6 +72,64 @@ class TaskUpdate(SQLModel):
     scheduled_for: datetime | None = None
 
 
+# Query parameters of GET /tasks/task_page, the filters are combined with AND
+class TaskFilter(SQLModel):
+    is_done: bool | None = None
+    # ranges: from inclusive, to exclusive
+    scheduled_from: datetime | None = None
+    scheduled_to: datetime | None = None
+    created_from: datetime | None = None
+    created_to: datetime | None = None
+    has_tags: bool | None = None  # tasks with at least one tag / without any tag
+    tag_ids: list[int] = []  # tasks with any of these tags
+
+
+class TaskBulkUpdate(TaskUpdate):
+    id: int
+
+
+# Body of DELETE /tasks/bulk, and response of the bulk endpoints
+class TaskIds(SQLModel):
+    ids: list[int]
+
+
+# One line of POST /tasks/import, the lines of GET /tasks/export are accepted as they are (ids ignored)
+class TaskImport(TaskCreate):
+    created_at: datetime | None = None
+    tags: list["TagBase"] = []  # by name, the missing tags are created
+
+
+class TaskImportResult(SQLModel):
+    imported: int
+    created_tags: int
+
+
+class TaskTagPair(SQLModel):
+    task_id: int
+    tag_id: int
+
+
+# Body of PATCH /tasks/bulk/tag and /tasks/bulk/untag
+class TaskTagPairs(SQLModel):
+    pairs: list[TaskTagPair]
+
+
+class TaskTagPairResult(TaskTagPair):
+    status: Literal[
+        "tagged",
+        "already_tagged",
+        "untagged",
+        "not_tagged",
+        "task_not_found",
+        "tag_not_found",
+    ]
+
+
+# One result per pair, in the order of the request
+class TaskTagBulkResponse(SQLModel):
+    results: list[TaskTagPairResult]
+
+
 # ----------------------------------------------------------------------------------------------------
 
 
@@ -58,6 +143,8 @@ class TagCreate(TagBase):
 
 class Tag(TagBase, table=True):
     id: int | None = Field(default=None, primary_key=True)
+    # Bumped by the services on every change of the tag or of its tasks
+    updated_at: datetime = Field(default_factory=datetime.now, index=True)
     tasks: list[Task] = Relationship(back_populates="tags", link_model=TaskTagLink)
 
 
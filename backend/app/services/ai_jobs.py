@@ -0,0 +1,267 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+
+from fastapi import HTTPException
+from sqlalchemy import and_, or_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.config.config import settings
+from app.db.database import session_maker
+from app.schemas.ai_job import AIJob, AIJobResponse
+from app.schemas.task_tag import Task, TaskResponseWithTags
+from .ai_service import AIService
+from .metrics import registry
+from .serialization import serialize
+from .tag_service import TagService
+from .task_service import TaskService
+
+# Smart tagging in the background: POST /ai/{task_id}?background=true stores a job and answers 202 right away,
+# the workers of the process run the jobs and the client polls GET /ai/jobs/{id} for the result.
+# The queue is the AIJob table, so the jobs survive a restart and any worker process of the app can run them.
+
+# Provider busy, timed out or failing: worth another attempt later. Other errors (e.g. 404) are final.
+RETRYABLE_STATUS_CODES = {429, 503, 504}
+
+ai_jobs_total = registry.counter(
+    "ai_jobs_total", "Background AI jobs finished, by outcome", labels=("outcome",)
+)
+
+
+def retry_delay(attempts: int) -> float:
+    """Exponential backoff: seconds before the attempt following the `attempts`th"""
+    return min(
+        settings.AI_JOB_RETRY_DELAY * 2 ** (attempts - 1),
+        settings.AI_JOB_MAX_RETRY_DELAY,
+    )
+
+
+class AIJobService:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def get_active_job(self, task_id: int) -> AIJob | None:
+        statement = select(AIJob).where(
+            AIJob.task_id == task_id, AIJob.status.in_(("queued", "running"))
+        )
+        return (await self.session.exec(statement)).first()
+
+    async def enqueue(self, task_id: int) -> AIJob:
+        """Queue the smart tagging of a task, or return its job already queued or running"""
+        if await self.session.get(Task, task_id) is None:
+            raise HTTPException(status_code=404, detail="Task not found")
+        job = await self.get_active_job(task_id)
+        if job is not None:
+            return job
+        job = AIJob(task_id=task_id)
+        self.session.add(job)
+        try:
+            await self.session.commit()
+        except IntegrityError:
+            # Another request queued it in the meantime (unique index on the active jobs of a task)
+            await self.session.rollback()
+            job = await self.get_active_job(task_id)
+            if job is None:
+                raise HTTPException(status_code=409, detail="Job could not be queued")
+            return job
+        ai_job_worker.notify()
+        return job
+
+    async def get_job(self, job_id: int) -> AIJob:
+        job = await self.session.get(AIJob, job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+        return job
+
+    @staticmethod
+    def to_response(job: AIJob) -> AIJobResponse:
+        # The result is stored as the JSON of the tagged task
+        return AIJobResponse.model_validate(
+            job.model_dump()
+            | {
+                "result": TaskResponseWithTags.model_validate_json(job.result)
+                if job.result is not None
+                else None
+            }
+        )
+
+
+class AIJobWorker:
+    """Pool of asyncio tasks running the queued jobs, started and stopped with the app"""
+
+    def __init__(self, session_maker: async_sessionmaker[AsyncSession], workers: int):
+        self.session_maker = session_maker
+        self.workers = workers
+        self._tasks: list[asyncio.Task] = []
+        self._wakeup: asyncio.Event | None = None
+
+    def start(self):
+        self._wakeup = asyncio.Event()
+        self._tasks = [
+            asyncio.create_task(self._work(), name=f"ai-job-worker-{i}")
+            for i in range(self.workers)
+        ]
+
+    async def stop(self):
+        # A job interrupted here stays "running" until its lease expires, then it is claimed again
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def notify(self):
+        """Wake the idle workers up, a job was queued"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _work(self):
+        while True:
+            self._wakeup.clear()
+            try:
+                while await self.run_once():
+                    pass
+            except Exception:
+                logging.exception("AI job worker error")
+            try:
+                # The jobs queued by other processes and the retries are picked up by polling
+                await asyncio.wait_for(
+                    self._wakeup.wait(), timeout=settings.AI_JOB_POLL_INTERVAL
+                )
+            except TimeoutError:
+                pass
+
+    async def claim(self) -> AIJob | None:
+        """Mark the next due job as running and return it, None if there is none"""
+        now = datetime.now()
+        lease_expired = now - timedelta(seconds=settings.AI_JOB_LEASE)
+        # Its worker died (or the app was stopped) while running it: the lease was not renewed
+        abandoned = and_(AIJob.status == "running", AIJob.updated_at < lease_expired)
+        due = and_(AIJob.status == "queued", AIJob.run_after <= now)
+        # Out of attempts, e.g. a job that kills its worker every time: failed instead of claimed again
+        give_up = (
+            update(AIJob)
+            .where(abandoned, AIJob.attempts >= settings.AI_JOB_MAX_ATTEMPTS)
+            .values(
+                status="failed",
+                error="Worker lost while running the job",
+                updated_at=now,
+            )
+        )
+        next_job = (
+            select(AIJob.id)
+            .where(
+                or_(
+                    due,
+                    and_(abandoned, AIJob.attempts < settings.AI_JOB_MAX_ATTEMPTS),
+                )
+            )
+            .order_by(AIJob.run_after, AIJob.id)
+            .limit(1)
+            # Postgres: concurrent workers skip each other's job, SQLite serializes the writers anyway
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        # One statement: two workers can't claim the same job
+        statement = (
+            update(AIJob)
+            .where(AIJob.id == next_job)
+            .values(status="running", attempts=AIJob.attempts + 1, updated_at=now)
+            .returning(AIJob)
+        )
+        async with self.session_maker() as session:
+            # Idle queue: one read, the UPDATEs and their commit (the SQLite write lock) only when there is work
+            pending = select(AIJob.id).where(or_(due, abandoned)).limit(1)
+            if (await session.exec(pending)).first() is None:
+                return None
+            failed = (await session.exec(give_up)).rowcount
+            job = (await session.exec(statement)).scalars().first()
+            await session.commit()
+        if failed:
+            ai_jobs_total.inc("failed", amount=failed)
+        return job
+
+    def _owned(self, job: AIJob):
+        # The claim of `job` is still ours: the job was not claimed again (attempts is the fencing token)
+        return and_(
+            AIJob.id == job.id,
+            AIJob.status == "running",
+            AIJob.attempts == job.attempts,
+        )
+
+    async def _heartbeat(self, job: AIJob, done: asyncio.Event):
+        """
+        Renew the lease of a running job, which can wait for the LLM limiter longer than the lease, until `done`.
+        Stopped by the event rather than cancelled: a renewal is never cut in the middle of its statements
+        """
+        while True:
+            try:
+                await asyncio.wait_for(done.wait(), timeout=settings.AI_JOB_LEASE / 3)
+                return
+            except TimeoutError:
+                pass
+            try:
+                async with self.session_maker() as session:
+                    await session.exec(
+                        update(AIJob)
+                        .where(self._owned(job))
+                        .values(updated_at=datetime.now())
+                    )
+                    await session.commit()
+            except Exception:
+                logging.exception(f"AI job {job.id} lease not renewed")
+
+    async def run_once(self) -> bool:
+        """Run the next due job, False if there was none"""
+        job = await self.claim()
+        if job is None:
+            return False
+        values = {}
+        done = asyncio.Event()
+        heartbeat = asyncio.create_task(self._heartbeat(job, done))
+        try:
+            async with self.session_maker() as session:
+                task = await AIService().single_smart_tag(
+                    task_id=job.task_id,
+                    task_service=TaskService(session),
+                    tag_service=TagService(session),
+                )
+                result = serialize(task, TaskResponseWithTags).decode()
+            values |= {"status": "done", "result": result, "error": None}
+        except Exception as e:
+            if isinstance(e, HTTPException):
+                error, retryable = e.detail, e.status_code in RETRYABLE_STATUS_CODES
+            else:
+                logging.exception(f"AI job {job.id} failed")
+                error, retryable = str(e) or type(e).__name__, True
+            values["error"] = error
+            if retryable and job.attempts < settings.AI_JOB_MAX_ATTEMPTS:
+                values |= {
+                    "status": "queued",
+                    "run_after": datetime.now()
+                    + timedelta(seconds=retry_delay(job.attempts)),
+                }
+            else:
+                values["status"] = "failed"
+        finally:
+            done.set()
+            await asyncio.gather(heartbeat, return_exceptions=True)
+        values["updated_at"] = datetime.now()
+        async with self.session_maker() as session:
+            owned = (
+                await session.exec(update(AIJob).where(self._owned(job)).values(values))
+            ).rowcount
+            await session.commit()
+        if not owned:
+            # Claimed again by another worker (lease lost anyway): its outcome is the one kept
+            logging.warning(
+                f"AI job {job.id} outcome dropped, the job was claimed again"
+            )
+        elif values["status"] != "queued":
+            ai_jobs_total.inc(values["status"])
+        return True
+
+
+ai_job_worker = AIJobWorker(session_maker, workers=settings.AI_JOB_WORKERS)
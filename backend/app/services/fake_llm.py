@@ -0,0 +1,110 @@
+import asyncio
+import hashlib
+import json
+import math
+import random
+import re
+
+from pydantic import BaseModel
+
+from app.config.config import settings
+
+# Local stand-in for the chat models (LLM_PROVIDER=fake): the AI endpoints run end to end without a network,
+# for load tests and benchmarks on an offline box. The answers only depend on the prompt (the same task gets
+# the same tag), the latency and the errors are drawn from a seeded generator.
+
+# Names of the "new" tags it suggests
+NEW_TAGS = ["Work", "Home", "Health", "Finance", "Errands", "Study", "Travel", "Social"]
+
+AVAILABLE_TAGS = re.compile(r"Available tag list: (\[.*\])")
+CURRENT_TAGS = re.compile(r"Currently assigned tags: (\[.*\])")
+BATCH_TASK = re.compile(
+    r"- task_id: (\d+)\n(.*?)- Currently assigned tags: (\[[^\n]*\])", re.DOTALL
+)
+
+
+class FakeLLMError(RuntimeError):
+    pass
+
+
+def _parse_tags(text: str | None) -> list[str]:
+    # The tag lists are JSON arrays in the prompts (format_tags), anything else counts as no tags
+    if text is None:
+        return []
+    try:
+        tags = json.loads(text)
+    except ValueError:
+        return []
+    return [str(tag) for tag in tags] if isinstance(tags, list) else []
+
+
+def _last(pattern: re.Pattern, text: str) -> str | None:
+    # The few-shot examples come first, the task itself last
+    matches = pattern.findall(text)
+    return matches[-1] if matches else None
+
+
+def pick_tag(
+    text: str, available_tags: list[str], current_tags: list[str]
+) -> dict[str, str | bool]:
+    """A tag of the available list, or a new one, picked from a hash of `text`: never a current tag"""
+    h = int.from_bytes(hashlib.sha256(text.encode()).digest()[:8])
+    current = {tag.casefold() for tag in current_tags}
+    # A batch offers the union of the candidates of its tasks: it may hold the task's own tags
+    available_tags = [tag for tag in available_tags if tag.casefold() not in current]
+    i = h % (len(available_tags) + 1)
+    if i < len(available_tags):
+        return {"tag_name": available_tags[i], "is_new": False}
+    for offset in range(len(NEW_TAGS)):
+        name = NEW_TAGS[(h + offset) % len(NEW_TAGS)]
+        if name.casefold() not in current:
+            return {"tag_name": name, "is_new": True}
+    return {"tag_name": f"Tag {h % 1000}", "is_new": True}
+
+
+def answer_single(prompt: str) -> dict:
+    return pick_tag(
+        prompt,
+        _parse_tags(_last(AVAILABLE_TAGS, prompt)),
+        _parse_tags(_last(CURRENT_TAGS, prompt)),
+    )
+
+
+def answer_batch(prompt: str) -> dict:
+    available_tags = _parse_tags(_last(AVAILABLE_TAGS, prompt))
+    results = []
+    for match in BATCH_TASK.finditer(prompt):
+        current_tags = _parse_tags(match.group(3))
+        # the block of the task, not the prompt: the same answer whatever the other tasks of the batch
+        answer = pick_tag(match.group(0), available_tags, current_tags)
+        results.append({"task_id": int(match.group(1))} | answer)
+    return {"results": results}
+
+
+class FakeChatModel:
+    """Answers like a structured-output chat model (`with_structured_output(schema)`)"""
+
+    def __init__(self, schema: type[BaseModel], seed: int):
+        self.schema = schema
+        self._rng = random.Random(seed)
+        # One answer (tag_name, is_new) or one per task of the prompt (results)
+        self._answer = (
+            answer_batch if "results" in schema.model_fields else answer_single
+        )
+
+    def latency(self) -> float:
+        """Seconds, log-normal around the median (the long tail of the real providers)"""
+        if settings.FAKE_LLM_LATENCY <= 0:
+            return 0.0
+        return self._rng.lognormvariate(
+            math.log(settings.FAKE_LLM_LATENCY), settings.FAKE_LLM_LATENCY_SIGMA
+        )
+
+    async def ainvoke(self, prompt: str, config=None) -> BaseModel:
+        # Both drawn before the wait: the sequence only depends on the order of the calls
+        latency = self.latency()
+        fails = self._rng.random() < settings.FAKE_LLM_ERROR_RATE
+        await asyncio.sleep(latency)
+        if fails:
+            raise FakeLLMError("Fake LLM error (FAKE_LLM_ERROR_RATE)")
+        return self.schema.model_validate(self._answer(prompt))
@@ -0,0 +1,47 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+
+class LLMOverloadedError(Exception):
+    """Raised when the waiting queue for a provider call slot is full"""
+
+
+class LLMLimiter:
+    """
+    Caps the number of in-flight LLM provider calls of this process.
+    Callers beyond `max_concurrency` wait for a free slot, up to `max_waiting` of them;
+    past that we reject immediately (backpressure) instead of piling up requests.
+    """
+
+    def __init__(self, max_concurrency: int, max_waiting: int):
+        self.max_concurrency = max_concurrency
+        self.max_waiting = max_waiting
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._in_flight = 0
+        self._waiting = 0
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def waiting(self) -> int:
+        return self._waiting
+
+    @asynccontextmanager
+    async def slot(self):
+        if self._semaphore.locked() and self._waiting >= self.max_waiting:
+            raise LLMOverloadedError(
+                f"{self.in_flight} LLM calls in flight and {self._waiting} waiting"
+            )
+        self._waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self._waiting -= 1
+        self._in_flight += 1
+        try:
+            yield
+        finally:
+            self._in_flight -= 1
+            self._semaphore.release()
@@ -0,0 +1,172 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Awaitable, Callable, TypeVar
+
+from app.config.config import settings
+from .metrics import registry
+
+T = TypeVar("T")
+
+# Spreads a provider call over the configured providers (primary first, then the fallback):
+# - a call still running after the p95 latency of its provider is hedged: the next provider is asked too
+#   and the first answer wins (the other call is cancelled), so about 5% of the calls cost twice;
+# - a failed call falls back on the next provider right away;
+# - a provider failing LLM_BREAKER_FAILURES times in a row is skipped (circuit open) for
+#   LLM_BREAKER_COOLDOWN seconds, then a single trial call decides whether it is used again.
+
+llm_hedged_calls_total = registry.counter(
+    "llm_hedged_calls_total",
+    "Provider calls started because the previous provider was slow",
+    labels=("provider",),
+)
+
+
+class LLMUnavailableError(Exception):
+    """Raised when the circuit of every provider is open"""
+
+
+class ProviderStats:
+    """Rolling window of the last calls of a provider: latency of the successes and outcomes"""
+
+    def __init__(self, window: int):
+        self.latencies: deque[float] = deque(maxlen=window)
+        self.outcomes: deque[bool] = deque(maxlen=window)
+        self.consecutive_failures = 0
+        # Circuit open since (monotonic clock), None: closed
+        self.opened_at: float | None = None
+        self.trial_in_flight = False
+
+    def quantile(self, q: float) -> float | None:
+        if len(self.latencies) < settings.LLM_HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[round(q * (len(ordered) - 1))]
+
+    @property
+    def error_rate(self) -> float:
+        return self.outcomes.count(False) / len(self.outcomes) if self.outcomes else 0.0
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def allow(self) -> bool:
+        """Closed: yes. Open: no, but one trial call once the cooldown is over (half-open)."""
+        if self.opened_at is None:
+            return True
+        if self.trial_in_flight:
+            return False
+        if time.monotonic() - self.opened_at < settings.LLM_BREAKER_COOLDOWN:
+            return False
+        self.trial_in_flight = True
+        return True
+
+    def record_success(self, latency: float):
+        self.latencies.append(latency)
+        self.outcomes.append(True)
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    def record_failure(self):
+        self.outcomes.append(False)
+        self.consecutive_failures += 1
+        # A failed trial opens it again for a full cooldown
+        if self.trial_in_flight or (
+            self.consecutive_failures >= settings.LLM_BREAKER_FAILURES
+        ):
+            self.opened_at = time.monotonic()
+        self.trial_in_flight = False
+
+    def release_trial(self):
+        # A trial cancelled before it answered (lost a hedge race): let another call try
+        self.trial_in_flight = False
+
+
+class LLMRouter:
+    def __init__(self):
+        self.stats: dict[str, ProviderStats] = {}
+
+    def get_stats(self, provider: str) -> ProviderStats:
+        stats = self.stats.get(provider)
+        if stats is None:
+            stats = self.stats[provider] = ProviderStats(settings.LLM_ROUTER_WINDOW)
+        return stats
+
+    def hedge_delay(self, provider: str) -> float:
+        """Seconds to wait for `provider` before asking the next one"""
+        p = self.get_stats(provider).quantile(settings.LLM_HEDGE_QUANTILE)
+        if p is None:  # not enough calls yet
+            return settings.LLM_HEDGE_DEFAULT_DELAY
+        return max(p, settings.LLM_HEDGE_MIN_DELAY)
+
+    def reset(self):
+        self.stats.clear()
+
+    async def call(
+        self, candidates: list[tuple[str, Callable[[], Awaitable[T]]]]
+    ) -> tuple[str, T]:
+        """(provider, result) of the first provider answering, `candidates` are (provider, call) in order"""
+        queue = list(candidates)
+        pending: dict[asyncio.Task, tuple[str, float]] = {}
+        error: Exception | None = None
+
+        def launch(hedged: bool = False) -> bool:
+            # The next provider whose circuit lets the call through, False if none is left
+            while queue:
+                provider, call = queue.pop(0)
+                if self.get_stats(provider).allow():
+                    if hedged:
+                        llm_hedged_calls_total.inc(provider)
+                    task = asyncio.ensure_future(call())
+                    pending[task] = (provider, time.perf_counter())
+                    return True
+            return False
+
+        if not launch():
+            raise LLMUnavailableError(
+                f"Circuit open for {[provider for provider, _ in candidates]}"
+            )
+        try:
+            while pending:
+                hedge_in = None
+                if queue and settings.LLM_HEDGE_ENABLED:
+                    # Measured from the start of the last call
+                    provider, started = list(pending.values())[-1]
+                    hedge_in = max(
+                        0.0,
+                        self.hedge_delay(provider) - (time.perf_counter() - started),
+                    )
+                done, _ = await asyncio.wait(
+                    pending, timeout=hedge_in, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    launch(hedged=True)
+                    continue
+                for task in done:
+                    provider, started = pending.pop(task)
+                    stats = self.get_stats(provider)
+                    if task.exception() is None:
+                        stats.record_success(time.perf_counter() - started)
+                        return provider, task.result()
+                    error = task.exception()
+                    logging.warning(f"LLM provider {provider} failed: {error!r}")
+                    stats.record_failure()
+                if not pending:
+                    launch()
+            raise error
+        except asyncio.CancelledError:
+            # The caller's timeout: the calls still running count as failed
+            for provider, _ in pending.values():
+                self.get_stats(provider).record_failure()
+            raise
+        finally:
+            # The losers of a hedge race, or all the calls on a timeout
+            for task, (provider, _) in pending.items():
+                task.cancel()
+                self.get_stats(provider).release_trial()
+
+
+llm_router = LLMRouter()
@@ -0,0 +1,80 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Any
+
+from fastapi import HTTPException
+from sqlalchemy import and_, or_
+
+# The cursor of the next page is returned in a header, so the page body stays a plain list
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(key: str, values: list[Any]) -> str:
+    """Opaque token holding the sort key and the sort values of the last row of a page"""
+    values = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    raw = json.dumps({"k": key, "v": values}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _parse_value(value: Any, value_type: type) -> Any:
+    # bool is an int for isinstance, a JSON true/false is not a valid sort value
+    if isinstance(value, bool):
+        raise TypeError("not a sort value")
+    if value_type is datetime:
+        if not isinstance(value, str):
+            raise TypeError("not a datetime")
+        return datetime.fromisoformat(value)
+    if value_type is float and isinstance(value, (int, float)):
+        return float(value)
+    if not isinstance(value, value_type):
+        raise TypeError(f"not a {value_type.__name__}")
+    return value
+
+
+def decode_cursor(token: str, key: str, types: list[type]) -> list[Any]:
+    """
+    The sort values of a cursor issued for `key`, checked against the types of the sort columns
+    (int, float, str or datetime). Only the last one, the primary key, can't be NULL. 400 if invalid
+    """
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        values = payload["v"]
+        if payload["k"] != key or not isinstance(values, list):
+            raise ValueError("cursor was issued for another sort key")
+        if len(values) != len(types) or values[-1] is None:
+            raise ValueError("cursor doesn't match the sort columns")
+        return [
+            None if value is None else _parse_value(value, value_type)
+            for value, value_type in zip(values, types)
+        ]
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def keyset_after(columns: list, values: list[Any], descending: bool = False):
+    """
+    WHERE clause selecting the rows that come after `values` in the (ascending, NULLs first) order of `columns`,
+    or in the exact reverse order (descending, NULLs last) when `descending`.
+    e.g. for (scheduled_for, id): scheduled_for > v0 OR (scheduled_for = v0 AND id > v1)
+    The last column must be unique and not null (the primary key) so that the order is total.
+    """
+    clauses = []
+    for i, (column, value) in enumerate(zip(columns, values)):
+        equal_prefix = [
+            c.is_(None) if v is None else c == v
+            for c, v in zip(columns[:i], values[:i])
+        ]
+        if not descending:
+            # NULLs sort first, so every non-NULL value comes after a NULL
+            beyond = column.is_not(None) if value is None else column > value
+        elif value is None:
+            continue  # NULLs sort last, nothing comes after a NULL but other NULLs
+        elif i == len(columns) - 1:
+            beyond = column < value  # the primary key is never NULL
+        else:
+            beyond = or_(column < value, column.is_(None))
+        clauses.append(and_(*equal_prefix, beyond))
+    return or_(*clauses)
@@ -0,0 +1,99 @@
+import hashlib
+from collections import OrderedDict
+from typing import Awaitable, Callable
+
+from fastapi import Request, Response
+
+from app.config.config import settings
+from .serialization import serialize
+
+# Conditional GETs of the task and tag endpoints.
+# The ETag is derived from the version of the served rows (app/db/versions.py), read with a single cheap query:
+# a client sending it back in If-None-Match gets a 304 without the entities being loaded or serialized.
+# The serialized bodies are also kept in an LRU, keyed by URL and checked against the ETag, so a stale entry
+# is never served, even when another worker made the write; the writes of this process clear it right away.
+
+
+class ResponseCache:
+    """In-process LRU: URL -> (ETag, body, headers)"""
+
+    def __init__(self, max_entries: int, enabled: bool = True):
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, tuple[str, bytes, dict[str, str]]] = (
+            OrderedDict()
+        )
+
+    def get(self, key: str, etag: str) -> tuple[bytes, dict[str, str]] | None:
+        entry = self._entries.get(key) if self.enabled else None
+        if entry is None or entry[0] != etag:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1], entry[2]
+
+    def put(self, key: str, etag: str, body: bytes, headers: dict[str, str]):
+        if not self.enabled:
+            return
+        self._entries[key] = (etag, body, headers)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self):
+        # A task is served with its tags and a tag with its tasks: any write may change any entry
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+response_cache = ResponseCache(
+    max_entries=settings.RESPONSE_CACHE_MAX_ENTRIES,
+    enabled=settings.RESPONSE_CACHE_ENABLED,
+)
+
+
+def make_etag(key: str, version: str) -> str:
+    # Strong ETag: the same version of the same URL is always serialized to the same bytes
+    return '"' + hashlib.sha256(f"{key}\0{version}".encode()).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses the weak comparison
+    candidates = (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+    return etag in candidates
+
+
+async def cached_response(
+    request: Request,
+    version: str,
+    response_model,
+    load: Callable[[], Awaitable[tuple[object, dict[str, str]]]],
+) -> Response:
+    """
+    Response of a GET whose content is at `version`: 304 if the client has it, else the cached or
+    freshly serialized body. `load` returns the content and the headers of the response.
+    """
+    key = str(request.url.path) + "?" + str(request.url.query)
+    etag = make_etag(key, version)
+    # no-cache: the browser may keep the response, but revalidates it on every use
+    cache_headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=cache_headers)
+    cached = response_cache.get(key, etag)
+    if cached is None:
+        content, headers = await load()
+        cached = serialize(content, response_model), headers
+        response_cache.put(key, etag, *cached)
+    body, headers = cached
+    return Response(
+        content=body, media_type="application/json", headers=headers | cache_headers
+    )
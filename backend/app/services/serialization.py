@@ -0,0 +1,86 @@
+from functools import lru_cache
+from typing import AsyncIterator, Callable, get_args, get_origin
+
+import orjson
+from fastapi import Response
+from pydantic import BaseModel, TypeAdapter
+
+from app.config.config import settings
+
+# JSON bodies of the read endpoints.
+# FastAPI validates every ORM row into the response model, then encodes the result again. Our rows come
+# straight from the DB and are already valid: the fast path (FAST_JSON) copies their attributes into dicts,
+# with a function built once per response model, and orjson encodes them (datetimes included).
+# The output is the same as FastAPI's for the models we serve (naive datetimes, no custom serializers).
+
+
+def _is_model(annotation) -> bool:
+    return isinstance(annotation, type) and issubclass(annotation, BaseModel)
+
+
+def _model_serializer(model: type[BaseModel]) -> Callable[[object], dict]:
+    model.model_rebuild()  # resolves the forward references, e.g. list["TagResponse"]
+    fields = []
+    for name, field in model.model_fields.items():
+        annotation = field.annotation
+        if _is_model(annotation):
+            fields.append((name, _model_serializer(annotation)))
+        elif get_origin(annotation) is list and _is_model(get_args(annotation)[0]):
+            fields.append((name, _list_serializer(get_args(annotation)[0])))
+        else:
+            fields.append((name, None))
+
+    def serialize(obj) -> dict:
+        return {
+            name: getattr(obj, name) if sub is None else sub(getattr(obj, name))
+            for name, sub in fields
+        }
+
+    return serialize
+
+
+def _list_serializer(model: type[BaseModel]) -> Callable[[list], list[dict]]:
+    serialize_item = _model_serializer(model)
+    return lambda items: [serialize_item(item) for item in items]
+
+
+@lru_cache
+def get_serializer(response_model) -> Callable:
+    """Function turning ORM objects into JSON-ready dicts, for a model or a list of models"""
+    if get_origin(response_model) is list:
+        return _list_serializer(get_args(response_model)[0])
+    return _model_serializer(response_model)
+
+
+@lru_cache
+def _get_adapter(response_model) -> TypeAdapter:
+    return TypeAdapter(response_model)
+
+
+def serialize(content, response_model) -> bytes:
+    """JSON body of `content` (ORM objects) as FastAPI would send it for `response_model`"""
+    if settings.FAST_JSON:
+        return orjson.dumps(get_serializer(response_model)(content))
+    adapter = _get_adapter(response_model)
+    return adapter.dump_json(adapter.validate_python(content, from_attributes=True))
+
+
+def json_response(
+    content, response_model, headers: dict[str, str] | None = None
+) -> Response:
+    return Response(
+        content=serialize(content, response_model),
+        media_type="application/json",
+        headers=headers,
+    )
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Lines of a streamed body (NDJSON), holding no more than a line and a chunk in memory"""
+    rest = b""
+    async for chunk in chunks:
+        *lines, rest = (rest + chunk).split(b"\n")
+        for line in lines:
+            yield line
+    if rest:
+        yield rest
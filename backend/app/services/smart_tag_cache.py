@@ -0,0 +1,175 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+from sqlalchemy.engine import make_url
+
+from app.config.config import settings
+
+
+def normalize_text(text: str | None) -> str:
+    """Casefold and collapse the whitespace, so trivially different texts share a cache entry"""
+    return " ".join((text or "").casefold().split())
+
+
+def get_default_cache_path(database_url: str) -> str:
+    # Next to the app DB when it is a SQLite file, in data/ otherwise
+    try:
+        url_obj = make_url(database_url)
+    except Exception:
+        url_obj = None
+    if (
+        url_obj is not None
+        and url_obj.get_backend_name() == "sqlite"
+        and url_obj.database not in (None, "", ":memory:")
+    ):
+        return os.path.join(os.path.dirname(url_obj.database), "llm_cache.db")
+    return os.path.join("data", "llm_cache.db")
+
+
+class SmartTagCache:
+    """
+    Persistent cache of the LLM tag suggestions, in its own SQLite file.
+    Entries are keyed by a hash of the normalized task text, its current tags and the tag vocabulary,
+    expire after `ttl` seconds, and the least recently used ones are evicted above `max_entries`.
+    """
+
+    def __init__(self, path: str, ttl: float, max_entries: int, enabled: bool = True):
+        self.hits = 0
+        self.misses = 0
+        self._connection: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+        self.configure(path=path, ttl=ttl, max_entries=max_entries, enabled=enabled)
+
+    def configure(
+        self,
+        path: str,
+        ttl: float | None = None,
+        max_entries: int | None = None,
+        enabled: bool | None = None,
+    ):
+        """(Re)point the cache to `path` and reset the counters"""
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+        self.path = path
+        if ttl is not None:
+            self.ttl = ttl
+        if max_entries is not None:
+            self.max_entries = max_entries
+        if enabled is not None:
+            self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    @staticmethod
+    def make_key(
+        title: str | None,
+        description: str | None,
+        current_tags: list[str],
+        vocabulary_fingerprint: str,
+    ) -> str:
+        parts = [
+            normalize_text(title),
+            normalize_text(description),
+            ",".join(sorted(normalize_text(t) for t in current_tags)),
+            vocabulary_fingerprint,
+        ]
+        return hashlib.sha256("\0".join(parts).encode()).hexdigest()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS smart_tag_cache ("
+                "key TEXT PRIMARY KEY, result TEXT NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS ix_smart_tag_cache_accessed_at "
+                "ON smart_tag_cache (accessed_at)"
+            )
+            connection.commit()
+            self._connection = connection
+        return self._connection
+
+    def _get(self, key: str) -> str | None:
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            row = connection.execute(
+                "SELECT result FROM smart_tag_cache WHERE key = ? AND created_at > ?",
+                (key, now - self.ttl),
+            ).fetchone()
+            if row is not None:
+                connection.execute(
+                    "UPDATE smart_tag_cache SET accessed_at = ? WHERE key = ?",
+                    (now, key),
+                )
+                connection.commit()
+        return row[0] if row else None
+
+    def _put(self, key: str, result: str):
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            connection.execute(
+                "INSERT OR REPLACE INTO smart_tag_cache VALUES (?, ?, ?, ?)",
+                (key, result, now, now),
+            )
+            (count,) = connection.execute(
+                "SELECT count(*) FROM smart_tag_cache"
+            ).fetchone()
+            if count > self.max_entries:
+                # LRU eviction
+                connection.execute(
+                    "DELETE FROM smart_tag_cache WHERE key IN ("
+                    "SELECT key FROM smart_tag_cache ORDER BY accessed_at LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+            connection.commit()
+
+    def _clear(self):
+        with self._lock:
+            connection = self._connect()
+            connection.execute("DELETE FROM smart_tag_cache")
+            connection.commit()
+
+    # The SQLite calls are short but blocking, keep them off the event loop
+    async def get(self, key: str) -> str | None:
+        if not self.enabled:
+            return None
+        result = await asyncio.to_thread(self._get, key)
+        if result is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return result
+
+    async def put(self, key: str, result: str):
+        if self.enabled:
+            await asyncio.to_thread(self._put, key, result)
+
+    async def clear(self):
+        await asyncio.to_thread(self._clear)
+
+
+smart_tag_cache = SmartTagCache(
+    path=settings.LLM_CACHE_PATH or get_default_cache_path(settings.DATABASE_URL),
+    ttl=settings.LLM_CACHE_TTL,
+    max_entries=settings.LLM_CACHE_MAX_ENTRIES,
+    enabled=settings.LLM_CACHE_ENABLED,
+)
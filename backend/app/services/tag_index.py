@@ -0,0 +1,156 @@
+import itertools
+import re
+from collections import Counter
+
+import numpy as np
+
+WORD_PATTERN = re.compile(r"\w+")
+
+
+def char_ngrams(text: str, n: int = 3) -> list[str]:
+    padded = f" {text} "
+    return [padded[i : i + n] for i in range(len(padded) - n + 1)]
+
+
+def _segment_starts(values: np.ndarray) -> np.ndarray:
+    """Indices where a new run of equal values starts in the sorted `values`"""
+    return np.flatnonzero(np.r_[True, values[1:] != values[:-1]])
+
+
+class TagIndex:
+    """
+    Local TF-IDF index over the tag names (character trigrams), CPU only.
+    A task is compared word by word (and word pair by word pair) with every tag at once,
+    a tag scores the best cosine similarity among them: 1.0 when the task mentions the tag name.
+    Stored as an inverted index (trigram -> tags having it, with their weight), in flat arrays: the memory
+    grows with the total length of the names, and a query only reads the postings of its own trigrams.
+    """
+
+    # Words and word pairs of a task scored at most (the first ones): a long description costs no more
+    MAX_UNITS = 512
+
+    def __init__(self, names: list[str]):
+        self.names = names
+        counts_per_name = [Counter(char_ngrams(name.casefold())) for name in names]
+        self._columns: dict[str, int] = {}
+        for counts in counts_per_name:
+            for gram in counts:
+                self._columns.setdefault(gram, len(self._columns))
+
+        document_frequency = np.zeros(len(self._columns), dtype=np.float32)
+        for counts in counts_per_name:
+            document_frequency[[self._columns[gram] for gram in counts]] += 1
+        self._idf = (np.log((1 + len(names)) / (1 + document_frequency)) + 1).astype(
+            np.float32
+        )
+
+        # (column, row, weight) of every trigram of every tag, the weights normalized per tag
+        columns, rows, weights = [], [], []
+        for row, counts in enumerate(counts_per_name):
+            tag_columns = [self._columns[gram] for gram in counts]
+            tag_weights = np.fromiter(counts.values(), np.float32, len(counts))
+            tag_weights = self._normalize(tag_weights * self._idf[tag_columns])
+            columns.extend(tag_columns)
+            rows.extend([row] * len(counts))
+            weights.append(tag_weights)
+        columns = np.asarray(columns, dtype=np.int32)
+        order = np.argsort(columns, kind="stable")
+        # Postings of the column c: self._rows[self._offsets[c] : self._offsets[c + 1]]
+        self._offsets = np.searchsorted(
+            columns[order], np.arange(len(self._columns) + 1)
+        )
+        self._rows = np.asarray(rows, dtype=np.int32)[order]
+        self._weights = (
+            np.concatenate(weights)[order] if weights else np.zeros(0, np.float32)
+        )
+
+    @staticmethod
+    def _normalize(vector: np.ndarray) -> np.ndarray:
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def scores(self, text: str) -> np.ndarray:
+        """Similarity in [0, 1] of `text` with every tag, in the order of `names`"""
+        words = WORD_PATTERN.findall(text.casefold())
+        # Each distinct unit once, and at most MAX_UNITS of them (the title comes first)
+        units = list(
+            dict.fromkeys(words + [f"{a} {b}" for a, b in zip(words, words[1:])])
+        )
+        units = units[: self.MAX_UNITS]
+        # (unit, column) of the n-grams of every unit, those absent from every tag name can't match
+        keys = [
+            unit * len(self._columns) + column
+            for unit, unit_text in enumerate(units)
+            for gram in char_ngrams(unit_text)
+            if (column := self._columns.get(gram)) is not None
+        ]
+        similarities = np.zeros(len(self.names), dtype=np.float32)
+        if not keys:
+            return similarities
+        keys, counts = np.unique(keys, return_counts=True)
+        unit_of, columns = np.divmod(keys, len(self._columns))
+        # TF-IDF vector of each unit, normalized per unit
+        weights = counts * self._idf[columns]
+        weights /= np.sqrt(np.bincount(unit_of, weights=weights**2))[unit_of]
+
+        # Postings of every entry at once: the ranges self._offsets[c] : self._offsets[c + 1], concatenated
+        starts = self._offsets[columns]
+        lengths = self._offsets[columns + 1] - starts
+        ends = np.cumsum(lengths)
+        postings = np.arange(ends[-1]) + np.repeat(starts - (ends - lengths), lengths)
+        # Postings sorted by (tag, unit): the cosine similarity of each (unit, tag) pair sharing a trigram is
+        # a sum over a segment, the best unit of each tag a max over the following ones. Memory and time grow
+        # with the postings read, not with units x tags
+        pairs = self._rows[postings] * len(units) + np.repeat(unit_of, lengths)
+        order = np.argsort(pairs)
+        pairs = pairs[order]
+        first = _segment_starts(pairs)
+        pair_scores = np.add.reduceat(
+            (self._weights[postings] * np.repeat(weights, lengths))[order], first
+        )
+        tags = pairs[first] // len(units)
+        first = _segment_starts(tags)
+        similarities[tags[first]] = np.maximum.reduceat(pair_scores, first)
+        return similarities
+
+    def rank(
+        self, text: str, exclude: set[str] = frozenset(), limit: int | None = None
+    ) -> list[tuple[str, float]]:
+        """
+        (name, score) of the `limit` most similar tags (all by default), without the casefolded names
+        in `exclude`. Only the matching tags are sorted, the others follow in the vocabulary order
+        """
+        scores = self.scores(text)
+        matched = np.flatnonzero(scores)
+        # stable sort: equal scores keep the vocabulary order
+        matched = matched[np.argsort(-scores[matched], kind="stable")]
+        ranked = []
+        for i in itertools.chain(matched, np.flatnonzero(scores == 0)):
+            if limit is not None and len(ranked) == limit:
+                break
+            if self.names[i].casefold() not in exclude:
+                ranked.append((self.names[i], float(scores[i])))
+        return ranked
+
+
+_index: tuple[str, TagIndex] | None = None  # (vocabulary fingerprint, index)
+
+
+def get_tag_index(names: list[str], fingerprint: str) -> TagIndex:
+    """The index of the current vocabulary, rebuilt only when the vocabulary changed"""
+    global _index
+    if _index is None or _index[0] != fingerprint:
+        _index = (fingerprint, TagIndex(names))
+    return _index[1]
+
+
+def preselect(
+    ranked: list[tuple[str, float]], top_k: int, threshold: float
+) -> tuple[str | None, list[str]]:
+    """
+    (confident match, candidates): the best tag if its score reaches `threshold`, so the LLM
+    can be skipped, and the `top_k` best tags to put in the prompt otherwise.
+    """
+    if ranked and ranked[0][1] >= threshold:
+        return ranked[0][0], []
+    return None, [name for name, _ in ranked[:top_k]]
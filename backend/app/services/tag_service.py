@@ -1,45 +1,94 @@
-from sqlmodel import Session, select
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy.orm import selectinload
 from fastapi import HTTPException
+from datetime import datetime
+from app.db.versions import (
+    bump_table_versions,
+    get_row_version,
+    get_table_version,
+    touch_tasks_of_tags,
+)
 from app.schemas.task_tag import Tag, TagCreate, TagUpdate
+from .pagination import decode_cursor, encode_cursor, keyset_after
+from .response_cache import response_cache
+from .tag_vocabulary import tag_vocabulary
 
 
 class TagService:
-    def __init__(self, session: Session):
+    def __init__(self, session: AsyncSession):
         self.session = session
 
-    def create_tag(self, tag_create: TagCreate) -> Tag:
+    async def _commit(self):
+        await bump_table_versions(self.session)
+        await self.session.commit()
+        response_cache.invalidate()
+
+    async def get_tag_version(self, tag_id: int) -> str:
+        """Version of the tag and its tasks, to answer conditional GETs without loading them"""
+        version = await get_row_version(self.session, Tag.__table__, tag_id)
+        if version is None:
+            raise HTTPException(status_code=404, detail="Tag not found")
+        return version
+
+    async def get_tags_version(self) -> str:
+        """Version of every tag (and their tasks), the ETag of the tag pages"""
+        return await get_table_version(self.session, Tag.__table__)
+
+    async def create_tag(self, tag_create: TagCreate) -> Tag:
         tag_db = Tag.model_validate(tag_create)
         self.session.add(tag_db)
-        self.session.commit()
-        self.session.refresh(tag_db)
-        return tag_db
+        await self._commit()
+        tag_vocabulary.add(tag_db.id, tag_db.tag)
+        return await self.get_tag(tag_db.id)
 
-    def get_tag_page(self, offset: int, limit: int):
-        return self.session.exec(select(Tag).offset(offset).limit(limit)).all()
+    async def get_tag_page(self, offset: int, limit: int, after: str | None = None):
+        # selectinload fetches the tasks of the whole page in one extra query (instead of one lazy load per tag)
+        statement = select(Tag).options(selectinload(Tag.tasks))
+        if after is not None:
+            # Keyset pagination: seek directly to the rows after the cursor instead of scanning `offset` rows
+            statement = statement.where(
+                keyset_after([Tag.id], decode_cursor(after, key="id", types=[int]))
+            )
+        statement = statement.order_by(Tag.id).offset(offset).limit(limit)
+        return (await self.session.exec(statement)).all()
 
-    def get_tag(self, tag_id: int) -> Tag:
-        tag_db = self.session.get(Tag, tag_id)
+    def get_tag_page_cursor(self, tag: Tag) -> str:
+        """Cursor pointing right after `tag`, the last tag of a page"""
+        return encode_cursor("id", [tag.id])
+
+    async def get_tag(self, tag_id: int) -> Tag:
+        statement = select(Tag).where(Tag.id == tag_id).options(selectinload(Tag.tasks))
+        tag_db = (await self.session.exec(statement)).first()
         if not tag_db:
             raise HTTPException(status_code=404, detail="Tag not found")
         return tag_db
 
-    def delete_tag(self, tag_id: int):
-        tag_db = self.session.get(Tag, tag_id)
+    async def get_tags(self, tag_ids: list[int]) -> list[Tag]:
+        """The existing tags among `tag_ids`"""
+        return list(
+            (await self.session.exec(select(Tag).where(Tag.id.in_(tag_ids)))).all()
+        )
+
+    async def delete_tag(self, tag_id: int):
+        tag_db = await self.session.get(Tag, tag_id)
         if not tag_db:
             raise HTTPException(status_code=404, detail="Tag not found")
-        self.session.delete(tag_db)
-        self.session.commit()
+        await touch_tasks_of_tags(self.session, [tag_id])
+        await self.session.delete(tag_db)
+        await self._commit()
+        tag_vocabulary.remove(tag_id, tag_db.tag)
 
-    def edit_tag(self, tag_id: int, tag_update: TagUpdate) -> Tag:
+    async def edit_tag(self, tag_id: int, tag_update: TagUpdate) -> Tag:
         # exclude_unset=True : This tells Pydantic to not include the values that were not sent by the client.
         tag_update_dumped = tag_update.model_dump(exclude_unset=True)
 
-        tag_db = self.session.get(Tag, tag_id)
-        if not tag_db:
-            raise HTTPException(status_code=404, detail="Tag not found")
-        tag_db.sqlmodel_update(tag_update_dumped)
+        tag_db = await self.get_tag(tag_id)
+        old_name = tag_db.tag
+        tag_db.sqlmodel_update(tag_update_dumped | {"updated_at": datetime.now()})
 
         self.session.add(tag_db)
-        self.session.commit()
-        self.session.refresh(tag_db)
+        await touch_tasks_of_tags(self.session, [tag_id])
+        await self._commit()
+        tag_vocabulary.rename(tag_id, old_name, tag_db.tag)
         return tag_db
@@ -0,0 +1,98 @@
+import bisect
+import hashlib
+import time
+
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.config.config import settings
+from app.schemas.task_tag import Tag
+
+
+class TagVocabulary:
+    """
+    In-process cache of the tag names: casefolded name -> [(id, name)] of the tags with that name, oldest first.
+    Loaded once with a single query, then kept up to date by TagService on create/edit/delete,
+    so the AI path matches tag names in O(1) instead of scanning the Tag table on every call.
+    Writes made by other processes are picked up when the cache expires (TAG_VOCABULARY_TTL).
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        # bumped on every change, to key caches that depend on the vocabulary
+        self.version = 0
+        self._tags: dict[str, list[tuple[int, str]]] | None = None
+        self._loaded_at = 0.0
+        self._fingerprint: tuple[int, str] | None = None  # (version, hash)
+
+    @property
+    def is_loaded(self) -> bool:
+        if self._tags is None:
+            return False
+        return self.ttl <= 0 or time.monotonic() - self._loaded_at < self.ttl
+
+    async def load(self, session: AsyncSession):
+        rows = (await session.exec(select(Tag.id, Tag.tag).order_by(Tag.id))).all()
+        tags = {}
+        for tag_id, name in rows:
+            tags.setdefault(name.casefold(), []).append((tag_id, name))
+        self._tags = tags
+        self._loaded_at = time.monotonic()
+        self.version += 1
+
+    async def ensure_loaded(self, session: AsyncSession):
+        if not self.is_loaded:
+            await self.load(session)
+
+    def invalidate(self):
+        self._tags = None
+        self.version += 1
+
+    def lookup(self, name: str) -> int | None:
+        """
+        Id of the tag named `name` (case insensitive), None if there is none.
+        With several tags of the same name, the oldest one wins
+        """
+        entries = (self._tags or {}).get(name.casefold())
+        return entries[0][0] if entries else None
+
+    def fingerprint(self) -> str:
+        """Hash of the tag names: unlike `version`, the same for every process and across restarts"""
+        if self._fingerprint is None or self._fingerprint[0] != self.version:
+            names = "\0".join(sorted(self._tags or {}))
+            self._fingerprint = (
+                self.version,
+                hashlib.sha256(names.encode()).hexdigest(),
+            )
+        return self._fingerprint[1]
+
+    def names(self) -> list[str]:
+        return [entries[0][1] for entries in (self._tags or {}).values()]
+
+    def add(self, tag_id: int, name: str):
+        if self._tags is None:
+            return  # not loaded yet, the next load will see the tag
+        bisect.insort(self._tags.setdefault(name.casefold(), []), (tag_id, name))
+        self.version += 1
+
+    def remove(self, tag_id: int, name: str):
+        if self._tags is None:
+            return
+        key = name.casefold()
+        entries = self._tags.get(key, [])
+        # Only this tag: another tag with the same name keeps the name in the vocabulary
+        kept = [entry for entry in entries if entry[0] != tag_id]
+        if len(kept) == len(entries):
+            return
+        if kept:
+            self._tags[key] = kept
+        else:
+            del self._tags[key]
+        self.version += 1
+
+    def rename(self, tag_id: int, old_name: str, new_name: str):
+        self.remove(tag_id, old_name)
+        self.add(tag_id, new_name)
+
+
+tag_vocabulary = TagVocabulary(ttl=settings.TAG_VOCABULARY_TTL)
@@ -1,55 +1,618 @@
-from sqlmodel import Session, select
+from datetime import datetime
+from typing import AsyncIterator, Literal
+
+from pydantic import ValidationError
+
+from sqlalchemy import delete, exists, func, insert, literal_column, tuple_, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy.orm import selectinload
 from fastapi import HTTPException
-from app.schemas.task_tag import Task, TaskCreate, TaskUpdate, Tag
+from app.config.config import settings
+from app.db.versions import (
+    bump_table_versions,
+    get_row_version,
+    get_table_version,
+    touch_tags,
+    touch_tags_of_tasks,
+    touch_tasks,
+)
+from app.db.search import (
+    get_fts_query,
+    get_task_tsvector,
+    get_tsquery,
+    index_tasks,
+    is_postgres,
+    task_fts,
+    unindex_tasks,
+)
+from app.schemas.link import TaskTagLink
+from app.schemas.task_tag import (
+    Task,
+    TaskBulkUpdate,
+    TaskCreate,
+    TaskFilter,
+    TaskIds,
+    TaskImport,
+    TaskImportResult,
+    TaskResponseWithTags,
+    TaskTagBulkResponse,
+    TaskTagPair,
+    TaskTagPairResult,
+    TaskUpdate,
+    Tag,
+)
+from .pagination import decode_cursor, encode_cursor, keyset_after
+from .response_cache import response_cache
+from .serialization import serialize
+from .tag_vocabulary import tag_vocabulary
+
+# "-" for the descending order
+TaskPageOrder = Literal[
+    "id", "-id", "scheduled_for", "-scheduled_for", "created_at", "-created_at"
+]
+
+
+def _task_sort_columns(order_by: TaskPageOrder) -> list:
+    # Every order is served by an index: the primary key, the scheduled_for and created_at indexes (+ rowid)
+    key = order_by.lstrip("-")
+    if key == "scheduled_for":
+        return [Task.scheduled_for, Task.id]
+    if key == "created_at":
+        return [Task.created_at, Task.id]
+    return [Task.id]
+
+
+def _task_filter_clauses(filters: TaskFilter) -> list:
+    clauses = []
+    if filters.is_done is not None:
+        clauses.append(Task.is_done == filters.is_done)
+    if filters.scheduled_from is not None:
+        clauses.append(Task.scheduled_for >= filters.scheduled_from)
+    if filters.scheduled_to is not None:
+        clauses.append(Task.scheduled_for < filters.scheduled_to)
+    if filters.created_from is not None:
+        clauses.append(Task.created_at >= filters.created_from)
+    if filters.created_to is not None:
+        clauses.append(Task.created_at < filters.created_to)
+    # On the link table only (not Task.tags.any(), which joins the tag table too)
+    if filters.has_tags is not None:
+        has_tags = exists().where(TaskTagLink.task_id == Task.id)
+        clauses.append(has_tags if filters.has_tags else ~has_tags)
+    if filters.tag_ids:
+        tagged = select(TaskTagLink.task_id).where(
+            TaskTagLink.tag_id.in_(filters.tag_ids)
+        )
+        clauses.append(Task.id.in_(tagged))
+    return clauses
+
+
+def get_task_page_statement(
+    offset: int,
+    limit: int,
+    after: str | None = None,
+    order_by: TaskPageOrder = "id",
+    filters: TaskFilter | None = None,
+):
+    columns = _task_sort_columns(order_by)
+    descending = order_by.startswith("-")
+    # selectinload fetches the tags of the whole page in one extra query (instead of one lazy load per task)
+    statement = select(Task).options(selectinload(Task.tags))
+    if filters is not None:
+        statement = statement.where(*_task_filter_clauses(filters))
+    if after is not None:
+        # Keyset pagination: seek directly to the rows after the cursor instead of scanning `offset` rows
+        # (scheduled_for or created_at, id) or (id,)
+        types = [datetime] * (len(columns) - 1) + [int]
+        values = decode_cursor(after, key=order_by, types=types)
+        statement = statement.where(keyset_after(columns, values, descending))
+    # The NULLs placement only on the nullable columns: the NOT NULL ones keep the plain btree order
+    order = [
+        (c.desc().nulls_last() if descending else c.asc().nulls_first())
+        if c.expression.nullable
+        else (c.desc() if descending else c.asc())
+        for c in columns
+    ]
+    return statement.order_by(*order).offset(offset).limit(limit)
+
+
+# "rank": best match first, "newest": the newest matches first
+SearchOrder = Literal["rank", "newest"]
+
+
+def get_search_rank(query: str, postgres: bool = False):
+    """Relevance of a matching task, lower is better: bm25 on SQLite, the negated ts_rank on Postgres"""
+    if postgres:
+        return -func.ts_rank(get_task_tsvector(), get_tsquery(query))
+    return task_fts.c.rank
+
+
+def get_search_statement(
+    query: str,
+    limit: int,
+    after: list | None = None,
+    order: SearchOrder = "rank",
+    postgres: bool = False,
+):
+    """
+    The matching tasks, `limit` at a time after the sort values `after` of the previous page.
+    "rank": (Task, rank) rows, keyset on (rank, id). Every match is scored and sorted on each page, and
+    a write between two pages changes the statistics behind the ranks, so the cursor is only approximate.
+    "newest": Task rows, keyset on the id, which no write can shift. Nothing is scored: on SQLite FTS5
+    hands out the matches in rowid order and a page reads `limit` of them whatever their number, on Postgres
+    the planner walks the primary key backwards for the common words, the GIN index for the rare ones.
+    """
+    if order == "newest":
+        if postgres:
+            statement = select(Task).where(
+                get_task_tsvector().op("@@")(get_tsquery(query))
+            )
+            if after is not None:
+                statement = statement.where(Task.id < after[0])
+        else:
+            page = select(task_fts.c.rowid).where(
+                literal_column("task_fts").op("MATCH")(get_fts_query(query))
+            )
+            if after is not None:
+                page = page.where(task_fts.c.rowid < after[0])
+            page = page.order_by(task_fts.c.rowid.desc()).limit(limit).subquery()
+            statement = select(Task).join(page, page.c.rowid == Task.id)
+        return (
+            statement.options(selectinload(Task.tags))
+            .order_by(Task.id.desc())
+            .limit(limit)
+        )
+
+    rank = get_search_rank(query, postgres)
+    if postgres:
+        statement = select(Task, rank).where(
+            get_task_tsvector().op("@@")(get_tsquery(query))
+        )
+    else:
+        statement = (
+            select(Task, rank)
+            .join(task_fts, task_fts.c.rowid == Task.id)
+            .where(literal_column("task_fts").op("MATCH")(get_fts_query(query)))
+        )
+    if after is not None:
+        # Keyset pagination on (rank, id), like the task pages
+        statement = statement.where(keyset_after([rank, Task.id], after))
+    return (
+        statement.options(selectinload(Task.tags)).order_by(rank, Task.id).limit(limit)
+    )
 
 
 class TaskService:
-    def __init__(self, session: Session):
+    def __init__(self, session: AsyncSession):
         self.session = session
 
-    def create_task(self, task_create: TaskCreate) -> Task:
+    async def _commit(self):
+        await bump_table_versions(self.session)
+        await self.session.commit()
+        response_cache.invalidate()
+
+    async def get_task_version(self, task_id: int) -> str:
+        """Version of the task and its tags, to answer conditional GETs without loading them"""
+        version = await get_row_version(self.session, Task.__table__, task_id)
+        if version is None:
+            raise HTTPException(status_code=404, detail="Task not found")
+        return version
+
+    async def get_tasks_version(self) -> str:
+        """Version of every task (and their tags), the ETag of the task pages"""
+        return await get_table_version(self.session, Task.__table__)
+
+    async def create_task(self, task_create: TaskCreate) -> Task:
         task_db = Task.model_validate(task_create)
         self.session.add(task_db)
-        self.session.commit()
-        self.session.refresh(task_db)
-        return task_db
+        await self.session.flush()
+        await index_tasks(self.session, [task_db.id])
+        await self._commit()
+        return await self.get_task(task_db.id)
+
+    # The bulk writes run in one transaction, as executemany statements without a refresh per row
+    def _check_bulk_size(self, count: int):
+        if count > settings.TASK_BULK_MAX_ITEMS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"At most {settings.TASK_BULK_MAX_ITEMS} items per request",
+            )
+
+    async def _check_tasks_exist(self, task_ids: list[int]):
+        statement = select(Task.id).where(Task.id.in_(task_ids))
+        missing = set(task_ids) - set((await self.session.exec(statement)).all())
+        if missing:
+            raise HTTPException(
+                status_code=404, detail=f"Tasks not found: {sorted(missing)}"
+            )
 
-    def get_task_page(self, offset: int, limit: int):
-        return self.session.exec(select(Task).offset(offset).limit(limit)).all()
+    async def create_tasks(self, task_creates: list[TaskCreate]) -> TaskIds:
+        self._check_bulk_size(len(task_creates))
+        rows = [
+            Task.model_validate(task_create).model_dump(exclude={"id"})
+            for task_create in task_creates
+        ]
+        if not rows:
+            return TaskIds(ids=[])
+        ids = await self._insert_tasks(rows)
+        await self._commit()
+        return TaskIds(ids=ids)
 
-    def get_task(self, task_id: int) -> Task:
-        task_db = self.session.get(Task, task_id)
+    async def _insert_tasks(self, rows: list[dict]) -> list[int]:
+        """Insert and index the task rows, their ids in the same order"""
+        # Multi-row INSERT ... RETURNING id, the ids are returned in the order of the payloads.
+        # SQLAlchemy falls back to one INSERT per row to guarantee that order on SQLite,
+        # but SQLite hands out increasing rowids in the order of the VALUES rows: sorting them is enough.
+        is_sqlite = self.session.get_bind().dialect.name == "sqlite"
+        statement = insert(Task).returning(
+            Task.id, sort_by_parameter_order=not is_sqlite
+        )
+        ids = (await self.session.exec(statement, params=rows)).scalars().all()
+        ids = sorted(ids) if is_sqlite else list(ids)
+        await index_tasks(self.session, ids)
+        return ids
+
+    async def edit_tasks(self, task_updates: list[TaskBulkUpdate]) -> TaskIds:
+        self._check_bulk_size(len(task_updates))
+        ids = [task_update.id for task_update in task_updates]
+        await self._check_tasks_exist(ids)
+        # Only the fields sent by the client, payloads with nothing but the id are no-ops
+        rows = [
+            task_update.model_dump(exclude_unset=True) for task_update in task_updates
+        ]
+        rows = [row for row in rows if len(row) > 1]
+        if rows:
+            now = datetime.now()
+            # ORM bulk UPDATE by primary key: one executemany per set of updated columns
+            await self.session.exec(
+                update(Task), params=[row | {"updated_at": now} for row in rows]
+            )
+            await index_tasks(self.session, [row["id"] for row in rows])
+            await touch_tags_of_tasks(self.session, [row["id"] for row in rows])
+        await self._commit()
+        return TaskIds(ids=ids)
+
+    async def delete_tasks(self, task_ids: list[int]) -> TaskIds:
+        self._check_bulk_size(len(task_ids))
+        await self._check_tasks_exist(task_ids)
+        await touch_tags_of_tasks(self.session, task_ids)
+        # The tag links first, the bulk DELETE doesn't go through the relationship
+        await self.session.exec(
+            delete(TaskTagLink).where(TaskTagLink.task_id.in_(task_ids))
+        )
+        await self.session.exec(delete(Task).where(Task.id.in_(task_ids)))
+        await unindex_tasks(self.session, task_ids)
+        await self._commit()
+        return TaskIds(ids=task_ids)
+
+    async def export_tasks(self) -> AsyncIterator[bytes]:
+        """
+        Every task with its tags, as JSON lines (NDJSON) in the format of GET /tasks/{id}.
+        The rows are read through a server-side cursor, TASK_EXPORT_BATCH_SIZE at a time (one chunk each);
+        the identity map of the session only holds weak references, the rows already sent are freed
+        """
+        statement = (
+            select(Task)
+            .options(selectinload(Task.tags))
+            .order_by(Task.id)
+            .execution_options(yield_per=settings.TASK_EXPORT_BATCH_SIZE)
+        )
+        result = await self.session.stream_scalars(statement)
+        async for tasks in result.partitions():
+            yield b"".join(
+                serialize(task, TaskResponseWithTags) + b"\n" for task in tasks
+            )
+
+    async def import_tasks(self, lines: AsyncIterator[bytes]) -> TaskImportResult:
+        """
+        Create a task per JSON line (see TaskImport), TASK_IMPORT_CHUNK_SIZE tasks per transaction.
+        On an invalid line, the previous chunks stay imported.
+        """
+        result = TaskImportResult(imported=0, created_tags=0)
+        chunk: list[TaskImport] = []
+        line_number = 0
+        async for line in lines:
+            line_number += 1
+            if not line.strip():
+                continue
+            try:
+                chunk.append(TaskImport.model_validate_json(line))
+            except ValidationError as e:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Line {line_number}: {e.errors()[0]['msg']} "
+                    f"({result.imported} tasks imported before it)",
+                )
+            if len(chunk) == settings.TASK_IMPORT_CHUNK_SIZE:
+                await self._import_chunk(chunk, result)
+                chunk = []
+        if chunk:
+            await self._import_chunk(chunk, result)
+        return result
+
+    async def _import_chunk(self, chunk: list[TaskImport], result: TaskImportResult):
+        tag_ids, new_tags = await self._resolve_tag_names(
+            {tag.tag for task in chunk for tag in task.tags}
+        )
+        rows = []
+        for task in chunk:
+            task_data = task.model_dump(exclude={"tags"}, exclude_none=True)
+            rows.append(Task.model_validate(task_data).model_dump(exclude={"id"}))
+        task_ids = await self._insert_tasks(rows)
+        links = [
+            {"task_id": task_id, "tag_id": tag_id}
+            for task_id, task in zip(task_ids, chunk)
+            for tag_id in dict.fromkeys(
+                tag_ids[tag.tag.casefold()] for tag in task.tags
+            )
+        ]
+        if links:
+            await self.session.exec(insert(TaskTagLink.__table__), params=links)
+            # The existing tags gained tasks
+            new_ids = {tag_id for tag_id, _ in new_tags}
+            await touch_tags(
+                self.session, list({link["tag_id"] for link in links} - new_ids)
+            )
+        await self._commit()
+        for tag_id, name in new_tags:
+            tag_vocabulary.add(tag_id, name)
+        result.imported += len(chunk)
+        result.created_tags += len(new_tags)
+
+    async def _resolve_tag_names(
+        self, names: set[str]
+    ) -> tuple[dict[str, int], list[tuple[int, str]]]:
+        """
+        (casefolded name -> tag id, (id, name) of the tags created), matching the names case-insensitively
+        like the AI tagging, through the tag vocabulary
+        """
+        await tag_vocabulary.ensure_loaded(self.session)
+        found = {name: tag_vocabulary.lookup(name) for name in names}
+        known = {tag_id for tag_id in found.values() if tag_id is not None}
+        if known:
+            # The vocabulary may miss the deletes of other workers until it expires
+            statement = select(Tag.id).where(Tag.id.in_(known))
+            if len((await self.session.exec(statement)).all()) < len(known):
+                await tag_vocabulary.load(self.session)
+                found = {name: tag_vocabulary.lookup(name) for name in names}
+        tag_ids = {
+            name.casefold(): tag_id
+            for name, tag_id in found.items()
+            if tag_id is not None
+        }
+        # One new tag per casefolded name, with the first spelling met
+        missing = {}
+        for name, tag_id in found.items():
+            if tag_id is None:
+                missing.setdefault(name.casefold(), name)
+        new_tags = []
+        if missing:
+            statement = insert(Tag).returning(Tag.id, Tag.tag)
+            rows = [
+                Tag(tag=name).model_dump(exclude={"id"}) for name in missing.values()
+            ]
+            new_tags = list(
+                map(tuple, (await self.session.exec(statement, params=rows)).all())
+            )
+            tag_ids |= {name.casefold(): tag_id for tag_id, name in new_tags}
+        return tag_ids, new_tags
+
+    async def _check_pairs(
+        self, pairs: list[TaskTagPair]
+    ) -> tuple[list[TaskTagPairResult | None], list[tuple[int, int]]]:
+        """
+        (results with the pairs whose task or tag doesn't exist, None for the others;
+        the distinct valid (task_id, tag_id) pairs), with one query per table
+        """
+        self._check_bulk_size(len(pairs))
+        task_ids = {pair.task_id for pair in pairs}
+        tag_ids = {pair.tag_id for pair in pairs}
+        found_tasks = set(
+            (
+                await self.session.exec(select(Task.id).where(Task.id.in_(task_ids)))
+            ).all()
+        )
+        found_tags = set(
+            (await self.session.exec(select(Tag.id).where(Tag.id.in_(tag_ids)))).all()
+        )
+        results = []
+        for pair in pairs:
+            if pair.task_id not in found_tasks:
+                results.append(
+                    TaskTagPairResult(**pair.model_dump(), status="task_not_found")
+                )
+            elif pair.tag_id not in found_tags:
+                results.append(
+                    TaskTagPairResult(**pair.model_dump(), status="tag_not_found")
+                )
+            else:
+                results.append(None)
+        valid = list(
+            dict.fromkeys(
+                (pair.task_id, pair.tag_id)
+                for pair, result in zip(pairs, results)
+                if result is None
+            )
+        )
+        return results, valid
+
+    @staticmethod
+    def _outcomes(
+        pairs: list[TaskTagPair],
+        results: list[TaskTagPairResult | None],
+        changed: set[tuple[int, int]],
+        done: str,
+        unchanged: str,
+    ) -> TaskTagBulkResponse:
+        # A pair repeated in the request is only changed once
+        reported = set()
+        for i, (pair, result) in enumerate(zip(pairs, results)):
+            if result is None:
+                key = (pair.task_id, pair.tag_id)
+                status = done if key in changed and key not in reported else unchanged
+                reported.add(key)
+                results[i] = TaskTagPairResult(**pair.model_dump(), status=status)
+        return TaskTagBulkResponse(results=results)
+
+    async def insert_links(self, pairs: list[tuple[int, int]]) -> set[tuple[int, int]]:
+        """
+        The (task_id, tag_id) `pairs` that were not linked yet, linked and their task and tag touched.
+        Not committed
+        """
+        if not pairs:
+            return set()
+        # Link rows written directly, the existing links are skipped by the DB (no relationship load)
+        dialect_insert = (
+            postgresql.insert
+            if self.session.get_bind().dialect.name == "postgresql"
+            else sqlite.insert
+        )
+        link = TaskTagLink.__table__
+        statement = (
+            dialect_insert(link)
+            .on_conflict_do_nothing()
+            .returning(link.c.task_id, link.c.tag_id)
+        )
+        rows = [{"task_id": task_id, "tag_id": tag_id} for task_id, tag_id in pairs]
+        inserted = set(
+            map(tuple, (await self.session.exec(statement, params=rows)).all())
+        )
+        await touch_tasks(self.session, [task_id for task_id, _ in inserted])
+        await touch_tags(self.session, [tag_id for _, tag_id in inserted])
+        return inserted
+
+    async def tag_many(self, pairs: list[TaskTagPair]) -> TaskTagBulkResponse:
+        results, valid = await self._check_pairs(pairs)
+        inserted = set()
+        if valid:
+            inserted = await self.insert_links(valid)
+            await self._commit()
+        return self._outcomes(pairs, results, inserted, "tagged", "already_tagged")
+
+    async def untag_many(self, pairs: list[TaskTagPair]) -> TaskTagBulkResponse:
+        results, valid = await self._check_pairs(pairs)
+        deleted = set()
+        if valid:
+            link = TaskTagLink.__table__
+            statement = (
+                delete(link)
+                .where(tuple_(link.c.task_id, link.c.tag_id).in_(valid))
+                .returning(link.c.task_id, link.c.tag_id)
+            )
+            deleted = set(map(tuple, (await self.session.exec(statement)).all()))
+            await touch_tasks(self.session, [task_id for task_id, _ in deleted])
+            await touch_tags(self.session, [tag_id for _, tag_id in deleted])
+            await self._commit()
+        return self._outcomes(pairs, results, deleted, "untagged", "not_tagged")
+
+    async def get_task_page(
+        self,
+        offset: int,
+        limit: int,
+        after: str | None = None,
+        order_by: TaskPageOrder = "id",
+        filters: TaskFilter | None = None,
+    ):
+        statement = get_task_page_statement(
+            offset=offset, limit=limit, after=after, order_by=order_by, filters=filters
+        )
+        return (await self.session.exec(statement)).all()
+
+    def get_task_page_cursor(self, task: Task, order_by: TaskPageOrder = "id") -> str:
+        """Cursor pointing right after `task`, the last task of a page"""
+        return encode_cursor(
+            order_by, [getattr(task, c.key) for c in _task_sort_columns(order_by)]
+        )
+
+    async def search_tasks(
+        self,
+        query: str,
+        limit: int,
+        after: str | None = None,
+        order: SearchOrder = "rank",
+    ) -> tuple[list[Task], str | None]:
+        """
+        (tasks containing every word of `query`, cursor of the next page or None), see get_search_statement
+        """
+        if not get_fts_query(query):
+            return [], None
+        # (rank, id) or (id,)
+        types = [float, int] if order == "rank" else [int]
+        values = None
+        if after is not None:
+            values = decode_cursor(after, key=f"search:{order}", types=types)
+        statement = get_search_statement(
+            query, limit, values, order, postgres=is_postgres(self.session.get_bind())
+        )
+        rows = (await self.session.exec(statement)).all()
+        if order == "rank":
+            tasks = [task for task, _ in rows]
+            last_values = [rows[-1][1], rows[-1][0].id] if rows else None
+        else:
+            tasks = list(rows)
+            last_values = [rows[-1].id] if rows else None
+        next_cursor = None
+        if tasks and len(tasks) == limit:
+            next_cursor = encode_cursor(f"search:{order}", last_values)
+        return tasks, next_cursor
+
+    async def get_task(self, task_id: int) -> Task:
+        statement = (
+            select(Task).where(Task.id == task_id).options(selectinload(Task.tags))
+        )
+        task_db = (await self.session.exec(statement)).first()
         if not task_db:
             raise HTTPException(status_code=404, detail="Task not found")
         return task_db
 
-    def delete_task(self, task_id: int):
-        task_db = self.session.get(Task, task_id)
+    async def get_tasks(self, task_ids: list[int]) -> list[Task]:
+        """The existing tasks among `task_ids`, with their tags"""
+        statement = (
+            select(Task)
+            .where(Task.id.in_(task_ids))
+            .options(selectinload(Task.tags))
+            .order_by(Task.id)
+        )
+        return list((await self.session.exec(statement)).all())
+
+    async def get_untagged_tasks(self, limit: int) -> list[Task]:
+        statement = (
+            select(Task)
+            .where(~Task.tags.any())
+            .options(selectinload(Task.tags))
+            .order_by(Task.id)
+            .limit(limit)
+        )
+        return list((await self.session.exec(statement)).all())
+
+    async def delete_task(self, task_id: int):
+        task_db = await self.session.get(Task, task_id)
         if not task_db:
             raise HTTPException(status_code=404, detail="Task not found")
-        self.session.delete(task_db)
-        self.session.commit()
+        await touch_tags_of_tasks(self.session, [task_id])
+        await self.session.delete(task_db)
+        await unindex_tasks(self.session, [task_id])
+        await self._commit()
 
-    def edit_task(self, task_id: int, task_update: TaskUpdate) -> Task:
+    async def edit_task(self, task_id: int, task_update: TaskUpdate) -> Task:
         # exclude_unset=True : This tells Pydantic to not include the values that were not sent by the client.
         task_update_dumped = task_update.model_dump(exclude_unset=True)
 
-        task_db = self.session.get(Task, task_id)
-        if not task_db:
-            raise HTTPException(status_code=404, detail="Task not found")
-        task_db.sqlmodel_update(task_update_dumped)
+        task_db = await self.get_task(task_id)
+        task_db.sqlmodel_update(task_update_dumped | {"updated_at": datetime.now()})
 
         self.session.add(task_db)
-        self.session.commit()
-        self.session.refresh(task_db)
+        await self.session.flush()
+        await index_tasks(self.session, [task_id])
+        await touch_tags(self.session, [tag.id for tag in task_db.tags])
+        await self._commit()
         return task_db
 
-    def tag(self, task_id: int, tag_id: int) -> Task:
-        task_db = self.session.get(Task, task_id)
-        if not task_db:
-            raise HTTPException(status_code=404, detail="Task not found")
+    async def tag(self, task_id: int, tag_id: int) -> Task:
+        task_db = await self.get_task(task_id)
 
-        tag_db = self.session.get(Tag, tag_id)
+        tag_db = await self.session.get(Tag, tag_id)
         if not tag_db:
             raise HTTPException(status_code=404, detail="Tag not found")
 
@@ -57,17 +620,15 @@ class TaskService:
             raise HTTPException(status_code=400, detail="Tag already exists in task")
 
         task_db.tags.append(tag_db)
+        task_db.updated_at = tag_db.updated_at = datetime.now()
         self.session.add(task_db)
-        self.session.commit()
-        self.session.refresh(task_db)
+        await self._commit()
         return task_db
 
-    def untag(self, task_id: int, tag_id: int) -> Task:
-        task_db = self.session.get(Task, task_id)
-        if not task_db:
-            raise HTTPException(status_code=404, detail="Task not found")
+    async def untag(self, task_id: int, tag_id: int) -> Task:
+        task_db = await self.get_task(task_id)
 
-        tag_db = self.session.get(Tag, tag_id)
+        tag_db = await self.session.get(Tag, tag_id)
         if not tag_db:
             raise HTTPException(status_code=404, detail="Tag not found")
 
@@ -75,7 +636,7 @@ class TaskService:
             raise HTTPException(status_code=400, detail="Tag does not exist in task")
 
         task_db.tags.remove(tag_db)
+        task_db.updated_at = tag_db.updated_at = datetime.now()
         self.session.add(task_db)
-        self.session.commit()
-        self.session.refresh(task_db)
+        await self._commit()
         return task_db
@@ -0,0 +1,58 @@
+import asyncio
+
+import pytest
+
+from app.db.database import create_engine, create_session_maker
+from app.services.response_cache import response_cache
+from app.services.tag_vocabulary import tag_vocabulary
+from benchmarks.dataset import Dataset, load_dataset
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("dataset", "benchmark dataset (benchmarks/dataset.py)")
+    group.addoption("--bench-tasks", type=int, default=2000)
+    group.addoption("--bench-tags", type=int, default=50)
+    group.addoption("--bench-density", type=float, default=2.0)
+
+
+@pytest.fixture(scope="session")
+def loop():
+    # One loop for the whole run: the pooled connections of the engine belong to it
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture(scope="session")
+def dataset(request) -> Dataset:
+    return Dataset(
+        tasks=request.config.getoption("--bench-tasks"),
+        tags=request.config.getoption("--bench-tags"),
+        density=request.config.getoption("--bench-density"),
+    )
+
+
+@pytest.fixture(scope="session")
+def session_maker(loop, dataset, tmp_path_factory):
+    # A file DB with the app's engine options and SQLite profile
+    path = tmp_path_factory.mktemp("bench") / "bench.db"
+    engine = create_engine(f"sqlite:///{path}")
+    loop.run_until_complete(load_dataset(engine, dataset))
+    yield create_session_maker(engine)
+    loop.run_until_complete(engine.dispose())
+
+
+@pytest.fixture
+def run(loop, session_maker):
+    """run(call): await call(session) in a new session, like one request"""
+    tag_vocabulary.invalidate()
+    response_cache.invalidate()
+
+    def run(call):
+        async def main():
+            async with session_maker() as session:
+                return await call(session)
+
+        return loop.run_until_complete(main())
+
+    return run
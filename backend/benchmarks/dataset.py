@@ -0,0 +1,113 @@
+"""
+Deterministic dataset for the benchmarks: N tasks, M tags and a link density (average tags per task).
+Run from backend/ to fill a database: python -m benchmarks.dataset sqlite:///data/bench.db --tasks 10000
+"""
+
+import argparse
+import asyncio
+import random
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.db.database import create_db_and_tables, create_engine
+from app.db.search import create_search_index, drop_search_index, is_postgres
+from app.schemas.link import TaskTagLink
+from app.schemas.task_tag import Tag, Task
+
+WORDS = (
+    "report meeting groceries invoice gym call dentist review deploy budget email plan "
+    "garden laundry flight hotel taxes lecture exam project client design refactor backup"
+).split()
+
+START = datetime(2025, 1, 1)
+
+
+@dataclass
+class Dataset:
+    tasks: int = 1000
+    tags: int = 50
+    density: float = 2.0  # average tags per task, some tasks stay untagged
+    seed: int = 42
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def generate_rows(dataset: Dataset) -> tuple[list[dict], list[dict], list[dict]]:
+    """(task rows, tag rows, link rows), the same for the same dataset"""
+    rng = random.Random(dataset.seed)
+    tags = [
+        {"id": i + 1, "tag": f"{rng.choice(WORDS)} {i}", "updated_at": START}
+        for i in range(dataset.tags)
+    ]
+    tasks = []
+    links = []
+    for i in range(dataset.tasks):
+        task_id = i + 1
+        tasks.append(
+            {
+                "id": task_id,
+                "title": _sentence(rng, 3).capitalize(),
+                "description": _sentence(rng, 12),
+                "is_done": rng.random() < 0.3,
+                "scheduled_for": START + timedelta(hours=rng.randrange(24 * 365))
+                if rng.random() < 0.7
+                else None,
+                "created_at": START + timedelta(seconds=i),
+                "updated_at": START + timedelta(seconds=i),
+            }
+        )
+        # Up to 2 * density tags per task, density on average
+        n_tags = min(rng.randint(0, round(2 * dataset.density)), dataset.tags)
+        for tag_id in rng.sample(range(1, dataset.tags + 1), n_tags):
+            links.append({"task_id": task_id, "tag_id": tag_id})
+    return tasks, tags, links
+
+
+async def load_dataset(engine: AsyncEngine, dataset: Dataset):
+    """Create the tables of `engine` and fill them with `dataset` (the DB is expected to be empty)"""
+    await create_db_and_tables(engine)
+    tasks, tags, links = generate_rows(dataset)
+    async with engine.begin() as conn:
+        # The search index is rebuilt from the tasks in one statement
+        await conn.run_sync(drop_search_index)
+        for table, rows in [(Task, tasks), (Tag, tags), (TaskTagLink, links)]:
+            if rows:
+                await conn.execute(insert(table.__table__), rows)
+        if is_postgres(conn):
+            # The ids were given explicitly, move the sequences past them
+            for table in ("task", "tag"):
+                await conn.execute(
+                    text(
+                        f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                        f"(SELECT coalesce(max(id), 1) FROM {table}))"
+                    )
+                )
+        await conn.run_sync(create_search_index)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("url", help="database URL, e.g. sqlite:///data/bench.db")
+    parser.add_argument("--tasks", type=int, default=Dataset.tasks)
+    parser.add_argument("--tags", type=int, default=Dataset.tags)
+    parser.add_argument("--density", type=float, default=Dataset.density)
+    parser.add_argument("--seed", type=int, default=Dataset.seed)
+    args = parser.parse_args()
+
+    async def run():
+        engine = create_engine(args.url)
+        await load_dataset(
+            engine, Dataset(args.tasks, args.tags, args.density, args.seed)
+        )
+        await engine.dispose()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
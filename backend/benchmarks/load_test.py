@@ -0,0 +1,306 @@
+"""
+Offline load test of the API: concurrent requests per endpoint against the ASGI app (no server, no network),
+on the generated dataset, with the local fake LLM provider (LLM_PROVIDER=fake). Reports the p50/p99 latency and the
+requests per second of each endpoint, and fails on a regression versus the stored baseline.
+The baseline is machine-independent: it stores the results with the time of a fixed calibration workload run in
+the same process, and the results of another machine are scaled by the ratio of the two calibrations before being
+compared. The fake LLM latency doesn't scale with the machine, so on a machine much faster than the baseline's the
+AI endpoints may still look slower: regenerate the baseline there (--save-baseline) rather than raising the tolerance.
+Run from backend/: python -m benchmarks.load_test [--save-baseline]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import math
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from unittest.mock import patch
+
+import httpx
+
+from app.db.database import (
+    create_engine,
+    create_session_maker,
+    get_session,
+    get_session_maker,
+)
+from app.config.config import settings
+from app.services.ai_service import clear_llm_clients
+from app.services.response_cache import response_cache
+from app.services.smart_tag_cache import smart_tag_cache
+from app.services.tag_vocabulary import tag_vocabulary
+from benchmarks.dataset import WORDS, Dataset, generate_rows, load_dataset
+from main import app
+
+BASELINE_PATH = Path(__file__).parent / "load_baseline.json"
+
+
+@dataclass
+class EndpointResult:
+    requests: int
+    errors: int
+    rps: float
+    p50_ms: float
+    p99_ms: float
+
+
+def calibrate(rounds: int = 5) -> float:
+    """
+    Milliseconds of a fixed workload shaped like a request (an SQLite query, Python objects, JSON), the best of
+    `rounds`: the speed of this machine and interpreter, independent of the code under test
+    """
+    connection = sqlite3.connect(":memory:")
+    connection.execute("CREATE TABLE item (id INTEGER PRIMARY KEY, title TEXT)")
+    connection.executemany(
+        "INSERT INTO item (title) VALUES (?)", ((f"item {i}",) for i in range(20000))
+    )
+    best = math.inf
+    for _ in range(rounds):
+        start = time.perf_counter()
+        rows = connection.execute(
+            "SELECT id, title FROM item ORDER BY title LIMIT 5000"
+        ).fetchall()
+        json.dumps([{"id": id, "title": title} for id, title in rows])
+        best = min(best, time.perf_counter() - start)
+    connection.close()
+    return round(best * 1000, 3)
+
+
+def make_scenarios(dataset: Dataset, etag: str) -> dict:
+    """Endpoint name -> function of the request number returning (method, url, request kwargs)"""
+    rng = random.Random(dataset.seed)
+    tasks, _, links = generate_rows(dataset)
+    untagged = sorted(
+        {task["id"] for task in tasks} - {link["task_id"] for link in links}
+    )
+
+    def task_id(i: int) -> int:
+        return rng.randint(1, dataset.tasks)
+
+    return {
+        "GET /tasks/task_page": lambda i: (
+            "GET",
+            f"/tasks/task_page?offset={i % 5 * 100}",
+            {},
+        ),
+        "GET /tasks/task_page?filters": lambda i: (
+            "GET",
+            "/tasks/task_page?is_done=false&order_by=-scheduled_for&limit=50",
+            {},
+        ),
+        "GET /tasks/{id}": lambda i: ("GET", f"/tasks/{task_id(i)}", {}),
+        "GET /tasks/{id} (304)": lambda i: (
+            "GET",
+            "/tasks/1",
+            {"headers": {"If-None-Match": etag}},
+        ),
+        "GET /tasks/search": lambda i: (
+            "GET",
+            f"/tasks/search?q={rng.choice(WORDS)}",
+            {},
+        ),
+        "GET /tags/tag_page": lambda i: ("GET", "/tags/tag_page", {}),
+        "GET /tags/{id}": lambda i: (
+            "GET",
+            f"/tags/{rng.randint(1, dataset.tags)}",
+            {},
+        ),
+        "POST /tasks/": lambda i: (
+            "POST",
+            "/tasks/",
+            {"json": {"title": f"load test {i}", "description": "created"}},
+        ),
+        "PATCH /tasks/{id}/edit": lambda i: (
+            "PATCH",
+            f"/tasks/{task_id(i)}/edit",
+            {"json": {"is_done": i % 2 == 0}},
+        ),
+        # One untagged task per request (a task can't get the same tag twice)
+        "POST /ai/{id}": lambda i: ("POST", f"/ai/{untagged[i % len(untagged)]}", {}),
+        "POST /ai/batch": lambda i: (
+            "POST",
+            "/ai/batch",
+            # Consecutive tasks per request: concurrent batches don't tag the same task
+            {
+                "json": {
+                    "task_ids": [(i * 20 + k) % dataset.tasks + 1 for k in range(20)]
+                }
+            },
+        ),
+    }
+
+
+async def run_endpoint(
+    client: httpx.AsyncClient, scenario, requests: int, concurrency: int
+) -> EndpointResult:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def one(i: int):
+        nonlocal errors
+        method, url, kwargs = scenario(i)
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            latencies.append(time.perf_counter() - start)
+        if response.status_code >= 400:
+            errors += 1
+        elif url == "/ai/batch":
+            # Answered 200 even when some of its tasks could not be tagged
+            errors += len(response.json()["failed"])
+
+    start = time.perf_counter()
+    await asyncio.gather(*[one(i) for i in range(requests)])
+    elapsed = time.perf_counter() - start
+    percentiles = statistics.quantiles(latencies, n=100, method="inclusive")
+    return EndpointResult(
+        requests=requests,
+        errors=errors,
+        rps=round(requests / elapsed, 1),
+        p50_ms=round(percentiles[49] * 1000, 2),
+        p99_ms=round(percentiles[98] * 1000, 2),
+    )
+
+
+async def run(args) -> dict[str, EndpointResult]:
+    dataset = Dataset(args.tasks, args.tags, args.density)
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{Path(directory) / 'load.db'}")
+        await load_dataset(engine, dataset)
+        session_maker = create_session_maker(engine)
+
+        async def get_session_override():
+            async with session_maker() as session:
+                yield session
+
+        # The slow statements under load show in the p99, no log line for each
+        logging.getLogger("app.db.instrumentation").setLevel(logging.ERROR)
+        app.dependency_overrides[get_session] = get_session_override
+        app.dependency_overrides[get_session_maker] = lambda: session_maker
+        tag_vocabulary.invalidate()
+        response_cache.invalidate()
+        # Every AI request goes to the (fake) provider
+        smart_tag_cache.configure(
+            path=str(Path(directory) / "llm_cache.db"), enabled=False
+        )
+        results = {}
+        try:
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(
+                transport=transport, base_url="http://load-test"
+            ) as client:
+                etag = (await client.get("/tasks/1")).headers["ETag"]
+                with (
+                    patch.object(settings, "LLM_PROVIDER", "fake"),
+                    patch.object(settings, "FAKE_LLM_LATENCY", args.llm_latency),
+                    patch.object(settings, "FAKE_LLM_LATENCY_SIGMA", args.llm_sigma),
+                    patch.object(settings, "FAKE_LLM_ERROR_RATE", args.llm_error_rate),
+                ):
+                    clear_llm_clients()
+                    for name, scenario in make_scenarios(dataset, etag).items():
+                        if args.endpoint and not any(e in name for e in args.endpoint):
+                            continue
+                        results[name] = await run_endpoint(
+                            client, scenario, args.requests, args.concurrency
+                        )
+                        print(f"{name:32} {asdict(results[name])}")
+        finally:
+            clear_llm_clients()
+            app.dependency_overrides.clear()
+            await engine.dispose()
+    return results
+
+
+def check_regressions(
+    results: dict[str, EndpointResult],
+    calibration_ms: float,
+    baseline: dict,
+    tolerance: float,
+) -> list[str]:
+    """
+    The endpoints slower than the baseline by more than `tolerance` (0.5: 50%), or with errors. The baseline is
+    first scaled to this machine: `calibration_ms` over the calibration of the baseline's
+    """
+    # > 1: this machine is slower than the baseline's
+    speed = calibration_ms / baseline["calibration_ms"]
+    failures = []
+    for name, result in results.items():
+        if result.errors:
+            failures.append(f"{name}: {result.errors} failed requests")
+        if name not in baseline["endpoints"]:
+            continue
+        expected = baseline["endpoints"][name]
+        p99_ms = round(expected["p99_ms"] * speed, 2)
+        rps = round(expected["rps"] / speed, 1)
+        if result.p99_ms > p99_ms * (1 + tolerance):
+            failures.append(
+                f"{name}: p99 {result.p99_ms} ms (baseline {p99_ms} ms on this machine)"
+            )
+        if result.rps < rps / (1 + tolerance):
+            failures.append(
+                f"{name}: {result.rps} req/s (baseline {rps} on this machine)"
+            )
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tasks", type=int, default=2000)
+    parser.add_argument("--tags", type=int, default=50)
+    parser.add_argument("--density", type=float, default=2.0)
+    parser.add_argument("--requests", type=int, default=200, help="per endpoint")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument(
+        "--llm-latency", type=float, default=0.05, help="median, seconds"
+    )
+    parser.add_argument(
+        "--llm-sigma", type=float, default=0.0, help="log-normal spread, 0: fixed"
+    )
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument(
+        "--endpoint", action="append", help="only the endpoints containing this"
+    )
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument(
+        "--tolerance", type=float, default=0.5, help="allowed slowdown, 0.5: 50%%"
+    )
+    parser.add_argument(
+        "--save-baseline", action="store_true", help="store the results as the baseline"
+    )
+    args = parser.parse_args()
+
+    # Before and after the endpoints, the best of both: a passing load on the machine doesn't skew it
+    calibration_ms = calibrate()
+    results = asyncio.run(run(args))
+    calibration_ms = min(calibration_ms, calibrate())
+    print(f"{'calibration':32} {calibration_ms} ms")
+    if args.save_baseline:
+        baseline = {
+            "calibration_ms": calibration_ms,
+            "endpoints": {name: asdict(result) for name, result in results.items()},
+        }
+        args.baseline.write_text(json.dumps(baseline, indent=2) + "\n")
+        print(f"Baseline saved to {args.baseline}")
+        return
+    if not args.baseline.exists():
+        print(f"No baseline at {args.baseline}, run with --save-baseline first")
+        return
+    failures = check_regressions(
+        results, calibration_ms, json.loads(args.baseline.read_text()), args.tolerance
+    )
+    for failure in failures:
+        print(f"REGRESSION {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Write throughput of concurrent clients on a SQLite file, without and with the SQLite profile
+(SQLITE_* settings). Run from backend/: python -m benchmarks.sqlite_profile
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.db.database import (
+    apply_sqlite_pragmas,
+    create_db_and_tables,
+    create_session_maker,
+    get_async_url,
+    get_engine_options,
+)
+from app.schemas.task_tag import Task
+from app.services.task_service import TaskService
+
+
+async def run(profile: bool, writers: int, readers: int, writes: int) -> dict:
+    with tempfile.TemporaryDirectory() as directory:
+        url = get_async_url(f"sqlite:///{os.path.join(directory, 'bench.db')}")
+        options = get_engine_options(url) | {
+            "echo": False,
+            "pool_size": writers + readers,
+        }
+        engine = create_async_engine(url, **options)
+        if profile:
+            apply_sqlite_pragmas(engine)
+        await create_db_and_tables(engine)
+        session_maker = create_session_maker(engine)
+        errors = 0
+        reads = 0
+        done = asyncio.Event()
+
+        async def writer(n: int):
+            nonlocal errors
+            for i in range(writes):
+                # one transaction per task, like POST /tasks/
+                async with session_maker() as session:
+                    try:
+                        session.add(Task(title=f"writer {n} task {i}"))
+                        await session.commit()
+                    except OperationalError:  # database is locked
+                        errors += 1
+
+        async def reader():
+            nonlocal errors, reads
+            while not done.is_set():
+                async with session_maker() as session:
+                    try:
+                        await TaskService(session).get_task_page(offset=0, limit=50)
+                        reads += 1
+                    except OperationalError:
+                        errors += 1
+
+        reader_tasks = [asyncio.create_task(reader()) for _ in range(readers)]
+        start = time.perf_counter()
+        await asyncio.gather(*[writer(n) for n in range(writers)])
+        elapsed = time.perf_counter() - start
+        done.set()
+        await asyncio.gather(*reader_tasks)
+        await engine.dispose()
+    total = writers * writes
+    return {
+        "profile": "on" if profile else "off",
+        "writes/s": round((total - errors) / elapsed),
+        "reads/s": round(reads / elapsed),
+        "locked errors": errors,
+        "seconds": round(elapsed, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--writes", type=int, default=200, help="per writer")
+    args = parser.parse_args()
+    for profile in (False, True):
+        print(asyncio.run(run(profile, args.writers, args.readers, args.writes)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Startup time of the production server (gunicorn.conf.py), without and with the app preloaded in the master:
+seconds until every worker is ready, memory of the workers (PSS, Linux only), cold import time of the app and
+of the provider SDKs (the stall of the first AI request when nothing imported them before).
+Both providers are configured with dummy keys (no call is made). Run from backend/: python -m benchmarks.startup
+"""
+
+import argparse
+import json
+import os
+import re
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+READY = "Application startup complete"
+WORKER_PID = re.compile(r"Booting worker with pid: (\d+)")
+
+
+def get_env(directory: str, database: str = "startup.db") -> dict:
+    return os.environ | {
+        "DATABASE_URL": f"sqlite:///{os.path.join(directory, database)}",
+        "LLM_CACHE_PATH": os.path.join(directory, "llm_cache.db"),
+        "LLM_PROVIDER": "auto",
+        "GEMINI_API_KEY": "dummy",
+        "OPENAI_API_KEY": "dummy",
+        # No download of the encoding: the same work in both profiles
+        "PROMPT_TOKENIZER_ENCODING": "",
+        "AI_JOB_WORKERS": "0",
+    }
+
+
+def run_python(code: str, env: dict) -> str:
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=BACKEND_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return result.stdout.strip().splitlines()[-1]
+
+
+def import_times(env: dict, repeat: int) -> dict:
+    """Seconds to import the app, then to preload what get_llm and the first request import (fresh process)"""
+    code = (
+        "import json, time\n"
+        "start = time.perf_counter()\n"
+        "import main\n"
+        "app = time.perf_counter() - start\n"
+        "from app.prestart import preload_imports\n"
+        "print(json.dumps({'app': app} | preload_imports()))\n"
+    )
+    runs = [json.loads(run_python(code, env)) for _ in range(repeat)]
+    return {
+        step: round(statistics.median(run[step] for run in runs), 3) for step in runs[0]
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def pss_mb(pid: int) -> float | None:
+    # Proportional set size: the pages shared with the master and the other workers are split between them
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                if line.startswith("Pss:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+def start_server(env: dict, preload: bool, workers: int, timeout: float) -> dict:
+    port = free_port()
+    env = env | {
+        "SERVER_BIND": f"127.0.0.1:{port}",
+        "SERVER_WORKERS": str(workers),
+        "SERVER_PRELOAD": str(preload).lower(),
+    }
+    with tempfile.TemporaryFile("w+") as log:
+        start = time.perf_counter()
+        server = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py"],
+            cwd=BACKEND_DIR,
+            env=env,
+            stdout=log,
+            stderr=subprocess.STDOUT,
+        )
+        try:
+            while True:
+                log.seek(0)
+                output = log.read()
+                if output.count(READY) >= workers:
+                    ready = time.perf_counter() - start
+                    break
+                if server.poll() is not None or time.perf_counter() - start > timeout:
+                    raise RuntimeError(f"Server not ready:\n{output}")
+                time.sleep(0.05)
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/health") as response:
+                assert response.status == 200
+            memory = [pss_mb(int(pid)) for pid in WORKER_PID.findall(output)]
+        finally:
+            server.send_signal(signal.SIGTERM)
+            server.wait(timeout=60)
+        log.seek(0)
+        errors = log.read().count("Traceback")
+    result = {
+        "preload": "on" if preload else "off",
+        "workers": workers,
+        "ready s": round(ready, 2),
+        "errors": errors,
+    }
+    if None not in memory:
+        result["worker PSS MB"] = round(sum(memory) / len(memory), 1)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=3, help="cold imports measured")
+    parser.add_argument("--timeout", type=float, default=120.0, help="seconds")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        print({"cold import s": import_times(get_env(directory), args.repeat)})
+        for preload in (False, True):
+            # A new database each time: the schema is created on startup
+            env = get_env(directory, f"preload-{preload}.db")
+            print(start_server(env, preload, args.workers, args.timeout))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Benchmarks of the AIService paths against the local fake LLM provider (LLM_PROVIDER=fake, no network):
+the per-call overhead around the provider, the smart-tag cache, the batch path and the concurrency limiter.
+Run from backend/: python -m pytest benchmarks/test_ai_benchmarks.py
+"""
+
+import asyncio
+from unittest.mock import patch
+
+import pytest
+
+from app.config.config import settings
+from app.schemas.task_tag import TaskCreate
+from app.services.ai_service import (
+    AIService,
+    BatchSmartTagRequest,
+    call_llm,
+    clear_llm_clients,
+    llm_limiter,
+)
+from app.services.smart_tag_cache import smart_tag_cache
+from app.services.tag_service import TagService
+from app.services.task_service import TaskService
+from benchmarks.test_service_benchmarks import BULK_SIZE, _write
+
+# As many calls as the limiter accepts: all the slots busy and the waiting queue full
+CONCURRENT_CALLS = settings.LLM_MAX_CONCURRENCY + settings.LLM_MAX_WAITING
+
+
+@pytest.fixture
+def fake_llm(tmp_path):
+    # No provider latency: what is measured is our own work around the call
+    clear_llm_clients()
+    with (
+        patch.object(settings, "LLM_PROVIDER", "fake"),
+        patch.object(settings, "FAKE_LLM_LATENCY", 0.0),
+        patch.object(settings, "FAKE_LLM_ERROR_RATE", 0.0),
+    ):
+        yield
+    clear_llm_clients()
+    smart_tag_cache.configure(path=str(tmp_path / "llm_cache.db"), enabled=False)
+
+
+def _smart_tag(session, task_id):
+    return AIService().single_smart_tag(
+        task_id, TaskService(session), TagService(session)
+    )
+
+
+async def _new_task(session):
+    task = await TaskService(session).create_task(
+        TaskCreate(title="Prepare the budget review", description="for the client")
+    )
+    return (task.id,)
+
+
+async def _new_tasks(session):
+    tasks = [
+        TaskCreate(title=f"Plan the flight {i}", description="and the hotel")
+        for i in range(BULK_SIZE)
+    ]
+    return ((await TaskService(session).create_tasks(tasks)).ids,)
+
+
+def test_single_smart_tag(benchmark, run, fake_llm, tmp_path):
+    smart_tag_cache.configure(path=str(tmp_path / "llm_cache.db"), enabled=False)
+    _write(benchmark, run, _smart_tag, _new_task)
+
+
+def test_single_smart_tag_cached(benchmark, run, fake_llm, tmp_path):
+    # Same text, same vocabulary: the answer of a first call is served from the cache
+    smart_tag_cache.configure(path=str(tmp_path / "llm_cache.db"), enabled=True)
+    (task_id,) = run(_new_task)
+    run(lambda session: _smart_tag(session, task_id))
+    _write(benchmark, run, _smart_tag, _new_task)
+    assert smart_tag_cache.hits > 0
+
+
+def test_batch_smart_tag(benchmark, run, fake_llm):
+    def batch(session, task_ids):
+        return AIService().batch_smart_tag(
+            BatchSmartTagRequest(task_ids=task_ids),
+            TaskService(session),
+            TagService(session),
+        )
+
+    _write(benchmark, run, batch, _new_tasks)
+
+
+def test_concurrent_calls_through_the_limiter(benchmark, loop, fake_llm):
+    # More calls than slots, with a fixed provider latency: bounded by LLM_MAX_CONCURRENCY
+    async def calls():
+        await asyncio.gather(*[call_llm("prompt") for _ in range(CONCURRENT_CALLS)])
+
+    with (
+        patch.object(settings, "FAKE_LLM_LATENCY", 0.005),
+        patch.object(settings, "FAKE_LLM_LATENCY_SIGMA", 0.0),
+    ):
+        benchmark.pedantic(
+            loop.run_until_complete, setup=lambda: ((calls(),), {}), rounds=10
+        )
+    assert llm_limiter.in_flight == 0
@@ -0,0 +1,176 @@
+"""
+Micro-benchmarks of the TaskService and TagService methods on the generated dataset, one session per call.
+Run from backend/: python -m pytest benchmarks [--bench-tasks 10000] [--benchmark-autosave]
+"""
+
+import json
+
+import pytest
+
+from app.schemas.task_tag import (
+    TagCreate,
+    TagUpdate,
+    TaskBulkUpdate,
+    TaskCreate,
+    TaskFilter,
+    TaskTagPair,
+    TaskUpdate,
+)
+from app.services.pagination import encode_cursor
+from app.services.serialization import iter_lines
+from app.services.tag_service import TagService
+from app.services.task_service import TaskService
+
+# The writes change the dataset: a fixed number of rounds, so that it doesn't grow with the calibration
+WRITE_ROUNDS = 30
+BULK_SIZE = 100
+
+TASK_READS = {
+    "get_task": lambda s: TaskService(s).get_task(1),
+    "get_tasks": lambda s: TaskService(s).get_tasks(list(range(1, BULK_SIZE + 1))),
+    "get_task_page": lambda s: TaskService(s).get_task_page(offset=0, limit=100),
+    "get_task_page_after": lambda s: TaskService(s).get_task_page(
+        offset=0, limit=100, after=encode_cursor("id", [1000])
+    ),
+    "get_task_page_filtered": lambda s: TaskService(s).get_task_page(
+        offset=0,
+        limit=100,
+        order_by="-scheduled_for",
+        filters=TaskFilter(is_done=False, has_tags=True),
+    ),
+    "get_untagged_tasks": lambda s: TaskService(s).get_untagged_tasks(limit=100),
+    "search_tasks": lambda s: TaskService(s).search_tasks("report meeting", limit=20),
+    "get_task_version": lambda s: TaskService(s).get_task_version(1),
+    "get_tasks_version": lambda s: TaskService(s).get_tasks_version(),
+}
+
+TAG_READS = {
+    "get_tag": lambda s: TagService(s).get_tag(1),
+    "get_tags": lambda s: TagService(s).get_tags(list(range(1, 21))),
+    "get_tag_page": lambda s: TagService(s).get_tag_page(offset=0, limit=20),
+    "get_tag_version": lambda s: TagService(s).get_tag_version(1),
+    "get_tags_version": lambda s: TagService(s).get_tags_version(),
+}
+
+
+@pytest.mark.parametrize("method", TASK_READS)
+def test_task_service_reads(benchmark, run, method):
+    benchmark(run, TASK_READS[method])
+
+
+@pytest.mark.parametrize("method", TAG_READS)
+def test_tag_service_reads(benchmark, run, method):
+    benchmark(run, TAG_READS[method])
+
+
+def test_export_tasks(benchmark, run):
+    async def export(session):
+        return sum([len(chunk) async for chunk in TaskService(session).export_tasks()])
+
+    assert benchmark.pedantic(run, (export,), rounds=5) > 0
+
+
+def _write(benchmark, run, call, setup=None):
+    """Benchmark `call(session, *setup_result)`, `setup` runs before each round, outside of the timing"""
+
+    def make_round():
+        args = run(setup) if setup is not None else ()
+        return (lambda session: call(session, *args),), {}
+
+    benchmark.pedantic(run, setup=make_round, rounds=WRITE_ROUNDS)
+
+
+async def _new_task(session):
+    return ((await TaskService(session).create_task(TaskCreate(title="bench"))).id,)
+
+
+async def _new_tasks(session):
+    tasks = [TaskCreate(title=f"bench {i}") for i in range(BULK_SIZE)]
+    return ((await TaskService(session).create_tasks(tasks)).ids,)
+
+
+async def _new_tag(session):
+    return ((await TagService(session).create_tag(TagCreate(tag="bench"))).id,)
+
+
+def test_create_task(benchmark, run):
+    _write(
+        benchmark,
+        run,
+        lambda s: TaskService(s).create_task(
+            TaskCreate(title="bench", description="x")
+        ),
+    )
+
+
+def test_create_tasks(benchmark, run):
+    tasks = [TaskCreate(title=f"bench {i}") for i in range(BULK_SIZE)]
+    _write(benchmark, run, lambda s: TaskService(s).create_tasks(tasks))
+
+
+def test_edit_task(benchmark, run):
+    _write(
+        benchmark,
+        run,
+        lambda s: TaskService(s).edit_task(1, TaskUpdate(title="edited")),
+    )
+
+
+def test_edit_tasks(benchmark, run):
+    updates = [TaskBulkUpdate(id=i, is_done=True) for i in range(1, BULK_SIZE + 1)]
+    _write(benchmark, run, lambda s: TaskService(s).edit_tasks(updates))
+
+
+def test_delete_task(benchmark, run):
+    _write(
+        benchmark,
+        run,
+        lambda s, task_id: TaskService(s).delete_task(task_id),
+        _new_task,
+    )
+
+
+def test_delete_tasks(benchmark, run):
+    _write(benchmark, run, lambda s, ids: TaskService(s).delete_tasks(ids), _new_tasks)
+
+
+def test_tag_untag(benchmark, run):
+    async def tag_untag(session, tag_id):
+        await TaskService(session).tag(1, tag_id)
+        await TaskService(session).untag(1, tag_id)
+
+    _write(benchmark, run, tag_untag, _new_tag)
+
+
+def test_tag_many_untag_many(benchmark, run):
+    async def tag_untag(session, tag_id):
+        pairs = [TaskTagPair(task_id=i, tag_id=tag_id) for i in range(1, BULK_SIZE + 1)]
+        await TaskService(session).tag_many(pairs)
+        await TaskService(session).untag_many(pairs)
+
+    _write(benchmark, run, tag_untag, _new_tag)
+
+
+def test_import_tasks(benchmark, run):
+    body = b"".join(
+        json.dumps({"title": f"imported {i}", "tags": [{"tag": "bench"}]}).encode()
+        + b"\n"
+        for i in range(BULK_SIZE)
+    )
+
+    async def chunks():
+        yield body
+
+    _write(benchmark, run, lambda s: TaskService(s).import_tasks(iter_lines(chunks())))
+
+
+def test_create_tag(benchmark, run):
+    _write(benchmark, run, lambda s: TagService(s).create_tag(TagCreate(tag="bench")))
+
+
+def test_edit_tag(benchmark, run):
+    _write(benchmark, run, lambda s: TagService(s).edit_tag(2, TagUpdate(tag="edited")))
+
+
+def test_delete_tag(benchmark, run):
+    _write(benchmark, run, lambda s, tag_id: TagService(s).delete_tag(tag_id), _new_tag)
@@ -0,0 +1,34 @@
+import gc
+import os
+
+from app.config.config import settings
+
+# Production server: uv run gunicorn -c gunicorn.conf.py
+# Uvicorn workers (one event loop each) managed by Gunicorn: a crashed or stuck worker is replaced.
+# With SERVER_PRELOAD, the master imports the app and runs app/prestart.py (schema, provider SDKs, tokenizer,
+# serializers) once, then forks: the workers skip the imports and the schema creation, and share those pages.
+
+wsgi_app = "main:app"
+worker_class = "uvicorn_worker.UvicornWorker"
+bind = settings.SERVER_BIND
+workers = settings.SERVER_WORKERS or os.cpu_count() or 1
+preload_app = settings.SERVER_PRELOAD
+timeout = settings.SERVER_TIMEOUT
+graceful_timeout = settings.SERVER_GRACEFUL_TIMEOUT
+keepalive = settings.SERVER_KEEPALIVE
+accesslog = "-"
+
+
+def on_starting(server):
+    # Runs in the master after the preloaded app is imported, before the first fork
+    if not preload_app:
+        return
+    from app.prestart import prestart
+
+    timings = prestart()
+    server.log.info(
+        "Preloaded before fork: "
+        + ", ".join(f"{step} {seconds:.2f}s" for step, seconds in timings.items())
+    )
+    # Objects of the master are never collected in the workers: their pages stay shared (copy-on-write)
+    gc.freeze()
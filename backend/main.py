@@ -1,20 +1,117 @@
+import time
+
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 from contextlib import asynccontextmanager
 
 from app.api.router import api_router
-from app.db.database import create_db_and_tables
+from app.config.config import settings
+from app.db.database import create_db_and_tables, engine
+from app.db.instrumentation import (
+    db_pool_stats,
+    db_query_stats,
+    get_pool_status,
+    start_request_query_stats,
+    stop_request_query_stats,
+)
+from app.services.ai_jobs import ai_job_worker
+from app.services.ai_service import llm_limiter, warm_llm
+from app.services.llm_router import llm_router
+from app.services.metrics import (
+    http_request_duration,
+    http_requests_in_flight,
+    registry,
+)
+from app.services.prompts import load_tokenizer
+from app.services.response_cache import response_cache
+from app.services.smart_tag_cache import smart_tag_cache
+from app.services.pagination import NEXT_CURSOR_HEADER
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    create_db_and_tables()
+    if settings.DB_CREATE_ON_STARTUP:
+        await create_db_and_tables()
+    # Every prompt needs it: loaded off the event loop (the encoding may be downloaded)
+    await load_tokenizer()
+    if settings.LLM_WARMUP:
+        warm_llm()
+    ai_job_worker.start()
     yield
+    await ai_job_worker.stop()
+    await engine.dispose()
 
 
 app = FastAPI(title="Todo LLM App", lifespan=lifespan)
 app.include_router(api_router)
 
+
+class InstrumentationMiddleware:
+    """
+    The metrics and the query stats of the HTTP requests. Pure ASGI: no task per request, and the
+    streamed responses (e.g. /tasks/export) go through as they are, only `send` is wrapped
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        group = scope["path"].split("/", 2)[1] or "root"  # tasks, tags, ai, ...
+        start = time.perf_counter()
+        stats, token = start_request_query_stats()
+        http_requests_in_flight.inc(group)
+        status = 500
+        finished = False
+
+        def finish():
+            nonlocal finished
+            if finished:
+                return
+            finished = True
+            http_requests_in_flight.dec(group)
+            # The route template (e.g. /tasks/{task_id}), not the path: bounded number of series
+            route = scope.get("route")
+            http_request_duration.observe(
+                time.perf_counter() - start,
+                scope["method"],
+                route.path if route is not None else "unmatched",
+                str(status),
+            )
+
+        async def send_instrumented(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                # The statements run before the headers: a streamed body's are not counted
+                if settings.DB_INSTRUMENTATION:
+                    MutableHeaders(scope=message).append(
+                        "Server-Timing",
+                        f'db;dur={stats.total_ms:.2f};desc="{stats.count} queries"',
+                    )
+            await send(message)
+            # Up to the last byte of the body, streamed or not
+            if message["type"] == "http.response.body" and not message.get(
+                "more_body", False
+            ):
+                finish()
+
+        try:
+            await self.app(scope, receive, send_instrumented)
+        finally:
+            stop_request_query_stats(token)
+            # No response sent (error, client gone)
+            finish()
+
+
+app.add_middleware(InstrumentationMiddleware)
+
+
 origins = [
     "http://localhost:5173",    # Vite dev server
     "http://localhost:3000",    # React dev server
@@ -30,9 +127,101 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE", "PATCH"],
     allow_headers=["*"],
+    # let the browser read the keyset pagination cursor
+    expose_headers=[NEXT_CURSOR_HEADER, "Server-Timing", "ETag", "Location"],
 )
 
 
 @app.get("/health")
 def health_check():
-    return {"status": "healthy"}
\ No newline at end of file
+    return {"status": "healthy"}
+
+
+# Read at scrape time
+registry.callback(
+    "db_pool_connections",
+    "Connections in use (checked_out) and opened beyond the pool size (overflow)",
+    lambda: {(state,): n for state, n in get_pool_status(engine).items()},
+    labels=("state",),
+)
+registry.callback(
+    "db_pool_checkouts_total",
+    "Connections checked out of the pool",
+    lambda: db_pool_stats.checkouts,
+    type="counter",
+)
+registry.callback(
+    "db_queries_total",
+    "SQL statements run",
+    lambda: db_query_stats.count,
+    type="counter",
+)
+registry.callback(
+    "db_query_duration_seconds_total",
+    "Time spent running SQL statements",
+    lambda: db_query_stats.total_ms / 1000,
+    type="counter",
+)
+registry.callback(
+    "db_slow_queries_total",
+    "SQL statements slower than DB_SLOW_QUERY_MS",
+    lambda: db_query_stats.slow,
+    type="counter",
+)
+registry.callback(
+    "llm_calls_in_flight", "LLM provider calls", lambda: llm_limiter.in_flight
+)
+registry.callback(
+    "llm_calls_waiting", "LLM calls waiting for a slot", lambda: llm_limiter.waiting
+)
+registry.callback(
+    "llm_provider_circuit_open",
+    "1 while the provider is skipped after repeated failures",
+    lambda: {
+        (provider,): int(stats.is_open) for provider, stats in llm_router.stats.items()
+    },
+    labels=("provider",),
+)
+registry.callback(
+    "llm_provider_error_rate",
+    "Share of failed calls among the last LLM_ROUTER_WINDOW calls of the provider",
+    lambda: {
+        (provider,): stats.error_rate for provider, stats in llm_router.stats.items()
+    },
+    labels=("provider",),
+)
+registry.callback(
+    "llm_provider_hedge_delay_seconds",
+    "Wait before the call is hedged on the next provider (LLM_HEDGE_QUANTILE latency)",
+    lambda: {
+        (provider,): llm_router.hedge_delay(provider) for provider in llm_router.stats
+    },
+    labels=("provider",),
+)
+registry.callback(
+    "smart_tag_cache_hit_ratio",
+    "Hit ratio of the smart-tag result cache",
+    lambda: smart_tag_cache.hit_ratio,
+)
+registry.callback(
+    "smart_tag_cache_requests_total",
+    "Lookups in the smart-tag result cache",
+    lambda: {("hit",): smart_tag_cache.hits, ("miss",): smart_tag_cache.misses},
+    labels=("result",),
+    type="counter",
+)
+registry.callback(
+    "response_cache_requests_total",
+    "Lookups in the cache of the serialized GET responses",
+    lambda: {("hit",): response_cache.hits, ("miss",): response_cache.misses},
+    labels=("result",),
+    type="counter",
+)
+
+
+# async: rendered on the event loop, never while a request adds label keys
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics():
+    return PlainTextResponse(
+        registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
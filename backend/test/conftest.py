@@ -1,28 +1,82 @@
+import asyncio
+
 import pytest
 from fastapi.testclient import TestClient
-from sqlmodel import Session, SQLModel, create_engine
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import NullPool
+from sqlmodel import SQLModel
 
-from app.db.database import get_session
+from app.db.instrumentation import instrument_engine
+from app.db.search import drop_search_index
+from app.db.database import (
+    apply_sqlite_pragmas,
+    create_db_and_tables,
+    create_session_maker,
+    get_session,
+    get_session_maker,
+)
+from app.services.llm_router import llm_router
+from app.services.response_cache import response_cache
+from app.services.smart_tag_cache import smart_tag_cache
+from app.services.tag_vocabulary import tag_vocabulary
 from main import app
 
 
-@pytest.fixture(name="session")
-def db_session():
-    engine = create_engine(
-        url="sqlite:///./test.db", connect_args={"check_same_thread": False}, echo=True
+@pytest.fixture(name="engine")
+def engine_fixture():
+    # NullPool: the TestClient runs every request in its own event loop, so connections are not shared
+    engine = create_async_engine(
+        url="sqlite+aiosqlite:///./test.db",
+        connect_args={"check_same_thread": False},
+        echo=True,
+        poolclass=NullPool,
     )
-    SQLModel.metadata.create_all(engine)
-    with Session(engine) as session:
-        yield session
-    SQLModel.metadata.drop_all(engine)
+    # Same SQLite profile as the app (WAL, foreign keys, ...)
+    apply_sqlite_pragmas(engine)
+    instrument_engine(engine)
+    asyncio.run(create_db_and_tables(engine))
+    yield engine
+
+    async def drop_db_and_tables():
+        async with engine.begin() as conn:
+            await conn.run_sync(SQLModel.metadata.drop_all)
+            await conn.run_sync(drop_search_index)
+        await engine.dispose()
+
+    asyncio.run(drop_db_and_tables())
 
 
 @pytest.fixture(name="client")
-def client_fixture(session: Session):
-    def get_session_override():
-        return session
+def client_fixture(engine: AsyncEngine, tmp_path):
+    session_maker = create_session_maker(engine)
+
+    async def get_session_override():
+        async with session_maker() as session:
+            yield session
 
     app.dependency_overrides[get_session] = get_session_override
+    app.dependency_overrides[get_session_maker] = lambda: session_maker
+    # In-process caches must not leak rows of the previous test DB
+    tag_vocabulary.invalidate()
+    response_cache.invalidate()
+    llm_router.reset()
+    smart_tag_cache.configure(path=str(tmp_path / "llm_cache.db"))
     client = TestClient(app)
     yield client
     app.dependency_overrides.clear()
+
+
+@pytest.fixture(name="query_counter")
+def query_counter_fixture(engine: AsyncEngine):
+    # Collects every SQL statement sent to the test DB, to assert bounded query counts per request
+    statements: list[str] = []
+
+    def before_cursor_execute(
+        conn, cursor, statement, parameters, context, executemany
+    ):
+        statements.append(statement)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    yield statements
+    event.remove(engine.sync_engine, "before_cursor_execute", before_cursor_execute)
@@ -1,7 +1,32 @@
+import asyncio
+import re
 from unittest.mock import patch
 from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from app.services.ai_service import SmartTagResult
+from app.config.config import settings
+from app.schemas.link import TaskTagLink
+from app.services.ai_service import (
+    BatchSmartTagItem,
+    BatchSmartTagResult,
+    SmartTagResult,
+    clear_llm_clients,
+    get_llm,
+)
+from app.services.llm_limiter import LLMLimiter, LLMOverloadedError
+from app.services.smart_tag_cache import smart_tag_cache
+from app.services.tag_vocabulary import tag_vocabulary
+
+
+class SlowLLM:
+    # Stands in for the structured-output chat model returned by get_llm
+    def __init__(self, delay: float):
+        self.delay = delay
+
+    async def ainvoke(self, prompt: str):
+        await asyncio.sleep(self.delay)
+        return SmartTagResult(tag_name="Slow", is_new=True)
 
 
 def test_single_smart_tag_hallucinated_tag(client: TestClient):
@@ -73,3 +98,325 @@ def test_single_smart_tag_llm_exception(client: TestClient):
         response = client.post(f"/ai/{task_id}")
         assert response.status_code == 503
         assert "AI service temporarily unavailable" in response.text
+
+
+def test_single_smart_tag_llm_overloaded(client: TestClient):
+    # 5. Too many LLM calls waiting for a slot -> HTTP 429 with Retry-After
+    task_resp = client.post("/tasks/", json={"title": "Test", "description": "desc"})
+    task_id = task_resp.json()["id"]
+    with patch(
+        "app.services.ai_service.call_llm",
+        side_effect=LLMOverloadedError("queue is full"),
+    ):
+        response = client.post(f"/ai/{task_id}")
+        assert response.status_code == 429
+        assert "Retry-After" in response.headers
+
+
+def test_single_smart_tag_llm_timeout(client: TestClient):
+    # 6. The provider does not answer within LLM_TIMEOUT -> HTTP 504
+    task_resp = client.post("/tasks/", json={"title": "Test", "description": "desc"})
+    task_id = task_resp.json()["id"]
+    with (
+        patch("app.services.ai_service.get_llm", return_value=SlowLLM(delay=1)),
+        patch.object(settings, "LLM_TIMEOUT", 0.01),
+    ):
+        response = client.post(f"/ai/{task_id}")
+        assert response.status_code == 504
+
+
+def test_llm_limiter_backpressure():
+    # 1 call in flight, 1 waiting, the 3rd one is rejected right away
+    limiter = LLMLimiter(max_concurrency=1, max_waiting=1)
+
+    async def call():
+        async with limiter.slot():
+            await asyncio.sleep(0.05)
+        return "ok"
+
+    async def run():
+        return await asyncio.gather(*[call() for _ in range(3)], return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert results[:2] == ["ok", "ok"]
+    assert isinstance(results[2], LLMOverloadedError)
+    assert limiter.in_flight == 0 and limiter.waiting == 0
+
+
+def test_llm_client_is_cached():
+    # The client is built once per provider/model/schema and rebuilt when the API key changes
+    clear_llm_clients()
+    with (
+        patch.object(settings, "GEMINI_API_KEY", ""),
+        patch.object(settings, "OPENAI_API_KEY", "sk-test-1"),
+    ):
+        llm = get_llm()
+        assert get_llm() is llm
+        with patch.object(settings, "OPENAI_API_KEY", "sk-test-2"):
+            assert get_llm() is not llm
+    clear_llm_clients()
+
+
+def _answer_batch(tag_for_title: dict[str, str]):
+    # Fake call_llm_batch: answers every task of the prompt with the tag of its title
+    async def fake_call_llm_batch(prompt: str) -> BatchSmartTagResult:
+        items = re.findall(r"- task_id: (\d+)\n\s+- Title: (.*)\n", prompt)
+        return BatchSmartTagResult(
+            results=[
+                BatchSmartTagItem(
+                    task_id=int(task_id), tag_name=tag_for_title[title], is_new=False
+                )
+                for task_id, title in items
+                if title in tag_for_title
+            ]
+        )
+
+    return fake_call_llm_batch
+
+
+def test_batch_smart_tag(client: TestClient):
+    # Tasks are split in several prompts, existing tags are reused (case insensitive) and new ones created once
+    client.post("/tags/", json={"tag": "Work"})
+    titles = {"cv": "work", "gym": "Sport", "run": "Sport", "mail": "Work"}
+    ids = {
+        title: client.post("/tasks/", json={"title": title}).json()["id"]
+        for title in titles
+    }
+    with (
+        patch(
+            "app.services.ai_service.call_llm_batch",
+            side_effect=_answer_batch(titles),
+        ) as llm,
+        patch.object(settings, "AI_BATCH_CHUNK_SIZE", 3),
+    ):
+        # A task id that doesn't exist is reported as failed
+        response = client.post(
+            "/ai/batch", json={"task_ids": [*ids.values(), 999, 999]}
+        )
+    assert response.status_code == 200
+    assert llm.call_count == 2
+    data = response.json()
+    assert data["failed"] == [999]
+    tag_of = {t["task_id"]: t["tag"] for t in data["tagged"]}
+    assert tag_of == {
+        ids["cv"]: "Work",
+        ids["gym"]: "Sport",
+        ids["run"]: "Sport",
+        ids["mail"]: "Work",
+    }
+    # Only one "Sport" tag was created
+    tags = client.get("/tags/tag_page").json()
+    assert sorted(t["tag"] for t in tags) == ["Sport", "Work"]
+    assert client.get(f"/tasks/{ids['gym']}").json()["tags"][0]["tag"] == "Sport"
+
+
+def test_batch_smart_tag_untagged_and_failures(client: TestClient):
+    # Only untagged tasks are sent; a task the LLM skipped or re-tagged with its own tag is reported as failed
+    tag_id = client.post("/tags/", json={"tag": "Home"}).json()["id"]
+    tagged_id = client.post("/tasks/", json={"title": "tagged"}).json()["id"]
+    client.patch(f"/tasks/{tagged_id}/tag", params={"tag_id": tag_id})
+    ok_id = client.post("/tasks/", json={"title": "ok"}).json()["id"]
+    skipped_id = client.post("/tasks/", json={"title": "skipped"}).json()["id"]
+    with patch(
+        "app.services.ai_service.call_llm_batch",
+        side_effect=_answer_batch({"ok": "Home", "tagged": "Home"}),
+    ):
+        response = client.post("/ai/batch", json={"untagged": True})
+    assert response.status_code == 200
+    data = response.json()
+    assert [t["task_id"] for t in data["tagged"]] == [ok_id]
+    assert data["failed"] == [skipped_id]
+
+
+def test_batch_smart_tag_concurrent_tagging(client: TestClient, engine: AsyncEngine):
+    # A task tagged with the same tag by another request during the LLM call is reported as failed
+    tag_id = client.post("/tags/", json={"tag": "Home"}).json()["id"]
+    raced_id = client.post("/tasks/", json={"title": "raced"}).json()["id"]
+    ok_id = client.post("/tasks/", json={"title": "ok"}).json()["id"]
+    answer = _answer_batch({"raced": "Home", "ok": "Home"})
+
+    async def racing_call_llm_batch(prompt: str) -> BatchSmartTagResult:
+        async with AsyncSession(engine) as session:
+            session.add(TaskTagLink(task_id=raced_id, tag_id=tag_id))
+            await session.commit()
+        return await answer(prompt)
+
+    with patch(
+        "app.services.ai_service.call_llm_batch", side_effect=racing_call_llm_batch
+    ):
+        response = client.post("/ai/batch", json={"task_ids": [raced_id, ok_id]})
+    assert response.status_code == 200
+    data = response.json()
+    assert [t["task_id"] for t in data["tagged"]] == [ok_id]
+    assert data["failed"] == [raced_id]
+    assert [t["tag"] for t in client.get(f"/tasks/{raced_id}").json()["tags"]] == [
+        "Home"
+    ]
+
+
+def test_batch_smart_tag_llm_exception(client: TestClient):
+    task_id = client.post("/tasks/", json={"title": "t"}).json()["id"]
+    with patch(
+        "app.services.ai_service.call_llm_batch", side_effect=Exception("LLM crashed!")
+    ):
+        response = client.post("/ai/batch", json={"task_ids": [task_id]})
+    assert response.status_code == 200
+    assert response.json() == {"tagged": [], "failed": [task_id]}
+
+
+def test_batch_smart_tag_invalid_request(client: TestClient):
+    assert client.post("/ai/batch", json={}).status_code == 422
+    assert (
+        client.post("/ai/batch", json={"task_ids": [1], "untagged": True}).status_code
+        == 422
+    )
+
+
+def test_single_smart_tag_uses_tag_vocabulary(
+    client: TestClient, query_counter: list[str]
+):
+    # The tag vocabulary is loaded once, then kept in sync by the tag endpoints: no Tag table scan per call
+    client.post("/tags/", json={"tag": "Work"})
+    first_id = client.post("/tasks/", json={"title": "first"}).json()["id"]
+    second_id = client.post("/tasks/", json={"title": "second"}).json()["id"]
+    with patch(
+        "app.services.ai_service.call_llm",
+        return_value=SmartTagResult(tag_name="work", is_new=False),
+    ):
+        assert client.post(f"/ai/{first_id}").status_code == 200
+        renamed = client.post("/tags/", json={"tag": "Home"}).json()["id"]
+        client.patch(f"/tags/{renamed}/edit", json={"tag": "House"})
+
+        query_counter.clear()
+        response = client.post(f"/ai/{second_id}")
+    assert response.status_code == 200
+    assert [t["tag"] for t in response.json()["tags"]] == ["Work"]
+    full_scans = [
+        s for s in query_counter if re.search(r"\bFROM tag\b", s) and "WHERE" not in s
+    ]
+    assert full_scans == []
+    assert sorted(tag_vocabulary.names()) == ["House", "Work"]
+    client.delete(f"/tags/{renamed}")
+    assert tag_vocabulary.names() == ["Work"]
+
+
+def test_tag_vocabulary_keeps_the_other_tags_of_a_name(client: TestClient):
+    # Deleting or renaming one of the tags named "work" (case insensitive) leaves the others
+    first = client.post("/tags/", json={"tag": "Work"}).json()["id"]
+    second = client.post("/tags/", json={"tag": "work"}).json()["id"]
+    third = client.post("/tags/", json={"tag": "WORK"}).json()["id"]
+    task_id = client.post("/tasks/", json={"title": "Report"}).json()["id"]
+    # Loads the vocabulary
+    with patch(
+        "app.services.ai_service.call_llm",
+        return_value=SmartTagResult(tag_name="Office", is_new=True),
+    ):
+        assert client.post(f"/ai/{task_id}").status_code == 200
+    assert tag_vocabulary.lookup("work") == first
+    client.delete(f"/tags/{first}")
+    assert tag_vocabulary.lookup("Work") == second
+    client.patch(f"/tags/{second}/edit", json={"tag": "Job"})
+    assert tag_vocabulary.lookup("work") == third
+    assert tag_vocabulary.lookup("job") == second
+    assert sorted(tag_vocabulary.names()) == ["Job", "Office", "WORK"]
+
+    # The LLM picks "Work": the remaining tag is reused, no duplicate created
+    with patch(
+        "app.services.ai_service.call_llm",
+        return_value=SmartTagResult(tag_name="Work", is_new=False),
+    ):
+        response = client.post(f"/ai/{task_id}")
+    assert response.status_code == 200
+    assert third in [t["id"] for t in response.json()["tags"]]
+    assert sorted(tag_vocabulary.names()) == ["Job", "Office", "WORK"]
+
+
+def test_single_smart_tag_tag_deleted_by_another_worker(client: TestClient):
+    # The in-process vocabulary still has the tag another worker deleted: reloaded, the tag is created again
+    tag_id = client.post("/tags/", json={"tag": "Work"}).json()["id"]
+    client.post("/tags/", json={"tag": "Home"})
+    task_id = client.post("/tasks/", json={"title": "Report"}).json()["id"]
+    with patch(
+        "app.services.ai_service.call_llm",
+        return_value=SmartTagResult(tag_name="work", is_new=False),
+    ):
+        assert client.post(f"/ai/{task_id}").status_code == 200
+        client.patch(f"/tasks/{task_id}/untag", params={"tag_id": tag_id})
+        with patch.object(tag_vocabulary, "remove"):
+            client.delete(f"/tags/{tag_id}")
+        assert tag_vocabulary.lookup("work") == tag_id
+
+        response = client.post(f"/ai/{task_id}")
+    assert response.status_code == 200
+    assert [t["tag"] for t in response.json()["tags"]] == ["work"]
+    assert response.json()["tags"][0]["id"] != tag_id
+    assert tag_vocabulary.lookup("work") == response.json()["tags"][0]["id"]
+
+
+def test_single_smart_tag_cached_result(client: TestClient):
+    # The same task text with the same tags is answered from the cache, without calling the LLM
+    first_id = client.post("/tasks/", json={"title": "Pay rent", "description": "x"})
+    second_id = client.post("/tasks/", json={"title": "pay  RENT", "description": "X"})
+    with patch(
+        "app.services.ai_service.call_llm",
+        return_value=SmartTagResult(tag_name="Bills", is_new=True),
+    ) as llm:
+        assert client.post(f"/ai/{first_id.json()['id']}").status_code == 200
+        # The vocabulary changed (new "Bills" tag): miss, then hit
+        assert client.post(f"/ai/{second_id.json()['id']}").status_code == 200
+        third_id = client.post(
+            "/tasks/", json={"title": "Pay rent", "description": "x"}
+        )
+        response = client.post(f"/ai/{third_id.json()['id']}")
+    assert response.status_code == 200
+    assert response.json()["tags"][0]["tag"] == "Bills"
+    assert llm.call_count == 2
+    assert (smart_tag_cache.hits, smart_tag_cache.misses) == (1, 2)
+
+
+def test_single_smart_tag_shortcircuit(client: TestClient):
+    # A task naming an existing tag is tagged locally, without calling the LLM
+    client.post("/tags/", json={"tag": "Gym"})
+    task_id = client.post("/tasks/", json={"title": "Go to the gym"}).json()["id"]
+    with patch("app.services.ai_service.call_llm") as llm:
+        response = client.post(f"/ai/{task_id}")
+    assert response.status_code == 200
+    assert [t["tag"] for t in response.json()["tags"]] == ["Gym"]
+    assert llm.call_count == 0
+
+
+def test_smart_tag_prompt_preselection(client: TestClient):
+    # Only the TAG_PRESELECT_TOP_K closest tags are offered to the LLM
+    for name in ["Shopping", "Sport", "Finance", "Travel"]:
+        client.post("/tags/", json={"tag": name})
+    task_id = client.post(
+        "/tasks/", json={"title": "Buy groceries", "description": "shop list"}
+    ).json()["id"]
+    with (
+        patch(
+            "app.services.ai_service.call_llm",
+            return_value=SmartTagResult(tag_name="Shopping", is_new=False),
+        ) as llm,
+        patch.object(settings, "TAG_PRESELECT_TOP_K", 1),
+    ):
+        assert client.post(f"/ai/{task_id}").status_code == 200
+    prompt = llm.call_args.args[0]
+    assert 'Available tag list: ["Shopping"]' in prompt
+    assert "Travel" not in prompt
+
+
+def test_batch_smart_tag_shortcircuit(client: TestClient):
+    # Tasks naming a tag are tagged locally, only the others are sent to the LLM
+    client.post("/tags/", json={"tag": "Gym"})
+    gym_id = client.post("/tasks/", json={"title": "gym session"}).json()["id"]
+    other_id = client.post("/tasks/", json={"title": "call mom"}).json()["id"]
+    with patch(
+        "app.services.ai_service.call_llm_batch",
+        side_effect=_answer_batch({"call mom": "Family"}),
+    ) as llm:
+        response = client.post("/ai/batch", json={"task_ids": [gym_id, other_id]})
+    assert response.status_code == 200
+    assert llm.call_count == 1
+    assert f"task_id: {gym_id}\n" not in llm.call_args.args[0]
+    tag_of = {t["task_id"]: t["tag"] for t in response.json()["tagged"]}
+    assert tag_of == {gym_id: "Gym", other_id: "Family"}
@@ -0,0 +1,213 @@
+import asyncio
+from datetime import datetime
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.config.config import settings
+from app.db.database import create_session_maker
+from app.schemas.ai_job import AIJob
+from app.services.ai_jobs import AIJobWorker, retry_delay
+from app.services.ai_service import SmartTagResult
+
+
+@pytest.fixture(name="worker")
+def worker_fixture(engine: AsyncEngine) -> AIJobWorker:
+    # Not started: the tests run the jobs one at a time with run_once
+    return AIJobWorker(create_session_maker(engine), workers=1)
+
+
+def _queue(client: TestClient, title: str = "Write the report") -> tuple[int, dict]:
+    task_id = client.post("/tasks/", json={"title": title}).json()["id"]
+    response = client.post(f"/ai/{task_id}", params={"background": True})
+    assert response.status_code == 202
+    return task_id, response.json()
+
+
+def test_background_smart_tag_queues_a_job(client: TestClient):
+    task_id, job = _queue(client)
+    assert job["task_id"] == task_id
+    assert job["status"] == "queued"
+    assert job["attempts"] == 0
+    assert job["result"] is None
+
+    # The same task queued again gets the job already waiting
+    response = client.post(f"/ai/{task_id}", params={"background": True})
+    assert response.status_code == 202
+    assert response.json()["id"] == job["id"]
+    assert response.headers["Location"] == f"/ai/jobs/{job['id']}"
+
+    response = client.get(f"/ai/jobs/{job['id']}")
+    assert response.status_code == 200
+    assert response.json()["status"] == "queued"
+
+
+def test_background_smart_tag_missing_task(client: TestClient):
+    assert client.post("/ai/999", params={"background": True}).status_code == 404
+    assert client.get("/ai/jobs/999").status_code == 404
+
+
+def test_job_runs_and_stores_the_tagged_task(client: TestClient, worker: AIJobWorker):
+    task_id, job = _queue(client)
+    with patch(
+        "app.services.ai_service.call_llm",
+        return_value=SmartTagResult(tag_name="Work", is_new=True),
+    ):
+        assert asyncio.run(worker.run_once())
+    assert not asyncio.run(worker.run_once())
+
+    job = client.get(f"/ai/jobs/{job['id']}").json()
+    assert job["status"] == "done"
+    assert job["attempts"] == 1
+    assert job["result"]["id"] == task_id
+    assert [tag["tag"] for tag in job["result"]["tags"]] == ["Work"]
+    assert [tag["tag"] for tag in client.get(f"/tasks/{task_id}").json()["tags"]] == [
+        "Work"
+    ]
+
+    # A finished job doesn't hold the task: a new request queues a new job
+    response = client.post(f"/ai/{task_id}", params={"background": True})
+    assert response.json()["id"] != job["id"]
+
+
+def _make_due(engine: AsyncEngine):
+    async def run():
+        async with engine.begin() as conn:
+            await conn.execute(update(AIJob).values(run_after=datetime.now()))
+
+    asyncio.run(run())
+
+
+def test_job_retried_with_backoff_then_failed(
+    client: TestClient, engine: AsyncEngine, worker: AIJobWorker
+):
+    _, job = _queue(client)
+    with patch("app.services.ai_service.call_llm", side_effect=TimeoutError):
+        assert asyncio.run(worker.run_once())
+        job = client.get(f"/ai/jobs/{job['id']}").json()
+        assert job["status"] == "queued"
+        assert job["attempts"] == 1
+        assert "took too long" in job["error"]
+        # Not due before its backoff delay
+        assert not asyncio.run(worker.run_once())
+
+        for _ in range(settings.AI_JOB_MAX_ATTEMPTS - 1):
+            _make_due(engine)
+            assert asyncio.run(worker.run_once())
+        _make_due(engine)
+        assert not asyncio.run(worker.run_once())
+
+    job = client.get(f"/ai/jobs/{job['id']}").json()
+    assert job["status"] == "failed"
+    assert job["attempts"] == settings.AI_JOB_MAX_ATTEMPTS
+
+
+def test_retry_delay_is_exponential_and_capped():
+    with (
+        patch.object(settings, "AI_JOB_RETRY_DELAY", 2.0),
+        patch.object(settings, "AI_JOB_MAX_RETRY_DELAY", 10.0),
+    ):
+        assert [retry_delay(n) for n in range(1, 6)] == [2.0, 4.0, 8.0, 10.0, 10.0]
+
+
+def test_job_of_a_deleted_task_fails(client: TestClient, worker: AIJobWorker):
+    task_id, job = _queue(client)
+    client.delete(f"/tasks/{task_id}")
+    assert asyncio.run(worker.run_once())
+
+    job = client.get(f"/ai/jobs/{job['id']}").json()
+    assert job["status"] == "failed"
+    assert job["attempts"] == 1
+    assert job["error"] == "Task not found"
+
+
+def test_running_job_claimed_again_after_its_lease(
+    client: TestClient, worker: AIJobWorker
+):
+    _, job = _queue(client)
+    claimed = asyncio.run(worker.claim())
+    assert claimed.id == job["id"]
+    # Its worker is gone: nobody else takes it while the lease lasts
+    assert asyncio.run(worker.claim()) is None
+    with patch.object(settings, "AI_JOB_LEASE", 0):
+        claimed = asyncio.run(worker.claim())
+    assert claimed.id == job["id"]
+    assert claimed.attempts == 2
+    assert claimed.updated_at <= datetime.now()
+
+
+def test_idle_claim_writes_nothing(
+    client: TestClient, worker: AIJobWorker, query_counter: list[str]
+):
+    # Nothing due (the only job runs, its lease is fresh): the poll of an idle worker is a single SELECT
+    _queue(client)
+    assert asyncio.run(worker.claim()) is not None
+    query_counter.clear()
+    assert asyncio.run(worker.claim()) is None
+    assert len(query_counter) == 1
+    assert query_counter[0].lstrip().upper().startswith("SELECT")
+
+
+def test_lease_renewed_while_the_job_runs(client: TestClient, worker: AIJobWorker):
+    _, job = _queue(client)
+    other_worker = AIJobWorker(worker.session_maker, workers=1)
+
+    async def slow_llm(*args, **kwargs):
+        await asyncio.sleep(0.5)  # e.g. waiting for a slot of the LLM limiter
+        return SmartTagResult(tag_name="Work", is_new=True)
+
+    async def run():
+        running = asyncio.create_task(worker.run_once())
+        await asyncio.sleep(0.35)
+        # Past the lease from the claim, but renewed by the heartbeat: not claimed again
+        claimed = await other_worker.claim()
+        assert await running
+        return claimed
+
+    with (
+        patch.object(settings, "AI_JOB_LEASE", 0.3),
+        patch("app.services.ai_service.call_llm", side_effect=slow_llm),
+    ):
+        assert asyncio.run(run()) is None
+    job = client.get(f"/ai/jobs/{job['id']}").json()
+    assert job["status"] == "done"
+    assert job["attempts"] == 1
+
+
+def test_lost_job_out_of_attempts_fails(client: TestClient, worker: AIJobWorker):
+    _, job = _queue(client)
+    with (
+        patch.object(settings, "AI_JOB_MAX_ATTEMPTS", 2),
+        patch.object(settings, "AI_JOB_LEASE", 0),
+    ):
+        # Its worker dies on every attempt
+        assert asyncio.run(worker.claim()).attempts == 1
+        assert asyncio.run(worker.claim()).attempts == 2
+        assert asyncio.run(worker.claim()) is None
+    job = client.get(f"/ai/jobs/{job['id']}").json()
+    assert job["status"] == "failed"
+    assert job["attempts"] == 2
+    assert job["error"] == "Worker lost while running the job"
+
+
+def test_outcome_of_a_reclaimed_job_is_dropped(client: TestClient, worker: AIJobWorker):
+    _, job = _queue(client)
+    stale = asyncio.run(worker.claim())
+    with patch.object(settings, "AI_JOB_LEASE", 0):
+        assert asyncio.run(worker.claim()).attempts == 2
+
+    # The first worker comes back: its claim is no longer the current one
+    with (
+        patch.object(worker, "claim", return_value=stale),
+        patch(
+            "app.services.ai_service.call_llm",
+            return_value=SmartTagResult(tag_name="Work", is_new=True),
+        ),
+    ):
+        assert asyncio.run(worker.run_once())
+    job = client.get(f"/ai/jobs/{job['id']}").json()
+    assert job["status"] == "running"
+    assert job["attempts"] == 2
@@ -0,0 +1,127 @@
+import re
+
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+
+from app.config.config import settings
+
+
+def test_bulk_create_tasks(client: TestClient, query_counter: list[str]):
+    payloads = [{"title": f"task {i}", "is_done": i % 2 == 0} for i in range(50)]
+    response = client.post("/tasks/bulk", json=payloads)
+    assert response.status_code == 200
+    ids = response.json()["ids"]
+    assert len(ids) == 50
+    # Ids in the order of the payloads, and a single multi-row INSERT without refresh
+    assert [client.get(f"/tasks/{i}").json()["title"] for i in ids[:3]] == [
+        "task 0",
+        "task 1",
+        "task 2",
+    ]
+    inserts = [s for s in query_counter if s.startswith("INSERT INTO task ")]
+    assert len(inserts) == 1
+    assert client.post("/tasks/bulk", json=[]).json() == {"ids": []}
+
+
+def test_bulk_edit_tasks(client: TestClient):
+    ids = client.post(
+        "/tasks/bulk", json=[{"title": "a", "description": "keep"}, {"title": "b"}]
+    ).json()["ids"]
+    response = client.patch(
+        "/tasks/bulk",
+        json=[{"id": ids[0], "is_done": True}, {"id": ids[1], "title": "B"}],
+    )
+    assert response.status_code == 200
+    assert response.json() == {"ids": ids}
+    first, second = (client.get(f"/tasks/{i}").json() for i in ids)
+    # Only the fields sent are updated
+    assert (first["title"], first["description"], first["is_done"]) == (
+        "a",
+        "keep",
+        True,
+    )
+    assert (second["title"], second["is_done"]) == ("B", False)
+
+
+def test_bulk_delete_tasks(client: TestClient):
+    ids = client.post("/tasks/bulk", json=[{"title": "a"}, {"title": "b"}]).json()[
+        "ids"
+    ]
+    tag_id = client.post("/tags/", json={"tag": "Work"}).json()["id"]
+    client.patch(f"/tasks/{ids[0]}/tag", params={"tag_id": tag_id})
+    response = client.request("DELETE", "/tasks/bulk", json={"ids": ids})
+    assert response.status_code == 200
+    assert all(client.get(f"/tasks/{i}").status_code == 404 for i in ids)
+    # The tag links are deleted too
+    assert client.get(f"/tags/{tag_id}").json()["tasks"] == []
+
+
+def test_bulk_missing_tasks_are_rejected(client: TestClient):
+    # Nothing is written when one of the tasks doesn't exist
+    task_id = client.post("/tasks/", json={"title": "a"}).json()["id"]
+    response = client.patch(
+        "/tasks/bulk",
+        json=[{"id": task_id, "title": "changed"}, {"id": 999, "title": "x"}],
+    )
+    assert response.status_code == 404
+    assert re.search(r"\b999\b", response.json()["detail"])
+    response = client.request("DELETE", "/tasks/bulk", json={"ids": [task_id, 999]})
+    assert response.status_code == 404
+    assert client.get(f"/tasks/{task_id}").json()["title"] == "a"
+
+
+def test_bulk_size_limit(client: TestClient):
+    with patch.object(settings, "TASK_BULK_MAX_ITEMS", 2):
+        response = client.post("/tasks/bulk", json=[{"title": "t"}] * 3)
+    assert response.status_code == 400
+    assert client.get("/tasks/task_page").json() == []
+
+
+def test_bulk_tag_and_untag(client: TestClient, query_counter: list[str]):
+    ids = client.post("/tasks/bulk", json=[{"title": "a"}, {"title": "b"}]).json()[
+        "ids"
+    ]
+    work = client.post("/tags/", json={"tag": "Work"}).json()["id"]
+    home = client.post("/tags/", json={"tag": "Home"}).json()["id"]
+    client.patch(f"/tasks/{ids[0]}/tag", params={"tag_id": work})
+    pairs = [
+        {"task_id": ids[0], "tag_id": work},
+        {"task_id": ids[0], "tag_id": home},
+        {"task_id": ids[1], "tag_id": work},
+        {"task_id": ids[1], "tag_id": work},
+        {"task_id": 999, "tag_id": work},
+        {"task_id": ids[1], "tag_id": 999},
+    ]
+    query_counter.clear()
+    response = client.patch("/tasks/bulk/tag", json={"pairs": pairs})
+    assert response.status_code == 200
+    assert [r["status"] for r in response.json()["results"]] == [
+        "already_tagged",
+        "tagged",
+        "tagged",
+        "already_tagged",
+        "task_not_found",
+        "tag_not_found",
+    ]
+    # Two existence checks and one INSERT, no relationship load
+    assert len([s for s in query_counter if s.startswith("INSERT")]) == 1
+    assert not any("FROM tasktaglink" in s for s in query_counter)
+    assert [t["tag"] for t in client.get(f"/tasks/{ids[0]}").json()["tags"]] == [
+        "Work",
+        "Home",
+    ]
+
+    response = client.patch(
+        "/tasks/bulk/untag",
+        json={
+            "pairs": [
+                {"task_id": ids[0], "tag_id": work},
+                {"task_id": ids[1], "tag_id": home},
+            ]
+        },
+    )
+    assert [r["status"] for r in response.json()["results"]] == [
+        "untagged",
+        "not_tagged",
+    ]
+    assert [t["tag"] for t in client.get(f"/tasks/{ids[0]}").json()["tags"]] == ["Home"]
@@ -0,0 +1,101 @@
+from fastapi.testclient import TestClient
+
+from app.services.pagination import NEXT_CURSOR_HEADER
+from app.services.response_cache import etag_matches, response_cache
+
+
+def test_etag_matches():
+    assert etag_matches('"a"', '"a"')
+    assert etag_matches('"b", W/"a"', '"a"')
+    assert etag_matches("*", '"a"')
+    assert not etag_matches('"b"', '"a"')
+    assert not etag_matches(None, '"a"')
+
+
+def test_task_not_modified(client: TestClient, query_counter: list[str]):
+    task_id = client.post("/tasks/", json={"title": "Test"}).json()["id"]
+    response = client.get(f"/tasks/{task_id}")
+    etag = response.headers["ETag"]
+    assert response.headers["Cache-Control"] == "no-cache"
+
+    # Revalidation: only the version is read, nothing is loaded or serialized
+    query_counter.clear()
+    response = client.get(f"/tasks/{task_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["ETag"] == etag
+    assert len(query_counter) == 1
+
+    client.patch(f"/tasks/{task_id}/edit", json={"is_done": True})
+    response = client.get(f"/tasks/{task_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["is_done"] is True
+    assert response.headers["ETag"] != etag
+
+    assert client.get("/tasks/123456").status_code == 404
+
+
+def test_nested_changes_update_the_etags(client: TestClient):
+    # A task is served with its tags and a tag with its tasks
+    task_id = client.post("/tasks/", json={"title": "Test"}).json()["id"]
+    tag_id = client.post("/tags/", json={"tag": "Work"}).json()["id"]
+    task_etag = client.get(f"/tasks/{task_id}").headers["ETag"]
+    tag_etag = client.get(f"/tags/{tag_id}").headers["ETag"]
+
+    client.patch(f"/tasks/{task_id}/tag", params={"tag_id": tag_id})
+    response = client.get(f"/tasks/{task_id}", headers={"If-None-Match": task_etag})
+    assert response.status_code == 200
+    task_etag = response.headers["ETag"]
+    response = client.get(f"/tags/{tag_id}", headers={"If-None-Match": tag_etag})
+    assert response.status_code == 200
+    tag_etag = response.headers["ETag"]
+
+    client.patch(f"/tags/{tag_id}/edit", json={"tag": "Office"})
+    response = client.get(f"/tasks/{task_id}", headers={"If-None-Match": task_etag})
+    assert response.status_code == 200
+    assert response.json()["tags"][0]["tag"] == "Office"
+
+    client.patch(f"/tasks/{task_id}/edit", json={"title": "Renamed"})
+    response = client.get(f"/tags/{tag_id}", headers={"If-None-Match": tag_etag})
+    assert response.status_code == 200
+    assert response.json()["tasks"][0]["title"] == "Renamed"
+
+
+def test_page_cache(client: TestClient, query_counter: list[str]):
+    client.post("/tasks/bulk", json=[{"title": f"task{i}"} for i in range(3)])
+    first = client.get("/tasks/task_page", params={"limit": 2})
+    assert NEXT_CURSOR_HEADER in first.headers
+
+    # Served from the cache: the version query only, same bytes and headers
+    hits = response_cache.hits
+    query_counter.clear()
+    second = client.get("/tasks/task_page", params={"limit": 2})
+    assert response_cache.hits == hits + 1
+    assert len(query_counter) == 1
+    # The write counter of the table, not a count(*) that would scan it
+    assert "count(" not in query_counter[0].lower()
+    assert second.content == first.content
+    assert second.headers[NEXT_CURSOR_HEADER] == first.headers[NEXT_CURSOR_HEADER]
+    assert second.headers["ETag"] == first.headers["ETag"]
+    # Another page has its own ETag
+    assert client.get("/tasks/task_page").headers["ETag"] != first.headers["ETag"]
+
+    # A delete bumps the version
+    client.request("DELETE", "/tasks/bulk", json={"ids": [1]})
+    assert len(response_cache) == 0
+    response = client.get(
+        "/tasks/task_page",
+        params={"limit": 2},
+        headers={"If-None-Match": first.headers["ETag"]},
+    )
+    assert response.status_code == 200
+    assert [task["title"] for task in response.json()] == ["task1", "task2"]
+
+
+def test_page_version_bumped_by_every_write(client: TestClient):
+    task_etag = client.get("/tasks/task_page").headers["ETag"]
+    tag_etag = client.get("/tags/tag_page").headers["ETag"]
+    # A tag page embeds the tasks and a task page the tags: both versions move
+    client.post("/tags/", json={"tag": "Work"})
+    assert client.get("/tasks/task_page").headers["ETag"] != task_etag
+    assert client.get("/tags/tag_page").headers["ETag"] != tag_etag
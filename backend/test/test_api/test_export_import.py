@@ -0,0 +1,79 @@
+import json
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+from app.config.config import settings
+
+
+def _ndjson(tasks: list[dict]) -> bytes:
+    return b"".join(json.dumps(task).encode() + b"\n" for task in tasks)
+
+
+def test_export(client: TestClient):
+    tag_id = client.post("/tags/", json={"tag": "Work"}).json()["id"]
+    client.post("/tasks/bulk", json=[{"title": f"task{i}"} for i in range(5)])
+    client.patch("/tasks/2/tag", params={"tag_id": tag_id})
+
+    # Several batches of the server-side cursor
+    with patch.object(settings, "TASK_EXPORT_BATCH_SIZE", 2):
+        response = client.get("/tasks/export")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [task["title"] for task in lines] == [f"task{i}" for i in range(5)]
+    # Same format as GET /tasks/{id}
+    assert lines[1] == client.get("/tasks/2").json()
+    assert lines[1]["tags"] == [{"tag": "Work", "id": tag_id}]
+
+
+def test_import(client: TestClient):
+    existing_id = client.post("/tags/", json={"tag": "Work"}).json()["id"]
+    tasks = [
+        {"title": "a", "tags": [{"tag": "work"}, {"tag": "Home"}]},
+        {"title": "b", "is_done": True, "created_at": "2024-01-02T03:04:05"},
+        {"title": "c", "tags": [{"tag": "home"}, {"tag": "HOME"}]},
+    ]
+    # The body in small pieces, split in the middle of the lines
+    body = _ndjson(tasks) + b"\n"
+    chunks = [body[i : i + 7] for i in range(0, len(body), 7)]
+    with patch.object(settings, "TASK_IMPORT_CHUNK_SIZE", 2):
+        response = client.post("/tasks/import", content=iter(chunks))
+    assert response.status_code == 200
+    assert response.json() == {"imported": 3, "created_tags": 1}
+
+    page = client.get("/tasks/task_page").json()
+    assert [task["title"] for task in page] == ["a", "b", "c"]
+    # Tag names matched case-insensitively, one tag created for all the spellings of "home"
+    assert [tag["id"] for tag in page[0]["tags"]][0] == existing_id
+    home_id = page[0]["tags"][1]["id"]
+    assert [tag["id"] for tag in page[2]["tags"]] == [home_id]
+    assert page[1]["created_at"] == "2024-01-02T03:04:05"
+    assert page[1]["is_done"] is True
+    # Imported tasks are searchable
+    assert [t["title"] for t in client.get("/tasks/search?q=c").json()] == ["c"]
+
+
+def test_export_import_round_trip(client: TestClient):
+    tag_id = client.post("/tags/", json={"tag": "Work"}).json()["id"]
+    client.post("/tasks/bulk", json=[{"title": f"task{i}"} for i in range(3)])
+    client.patch("/tasks/1/tag", params={"tag_id": tag_id})
+    export = client.get("/tasks/export").content
+
+    response = client.post("/tasks/import", content=export)
+    assert response.json() == {"imported": 3, "created_tags": 0}
+    tasks = client.get("/tasks/task_page").json()
+    assert len(tasks) == 6
+    assert tasks[3]["tags"] == [{"tag": "Work", "id": tag_id}]
+    assert client.get(f"/tags/{tag_id}").json()["tasks"][1]["id"] == tasks[3]["id"]
+
+
+def test_import_invalid_line(client: TestClient):
+    body = _ndjson([{"title": "a"}, {"title": "b"}]) + b"{not json}\n"
+    with patch.object(settings, "TASK_IMPORT_CHUNK_SIZE", 1):
+        response = client.post("/tasks/import", content=body)
+    assert response.status_code == 400
+    assert response.json()["detail"].startswith("Line 3:")
+    assert "2 tasks imported before it" in response.json()["detail"]
+    # The chunks before the invalid line are committed
+    assert len(client.get("/tasks/task_page").json()) == 2
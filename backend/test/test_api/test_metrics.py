@@ -0,0 +1,102 @@
+import asyncio
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+from app.config.config import settings
+from app.services.ai_service import SmartTagResult, get_llm_provider_name
+from app.services.metrics import (
+    MetricsRegistry,
+    http_request_duration,
+    http_requests_in_flight,
+    llm_call_duration,
+)
+
+
+class SlowLLM:
+    def __init__(self, delay: float):
+        self.delay = delay
+
+    async def ainvoke(self, prompt: str):
+        await asyncio.sleep(self.delay)
+        return SmartTagResult(tag_name="Slow", is_new=True)
+
+
+def test_histogram_render():
+    registry = MetricsRegistry()
+    histogram = registry.histogram(
+        "latency_seconds", "Latency", labels=("route",), buckets=(0.1, 1.0)
+    )
+    histogram.observe(0.05, "/a")
+    histogram.observe(0.5, "/a")
+    histogram.observe(5, "/a")
+    counter = registry.counter("errors_total", "Errors", labels=("kind",))
+    counter.inc('bad "quote"')
+
+    lines = registry.render().splitlines()
+    assert "# TYPE latency_seconds histogram" in lines
+    # Cumulative buckets
+    assert 'latency_seconds_bucket{route="/a",le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{route="/a",le="1.0"} 2' in lines
+    assert 'latency_seconds_bucket{route="/a",le="+Inf"} 3' in lines
+    assert 'latency_seconds_count{route="/a"} 3' in lines
+    assert 'latency_seconds_sum{route="/a"} 5.55' in lines
+    assert 'errors_total{kind="bad \\"quote\\""} 1.0' in lines
+
+
+def test_metrics_endpoint(client: TestClient):
+    labels = ("GET", "/tasks/{task_id}", "404")
+    before = http_request_duration.count(*labels)
+    client.get("/tasks/123456")
+    client.get("/tasks/654321")
+    # One series per route template, not per path
+    assert http_request_duration.count(*labels) == before + 2
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    body = response.text
+    for name in (
+        "http_request_duration_seconds_bucket",
+        "http_requests_in_flight",
+        "db_pool_connections",
+        "db_pool_checkouts_total",
+        "db_queries_total",
+        "llm_calls_in_flight",
+        "smart_tag_cache_hit_ratio",
+        'smart_tag_cache_requests_total{result="hit"}',
+    ):
+        assert name in body
+    assert 'route="/tasks/{task_id}",status="404"' in body
+
+
+def test_streamed_response_metrics(client: TestClient):
+    # The streamed export is timed to its last chunk, once, with the headers of the endpoint kept
+    client.post("/tasks/bulk", json=[{"title": f"t{i}"} for i in range(3)])
+    labels = ("GET", "/tasks/export", "200")
+    before = http_request_duration.count(*labels)
+    response = client.get("/tasks/export")
+    assert response.status_code == 200
+    assert len(response.text.splitlines()) == 3
+    assert "Server-Timing" in response.headers
+    assert http_request_duration.count(*labels) == before + 1
+    assert http_requests_in_flight.get("tasks") == 0
+
+
+def test_llm_metrics_by_outcome(client: TestClient):
+    task_id = client.post("/tasks/", json={"title": "Test", "description": "desc"})
+    task_id = task_id.json()["id"]
+    provider = get_llm_provider_name()
+    timeouts = llm_call_duration.count(provider, "timeout")
+    successes = llm_call_duration.count(provider, "ok")
+
+    with (
+        patch("app.services.ai_service.get_llm", return_value=SlowLLM(delay=1)),
+        patch.object(settings, "LLM_TIMEOUT", 0.01),
+    ):
+        assert client.post(f"/ai/{task_id}").status_code == 504
+    with patch("app.services.ai_service.get_llm", return_value=SlowLLM(delay=0)):
+        assert client.post(f"/ai/{task_id}").status_code == 200
+
+    assert llm_call_duration.count(provider, "timeout") == timeouts + 1
+    assert llm_call_duration.count(provider, "ok") == successes + 1
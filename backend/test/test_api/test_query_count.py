@@ -0,0 +1,77 @@
+from fastapi.testclient import TestClient
+
+# Every endpoint must load the nested tags/tasks eagerly: the number of queries per request
+# must not grow with the number of rows on the page (no N+1 lazy loads).
+# The rows + their tags/tasks, and the version of the ETag
+MAX_QUERIES_PER_READ = 3
+
+
+def _create_tagged_tasks(client: TestClient, n_tasks: int = 20, n_tags: int = 3):
+    tag_ids = [
+        client.post("/tags/", json={"tag": f"tag{i}"}).json()["id"]
+        for i in range(n_tags)
+    ]
+    task_ids = []
+    for i in range(n_tasks):
+        task_id = client.post("/tasks/", json={"title": f"task{i}"}).json()["id"]
+        for tag_id in tag_ids:
+            client.patch(f"/tasks/{task_id}/tag", params={"tag_id": tag_id})
+        task_ids.append(task_id)
+    return task_ids, tag_ids
+
+
+def test_task_page_query_count(client: TestClient, query_counter: list[str]):
+    _create_tagged_tasks(client)
+    query_counter.clear()
+    response = client.get("/tasks/task_page")
+    assert response.status_code == 200
+    assert len(response.json()) == 20
+    assert all(len(t["tags"]) == 3 for t in response.json())
+    assert len(query_counter) <= MAX_QUERIES_PER_READ
+
+
+def test_tag_page_query_count(client: TestClient, query_counter: list[str]):
+    _create_tagged_tasks(client)
+    query_counter.clear()
+    response = client.get("/tags/tag_page")
+    assert response.status_code == 200
+    assert all(len(t["tasks"]) == 20 for t in response.json())
+    assert len(query_counter) <= MAX_QUERIES_PER_READ
+
+
+def test_single_get_query_count(client: TestClient, query_counter: list[str]):
+    task_ids, tag_ids = _create_tagged_tasks(client)
+    query_counter.clear()
+    assert client.get(f"/tasks/{task_ids[0]}").status_code == 200
+    assert len(query_counter) <= MAX_QUERIES_PER_READ
+    query_counter.clear()
+    assert client.get(f"/tags/{tag_ids[0]}").status_code == 200
+    assert len(query_counter) <= MAX_QUERIES_PER_READ
+
+
+def test_write_query_count(client: TestClient, query_counter: list[str]):
+    # tag/untag/edit: lookups + the write + the version bump + the eager reload, independent of the number of tags
+    task_ids, tag_ids = _create_tagged_tasks(client, n_tasks=1, n_tags=10)
+    new_tag_id = client.post("/tags/", json={"tag": "extra"}).json()["id"]
+
+    query_counter.clear()
+    response = client.patch(f"/tasks/{task_ids[0]}/tag", params={"tag_id": new_tag_id})
+    assert len(response.json()["tags"]) == 11
+    assert len(query_counter) <= 9
+
+    query_counter.clear()
+    response = client.patch(
+        f"/tasks/{task_ids[0]}/untag", params={"tag_id": new_tag_id}
+    )
+    assert len(response.json()["tags"]) == 10
+    assert len(query_counter) <= 9
+
+    query_counter.clear()
+    response = client.patch(f"/tasks/{task_ids[0]}/edit", json={"is_done": True})
+    assert response.json()["is_done"] is True
+    assert len(query_counter) <= 7
+
+    query_counter.clear()
+    response = client.patch(f"/tags/{tag_ids[0]}/edit", json={"tag": "renamed"})
+    assert response.json()["tag"] == "renamed"
+    assert len(query_counter) <= 7
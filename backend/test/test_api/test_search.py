@@ -0,0 +1,140 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.db.search import create_search_index, drop_search_index
+from app.services.pagination import NEXT_CURSOR_HEADER
+from app.services.task_service import get_search_statement
+
+
+def _search(client: TestClient, q: str, **params) -> list[str]:
+    response = client.get("/tasks/search", params={"q": q, **params})
+    assert response.status_code == 200
+    return [task["title"] for task in response.json()]
+
+
+def test_search_tasks(client: TestClient):
+    client.post("/tasks/", json={"title": "Bake bread", "description": "bread, bread"})
+    client.post("/tasks/", json={"title": "Buy milk", "description": "and some bread"})
+    client.post("/tasks/", json={"title": "Call the bank"})
+    # Words in any order, in the title or the description, case and accent insensitive
+    assert _search(client, "MILK buy") == ["Buy milk"]
+    # Best match first, or newest first
+    assert _search(client, "bread") == ["Bake bread", "Buy milk"]
+    assert _search(client, "bread", order="newest") == ["Buy milk", "Bake bread"]
+    assert _search(client, "bänk") == ["Call the bank"]
+    assert _search(client, "milk bank") == []
+    # The FTS5 syntax of the query is not interpreted
+    assert _search(client, 'milk" OR title:*') == []
+    assert _search(client, "?!") == []
+    assert client.get("/tasks/search", params={"q": ""}).status_code == 422
+
+
+def test_search_index_follows_the_writes(client: TestClient):
+    task_id = client.post("/tasks/", json={"title": "Buy milk"}).json()["id"]
+    client.patch(f"/tasks/{task_id}/edit", json={"title": "Buy oat milk"})
+    assert _search(client, "oat") == ["Buy oat milk"]
+    client.delete(f"/tasks/{task_id}")
+    assert _search(client, "milk") == []
+
+    ids = client.post(
+        "/tasks/bulk", json=[{"title": "Pay rent"}, {"title": "Pay bills"}]
+    ).json()["ids"]
+    # Equal ranks, by id
+    assert _search(client, "pay") == ["Pay rent", "Pay bills"]
+    client.patch("/tasks/bulk", json=[{"id": ids[0], "description": "to the landlord"}])
+    assert _search(client, "landlord") == ["Pay rent"]
+    client.request("DELETE", "/tasks/bulk", json={"ids": ids})
+    assert _search(client, "pay") == []
+
+
+def test_search_cursor(client: TestClient):
+    client.post(
+        "/tasks/bulk",
+        json=[{"title": "Task " + "task " * (i % 3) + str(i)} for i in range(5)],
+    )
+    first = client.get("/tasks/search", params={"q": "task", "limit": 3})
+    cursor = first.headers[NEXT_CURSOR_HEADER]
+    second = client.get(
+        "/tasks/search", params={"q": "task", "limit": 3, "after": cursor}
+    )
+    assert NEXT_CURSOR_HEADER not in second.headers
+    # By rank, the ties by id
+    assert [t["title"] for t in first.json()] == [
+        "Task task task 2",
+        "Task task 1",
+        "Task task 4",
+    ]
+    assert [t["title"] for t in second.json()] == ["Task 0", "Task 3"]
+    # The cursor belongs to its sort order
+    response = client.get(
+        "/tasks/search",
+        params={"q": "task", "limit": 3, "after": cursor, "order": "newest"},
+    )
+    assert response.status_code == 400
+
+
+def test_search_cursor_newest(client: TestClient):
+    client.post("/tasks/bulk", json=[{"title": f"Task {i}"} for i in range(5)])
+    params = {"q": "task", "limit": 3, "order": "newest"}
+    first = client.get("/tasks/search", params=params)
+    cursor = first.headers[NEXT_CURSOR_HEADER]
+    # A write between the pages shifts no cursor: the pages are walked by id, newest first
+    client.post("/tasks/", json={"title": "Task task task"})
+    second = client.get("/tasks/search", params={**params, "after": cursor})
+    assert NEXT_CURSOR_HEADER not in second.headers
+    assert [t["title"] for t in first.json()] == ["Task 4", "Task 3", "Task 2"]
+    assert [t["title"] for t in second.json()] == ["Task 1", "Task 0"]
+
+
+def _postgres_sql(statement) -> str:
+    return str(statement.compile(dialect=postgresql.dialect()))
+
+
+def test_search_statement_postgres():
+    # The expression of the GIN index
+    match = (
+        "to_tsvector('simple', coalesce(title, '') || ' ' || coalesce(description, ''))"
+        " @@ plainto_tsquery('simple', %(plainto_tsquery_"
+    )
+    sql = _postgres_sql(
+        get_search_statement("buy milk", limit=20, after=[-0.5, 42], postgres=True)
+    )
+    assert match in sql
+    # Keyset on (rank, id)
+    assert "-ts_rank(" in sql
+    assert ") > %(param_1)s OR -ts_rank(" in sql
+    assert "AND task.id > %(id_1)s" in sql
+
+    sql = _postgres_sql(
+        get_search_statement(
+            "buy milk", limit=20, after=[42], order="newest", postgres=True
+        )
+    )
+    assert match in sql
+    # Keyset on the id, nothing scored
+    assert "AND task.id < %(id_1)s ORDER BY task.id DESC" in sql
+    assert "rank" not in sql
+
+
+def test_search_index_backfill_and_plan(client: TestClient, engine: AsyncEngine):
+    # Tasks written before the index existed are indexed when it is created
+    client.post("/tasks/", json={"title": "Old task"})
+
+    async def recreate_index():
+        async with engine.begin() as conn:
+            await conn.run_sync(drop_search_index)
+            await conn.run_sync(create_search_index)
+            sql = get_search_statement("old", limit=20, order="newest").compile(
+                dialect=conn.dialect, compile_kwargs={"literal_binds": True}
+            )
+            plan = await conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}")
+            return " ".join(str(row[-1]) for row in plan)
+
+    plan = asyncio.run(recreate_index())
+    assert "VIRTUAL TABLE INDEX" in plan
+    # Newest first, the matches come out of the FTS5 index in rowid order: no sort of every match
+    assert plan.count("TEMP B-TREE") <= 1, plan
+    assert _search(client, "old") == ["Old task"]
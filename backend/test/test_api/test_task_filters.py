@@ -0,0 +1,166 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.schema import CreateIndex
+
+from app.schemas.task_tag import Task, TaskFilter
+from app.services.pagination import NEXT_CURSOR_HEADER
+from app.services.task_service import get_task_page_statement
+
+
+def _titles(client: TestClient, **params) -> list[str]:
+    response = client.get("/tasks/task_page", params=params)
+    assert response.status_code == 200
+    return [task["title"] for task in response.json()]
+
+
+def test_task_page_filters(client: TestClient):
+    ids = client.post(
+        "/tasks/bulk",
+        json=[
+            {"title": "a", "is_done": True, "scheduled_for": "2025-01-01T10:00:00"},
+            {"title": "b", "scheduled_for": "2025-01-02T10:00:00"},
+            {"title": "c", "scheduled_for": "2025-01-03T10:00:00"},
+            {"title": "d"},
+        ],
+    ).json()["ids"]
+    work = client.post("/tags/", json={"tag": "Work"}).json()["id"]
+    home = client.post("/tags/", json={"tag": "Home"}).json()["id"]
+    client.patch(
+        "/tasks/bulk/tag",
+        json={
+            "pairs": [
+                {"task_id": ids[0], "tag_id": work},
+                {"task_id": ids[1], "tag_id": home},
+                {"task_id": ids[1], "tag_id": work},
+            ]
+        },
+    )
+    assert _titles(client, is_done=True) == ["a"]
+    assert _titles(client, is_done=False) == ["b", "c", "d"]
+    assert _titles(
+        client, scheduled_from="2025-01-02T00:00:00", scheduled_to="2025-01-03T10:00:00"
+    ) == ["b"]
+    assert _titles(client, has_tags=True) == ["a", "b"]
+    assert _titles(client, has_tags=False) == ["c", "d"]
+    assert _titles(client, tag_ids=[home]) == ["b"]
+    assert _titles(client, tag_ids=[home, work]) == ["a", "b"]
+    assert _titles(client, tag_ids=[work], is_done=False) == ["b"]
+    created_at = client.get(f"/tasks/{ids[0]}").json()["created_at"]
+    assert _titles(client, created_to=created_at) == []
+    assert len(_titles(client, created_from=created_at)) == 4
+
+
+def test_task_page_descending_cursor(client: TestClient):
+    client.post(
+        "/tasks/bulk",
+        json=[
+            {"title": "a", "scheduled_for": "2025-01-01T10:00:00"},
+            {"title": "b"},
+            {"title": "c", "scheduled_for": "2025-01-03T10:00:00"},
+            {"title": "d", "scheduled_for": "2025-01-01T10:00:00"},
+            {"title": "e"},
+        ],
+    )
+    assert _titles(client, order_by="-id") == ["e", "d", "c", "b", "a"]
+    # Walk the pages in the descending order, NULLs last
+    titles, params = [], {"order_by": "-scheduled_for", "limit": 2}
+    while True:
+        response = client.get("/tasks/task_page", params=params)
+        titles += [task["title"] for task in response.json()]
+        if NEXT_CURSOR_HEADER not in response.headers:
+            break
+        params["after"] = response.headers[NEXT_CURSOR_HEADER]
+    assert titles == ["c", "d", "a", "e", "b"]
+
+
+# filters and order of the page -> the plan must read the tasks through an index
+INDEXED_PAGES = {
+    "is_done": ({"is_done": True}, "id"),
+    "is_done + scheduled_for": (
+        {
+            "is_done": False,
+            "scheduled_from": "2025-01-01",
+            "scheduled_to": "2025-02-01",
+        },
+        "scheduled_for",
+    ),
+    "scheduled_for range": (
+        {"scheduled_from": "2025-01-01", "scheduled_to": "2025-02-01"},
+        "id",
+    ),
+    "created_at range": (
+        {"created_from": "2025-01-01", "created_to": "2025-02-01"},
+        "-created_at",
+    ),
+    "tag_ids": ({"tag_ids": [1, 2]}, "id"),
+    "-scheduled_for": ({}, "-scheduled_for"),
+    "created_at": ({}, "created_at"),
+}
+
+
+def _explain(engine: AsyncEngine, filters: dict, order_by: str) -> str:
+    statement = get_task_page_statement(
+        offset=0, limit=20, order_by=order_by, filters=TaskFilter(**filters)
+    )
+    sql = statement.compile(
+        dialect=engine.dialect, compile_kwargs={"literal_binds": True}
+    )
+
+    async def explain():
+        async with engine.connect() as conn:
+            plan = await conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}")
+            return "; ".join(row[-1] for row in plan)
+
+    return asyncio.run(explain())
+
+
+@pytest.mark.parametrize("name", INDEXED_PAGES)
+def test_task_page_filters_use_indexes(engine: AsyncEngine, name: str):
+    plan = _explain(engine, *INDEXED_PAGES[name])
+    assert "USING INDEX" in plan or "USING INTEGER PRIMARY KEY" in plan, plan
+    assert not any(step == "SCAN task" for step in plan.split("; ")), plan
+
+
+def test_task_page_has_tags_uses_link_index(engine: AsyncEngine):
+    # The tasks are read in id order, and each one is checked with a lookup in the link primary key
+    for has_tags in (True, False):
+        plan = _explain(engine, {"has_tags": has_tags}, "id")
+        assert "SEARCH tasktaglink USING COVERING INDEX" in plan, plan
+        assert "TEMP B-TREE" not in plan
+
+
+def test_task_page_order_matches_the_postgres_indexes(engine: AsyncEngine):
+    def order(order_by: str) -> str:
+        sql = str(
+            get_task_page_statement(offset=0, limit=20, order_by=order_by).compile(
+                dialect=postgresql.dialect()
+            )
+        )
+        return sql.split("ORDER BY ")[1].split("\n")[0].strip()
+
+    # NULLs placed only on the nullable column, where a NULLS FIRST index serves both directions
+    assert order("-created_at") == "task.created_at DESC, task.id DESC"
+    assert order("scheduled_for") == "task.scheduled_for ASC NULLS FIRST, task.id ASC"
+    assert order("-scheduled_for") == "task.scheduled_for DESC NULLS LAST, task.id DESC"
+    indexes = {
+        str(CreateIndex(index).compile(dialect=postgresql.dialect()))
+        for index in Task.__table__.indexes
+    }
+    assert (
+        "CREATE INDEX ix_task_is_done_scheduled_for_nulls_first ON task "
+        "(is_done, scheduled_for ASC NULLS FIRST, id)" in indexes
+    )
+
+    # Postgres only: SQLite sorts the NULLs first already, and has no NULLS FIRST in its indexes
+    async def index_names():
+        async with engine.connect() as conn:
+            rows = await conn.exec_driver_sql(
+                "SELECT name FROM sqlite_master WHERE type = 'index'"
+            )
+            return {row[0] for row in rows}
+
+    assert not any("nulls_first" in name for name in asyncio.run(index_names()))
@@ -1,7 +1,9 @@
+import pytest
 from fastapi.testclient import TestClient
 from datetime import datetime, timedelta
 
 from app.schemas.task_tag import TaskCreate
+from app.services.pagination import encode_cursor
 
 
 def test_create_task(client: TestClient):
@@ -105,6 +107,96 @@ def test_tag_and_untag_task(client: TestClient):
     assert all(t["id"] != task_id for t in tag_get_resp.json()["tasks"])
 
 
+def test_task_page_cursor(client: TestClient):
+    # Walk all the tasks with the keyset cursor, in id order
+    ids = [
+        client.post("/tasks/", json={"title": f"p{i}"}).json()["id"] for i in range(5)
+    ]
+    seen, after = [], None
+    while True:
+        params = {"limit": 2} | ({"after": after} if after else {})
+        response = client.get("/tasks/task_page", params=params)
+        assert response.status_code == 200
+        seen.extend(t["id"] for t in response.json())
+        after = response.headers.get("X-Next-Cursor")
+        if after is None:
+            break
+    assert seen == ids
+
+
+def test_task_page_cursor_scheduled_for(client: TestClient):
+    # (scheduled_for, id) order, with NULLs first and ties broken by id
+    now = datetime.now()
+    schedules = [
+        now + timedelta(days=2),
+        None,
+        now + timedelta(days=1),
+        None,
+        now + timedelta(days=1),
+    ]
+    ids = [
+        client.post(
+            "/tasks/",
+            json={"title": f"s{i}", "scheduled_for": s.isoformat() if s else None},
+        ).json()["id"]
+        for i, s in enumerate(schedules)
+    ]
+    expected = [ids[1], ids[3], ids[2], ids[4], ids[0]]
+    seen, after = [], None
+    while True:
+        params = {"limit": 2, "order_by": "scheduled_for"} | (
+            {"after": after} if after else {}
+        )
+        response = client.get("/tasks/task_page", params=params)
+        seen.extend(t["id"] for t in response.json())
+        after = response.headers.get("X-Next-Cursor")
+        if after is None:
+            break
+    assert seen == expected
+
+
+def test_task_page_invalid_cursor(client: TestClient):
+    response = client.get("/tasks/task_page", params={"after": "not-a-cursor"})
+    assert response.status_code == 400
+    # A cursor issued for another sort key is rejected as well
+    client.post("/tasks/", json={"title": "c"})
+    cursor = client.get("/tasks/task_page", params={"limit": 1}).headers[
+        "X-Next-Cursor"
+    ]
+    response = client.get(
+        "/tasks/task_page", params={"after": cursor, "order_by": "scheduled_for"}
+    )
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize(
+    "path, order_by, values",
+    [
+        # Not a datetime, wrong number of values, not a scalar
+        ("/tasks/task_page", "scheduled_for", ["garbage", 1]),
+        ("/tasks/task_page", "scheduled_for", [12, 1]),
+        ("/tasks/task_page", "scheduled_for", []),
+        ("/tasks/task_page", "scheduled_for", [None, None]),
+        ("/tasks/task_page", "id", [{"x": 1}]),
+        ("/tasks/task_page", "id", ["1"]),
+        ("/tasks/task_page", "id", [True]),
+        ("/tasks/task_page", "-created_at", ["2025-01-01T00:00:00", 1, 2]),
+        ("/tags/tag_page", "id", [[1]]),
+        ("/tasks/search", "search", ["best", 1]),
+    ],
+)
+def test_crafted_cursor(client: TestClient, path: str, order_by: str, values: list):
+    client.post("/tasks/", json={"title": "task"})
+    params = {"after": encode_cursor(order_by, values)}
+    if path == "/tasks/search":
+        params["q"] = "task"
+    elif path == "/tasks/task_page":
+        params["order_by"] = order_by
+    response = client.get(path, params=params)
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
+
+
 # -----------------------------------------------------------------
 
 
@@ -163,3 +255,14 @@ def test_delete_tag(client: TestClient):
     # Confirm deletion
     response = client.get(f"/tags/{tag_id}")
     assert response.status_code == 404
+
+
+def test_tag_page_cursor(client: TestClient):
+    ids = [client.post("/tags/", json={"tag": f"t{i}"}).json()["id"] for i in range(3)]
+    first = client.get("/tags/tag_page", params={"limit": 2})
+    assert [t["id"] for t in first.json()] == ids[:2]
+    second = client.get(
+        "/tags/tag_page", params={"limit": 2, "after": first.headers["X-Next-Cursor"]}
+    )
+    assert [t["id"] for t in second.json()] == ids[2:]
+    assert "X-Next-Cursor" not in second.headers
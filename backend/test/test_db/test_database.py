@@ -0,0 +1,81 @@
+import asyncio
+
+from app.config.config import settings
+from app.db.database import (
+    create_db_and_tables,
+    create_engine,
+    get_async_url,
+    get_engine_options,
+)
+
+
+def test_async_url():
+    assert get_async_url("sqlite:///data/todo.db") == "sqlite+aiosqlite:///data/todo.db"
+    assert (
+        get_async_url("postgresql://user:pw@db:5432/todo")
+        == "postgresql+asyncpg://user:pw@db:5432/todo"
+    )
+    # An explicit driver is kept as it is
+    assert (
+        get_async_url("sqlite+aiosqlite:///data/todo.db")
+        == "sqlite+aiosqlite:///data/todo.db"
+    )
+
+
+def test_engine_pool_options():
+    options = get_engine_options("sqlite+aiosqlite:///data/todo.db")
+    assert options["pool_size"] == settings.DB_POOL_SIZE
+    assert options["max_overflow"] == settings.DB_MAX_OVERFLOW
+    assert options["pool_pre_ping"] == settings.DB_POOL_PRE_PING
+    assert options["pool_recycle"] == settings.DB_POOL_RECYCLE
+    # In-memory SQLite has no pool to size
+    assert "pool_size" not in get_engine_options("sqlite+aiosqlite://")
+
+
+def test_sqlite_pragmas(tmp_path):
+    # Every new connection of the app engine gets the SQLite profile
+    async def read_pragmas():
+        engine = create_engine(f"sqlite:///{tmp_path / 'todo.db'}")
+        async with engine.connect() as conn:
+            pragmas = {
+                name: (await conn.exec_driver_sql(f"PRAGMA {name}")).scalar()
+                for name in [
+                    "journal_mode",
+                    "synchronous",
+                    "busy_timeout",
+                    "foreign_keys",
+                ]
+            }
+        await engine.dispose()
+        return pragmas
+
+    # synchronous: 1 is NORMAL
+    assert asyncio.run(read_pragmas()) == {
+        "journal_mode": "wal",
+        "synchronous": 1,
+        "busy_timeout": settings.SQLITE_BUSY_TIMEOUT,
+        "foreign_keys": 1,
+    }
+
+
+def test_add_missing_columns(tmp_path):
+    # A DB created before the updated_at columns: they are added and filled on startup
+    async def migrate():
+        engine = create_engine(f"sqlite:///{tmp_path / 'todo.db'}")
+        async with engine.begin() as conn:
+            await conn.exec_driver_sql(
+                "CREATE TABLE tag (id INTEGER PRIMARY KEY, tag VARCHAR NOT NULL)"
+            )
+            await conn.exec_driver_sql("INSERT INTO tag (tag) VALUES ('old')")
+        await create_db_and_tables(engine)
+        async with engine.connect() as conn:
+            updated_at = (
+                await conn.exec_driver_sql("SELECT updated_at FROM tag")
+            ).scalar()
+            indexes = (await conn.exec_driver_sql("PRAGMA index_list(tag)")).all()
+        await engine.dispose()
+        return updated_at, {index[1] for index in indexes}
+
+    updated_at, indexes = asyncio.run(migrate())
+    assert updated_at is not None
+    assert "ix_tag_updated_at" in indexes
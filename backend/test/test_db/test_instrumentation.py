@@ -0,0 +1,40 @@
+import logging
+import re
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+from app.config.config import settings
+from app.db.database import get_engine_options
+from app.db.instrumentation import db_query_stats
+
+
+def test_no_echo_by_default():
+    assert get_engine_options("sqlite+aiosqlite:///data/todo.db")["echo"] is False
+
+
+def test_request_query_stats(client: TestClient, query_counter: list[str]):
+    client.post("/tasks/", json={"title": "t"})
+    total_before = db_query_stats.count
+    query_counter.clear()
+    response = client.get("/tasks/task_page")
+    # The Server-Timing header reports the statements of this request only
+    match = re.fullmatch(
+        r'db;dur=([\d.]+);desc="(\d+) queries"', response.headers["Server-Timing"]
+    )
+    assert match is not None
+    assert int(match.group(2)) == len(query_counter) > 0
+    assert db_query_stats.count - total_before == len(query_counter)
+    assert client.get("/health").headers["Server-Timing"].endswith('"0 queries"')
+
+
+def test_slow_query_log(client: TestClient, caplog):
+    with (
+        patch.object(settings, "DB_SLOW_QUERY_MS", 0),
+        caplog.at_level(logging.WARNING, logger="app.db.instrumentation"),
+    ):
+        client.get("/tasks/task_page")
+    slow = [r for r in caplog.records if r.name == "app.db.instrumentation"]
+    assert slow
+    assert slow[0].statement.startswith("SELECT")
+    assert slow[0].duration_ms >= 0
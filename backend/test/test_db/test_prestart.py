@@ -0,0 +1,72 @@
+import asyncio
+import os
+import runpy
+import sys
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from app.config.config import settings
+from app.prestart import prestart
+from main import app, lifespan
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+
+
+def test_prestart_creates_the_schema_once():
+    create = AsyncMock()
+    engine = MagicMock(dispose=AsyncMock())
+    with (
+        patch.object(settings, "DB_CREATE_ON_STARTUP", True),
+        patch.object(settings, "LLM_PROVIDER", "fake"),
+        patch.object(settings, "LLM_FALLBACK_PROVIDER", "none"),
+        patch("app.prestart.create_db_and_tables", create),
+        patch("app.prestart.engine", engine),
+        patch.dict(sys.modules),
+    ):
+        sys.modules.pop("app.services.fake_llm", None)
+        timings = prestart()
+        assert set(timings) == {"schema", "provider_sdks", "tokenizer", "models"}
+        # No connection left open for the forked workers, which skip the schema
+        engine.dispose.assert_awaited_once()
+        assert not settings.DB_CREATE_ON_STARTUP
+        # The SDK of the configured provider is imported
+        assert "app.services.fake_llm" in sys.modules
+
+        assert "schema" not in prestart()
+    create.assert_awaited_once()
+
+
+def test_lifespan_skips_the_schema_after_prestart():
+    create = AsyncMock()
+
+    async def run():
+        async with lifespan(app):
+            pass
+
+    with (
+        patch.object(settings, "LLM_WARMUP", False),
+        patch("main.create_db_and_tables", create),
+        patch("main.load_tokenizer", AsyncMock()) as load_tokenizer,
+        patch("main.ai_job_worker", MagicMock(stop=AsyncMock())),
+        patch("main.engine", MagicMock(dispose=AsyncMock())),
+    ):
+        with patch.object(settings, "DB_CREATE_ON_STARTUP", False):
+            asyncio.run(run())
+        create.assert_not_awaited()
+        with patch.object(settings, "DB_CREATE_ON_STARTUP", True):
+            asyncio.run(run())
+        create.assert_awaited_once()
+        # Loaded even without the warmup: no prompt loads it on the event loop
+        load_tokenizer.assert_awaited()
+
+
+def test_gunicorn_config():
+    with (
+        patch.object(settings, "SERVER_WORKERS", 0),
+        patch.object(settings, "SERVER_PRELOAD", True),
+    ):
+        config = runpy.run_path(os.path.join(BACKEND_DIR, "gunicorn.conf.py"))
+    assert config["workers"] == os.cpu_count()
+    assert config["preload_app"]
+    assert config["worker_class"] == "uvicorn_worker.UvicornWorker"
+    # A batch prompt may take AI_BATCH_TIMEOUT seconds: its worker must not be killed before
+    assert config["timeout"] > settings.AI_BATCH_TIMEOUT
@@ -0,0 +1,143 @@
+import asyncio
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.config.config import settings
+from app.services.ai_service import (
+    BatchSmartTagResult,
+    SmartTagResult,
+    build_batch_prompt,
+    clear_llm_clients,
+    get_llm,
+    get_llm_provider,
+)
+from app.services.fake_llm import FakeChatModel, FakeLLMError, _parse_tags
+from app.services.prompts import format_tags
+from app.schemas.task_tag import Tag, Task
+
+
+@pytest.fixture(name="fake_provider")
+def fake_provider_fixture():
+    clear_llm_clients()
+    with (
+        patch.object(settings, "LLM_PROVIDER", "fake"),
+        patch.object(settings, "FAKE_LLM_LATENCY", 0.0),
+        patch.object(settings, "FAKE_LLM_ERROR_RATE", 0.0),
+    ):
+        yield
+    clear_llm_clients()
+
+
+SINGLE_PROMPT = """
+    - Available tag list: [Work, Gym, University]
+    - Response: {"tag_name": "Work", "is_new": false}
+
+    # Your turn:
+        - Input task:
+            - Title: Pay the rent
+            - Description: before Friday
+            - Currently assigned tags: ["Home"]
+
+        - Available tag list: ["Finance","Errands"]
+"""
+
+
+def test_fake_provider_selected_by_settings(fake_provider):
+    assert get_llm_provider() == ("fake", "fake", "")
+    assert isinstance(get_llm(), FakeChatModel)
+    with (
+        patch.object(settings, "LLM_PROVIDER", "openai"),
+        patch.object(settings, "OPENAI_API_KEY", ""),
+        patch.object(settings, "GEMINI_API_KEY", "gemini-key"),
+        pytest.raises(ValueError),
+    ):
+        get_llm_provider()
+
+
+def test_fake_answers_are_deterministic(fake_provider):
+    llm = FakeChatModel(SmartTagResult, seed=1)
+    answers = [asyncio.run(llm.ainvoke(SINGLE_PROMPT)) for _ in range(5)]
+    answer = answers[0]
+    assert all(other == answer for other in answers)
+    # Picked among the tags offered for the task (not those of the examples), or a new one
+    if answer.is_new:
+        assert answer.tag_name != "Home"
+    else:
+        assert answer.tag_name in ("Finance", "Errands")
+
+
+def test_fake_batch_answers_every_task(fake_provider):
+    tasks = [
+        Task(id=i, title=f"Task {i}", description="desc", tags=[Tag(tag="Home")])
+        for i in range(1, 6)
+    ]
+    prompt = build_batch_prompt(tasks, ["Work", "Sport"]).text
+    result = asyncio.run(FakeChatModel(BatchSmartTagResult, seed=1).ainvoke(prompt))
+    assert [item.task_id for item in result.results] == [1, 2, 3, 4, 5]
+    for item in result.results:
+        assert item.tag_name != "Home"
+        assert item.is_new or item.tag_name in ("Work", "Sport")
+    # A task gets the same tag whatever the other tasks of the batch
+    alone = asyncio.run(
+        FakeChatModel(BatchSmartTagResult, seed=1).ainvoke(
+            build_batch_prompt(tasks[2:3], ["Work", "Sport"]).text
+        )
+    )
+    assert alone.results == result.results[2:3]
+
+
+def test_fake_reads_the_prompt_tag_lists():
+    tags = ['Say "hi"', "a, b]", "Café"]
+    assert _parse_tags(format_tags(tags)) == tags
+    assert _parse_tags("[Work, Gym]") == []
+    assert _parse_tags(None) == []
+
+
+def test_fake_never_picks_a_current_tag(fake_provider):
+    # The batch offers the union of the candidates of its tasks, the tags of a task among them
+    tasks = [
+        Task(id=i, title=f"Task {i}", tags=[Tag(tag="Home" if i % 2 else "Work")])
+        for i in range(1, 41)
+    ]
+    prompt = build_batch_prompt(tasks, ["Work", "home"]).text
+    result = asyncio.run(FakeChatModel(BatchSmartTagResult, seed=1).ainvoke(prompt))
+    for task, item in zip(tasks, result.results):
+        assert item.tag_name.casefold() != task.tags[0].tag.casefold()
+    assert {item.tag_name for item in result.results} & {"Work", "home"}
+
+
+def test_fake_latency_and_errors(fake_provider):
+    with (
+        patch.object(settings, "FAKE_LLM_LATENCY", 0.2),
+        patch.object(settings, "FAKE_LLM_LATENCY_SIGMA", 0.5),
+    ):
+        latencies = [FakeChatModel(SmartTagResult, seed=7).latency() for _ in range(3)]
+        assert latencies[0] == latencies[1] == latencies[2]  # seeded
+        many = sorted(
+            FakeChatModel(SmartTagResult, seed=seed).latency() for seed in range(200)
+        )
+        assert 0.15 < many[100] < 0.25  # the median
+        assert many[-1] > 0.4  # with a tail
+
+    with patch.object(settings, "FAKE_LLM_ERROR_RATE", 1.0):
+        with pytest.raises(FakeLLMError):
+            asyncio.run(FakeChatModel(SmartTagResult, seed=1).ainvoke(SINGLE_PROMPT))
+
+
+def test_smart_tag_endpoints_with_fake_provider(client: TestClient, fake_provider):
+    task_ids = [
+        client.post("/tasks/", json={"title": f"Offline task {i}"}).json()["id"]
+        for i in range(3)
+    ]
+    response = client.post(f"/ai/{task_ids[0]}")
+    assert response.status_code == 200
+    assert len(response.json()["tags"]) == 1
+
+    response = client.post("/ai/batch", json={"untagged": True})
+    assert response.status_code == 200
+    assert sorted(item["task_id"] for item in response.json()["tagged"]) == task_ids[1:]
+
+    with patch.object(settings, "FAKE_LLM_ERROR_RATE", 1.0):
+        assert client.post(f"/ai/{task_ids[0]}").status_code == 503
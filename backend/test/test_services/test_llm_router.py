@@ -0,0 +1,189 @@
+import asyncio
+from unittest.mock import patch
+
+import pytest
+
+from app.config.config import settings
+from app.services.ai_service import SmartTagResult, call_llm, get_llm_providers
+from app.services.llm_router import (
+    LLMRouter,
+    LLMUnavailableError,
+    llm_hedged_calls_total,
+    llm_router,
+)
+
+
+class Provider:
+    # A provider call answering after `delay` seconds, or failing
+    def __init__(self, name: str, delay: float = 0.0, fails: bool = False):
+        self.name = name
+        self.delay = delay
+        self.fails = fails
+        self.calls = 0
+        self.cancelled = 0
+
+    async def __call__(self):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.fails:
+            raise RuntimeError(f"{self.name} is down")
+        return self.name
+
+
+def _call(router: LLMRouter, *providers: Provider):
+    return asyncio.run(router.call([(p.name, p) for p in providers]))
+
+
+@pytest.fixture(autouse=True)
+def router_settings():
+    with (
+        patch.object(settings, "LLM_HEDGE_ENABLED", True),
+        patch.object(settings, "LLM_HEDGE_DEFAULT_DELAY", 0.05),
+        patch.object(settings, "LLM_HEDGE_MIN_DELAY", 0.0),
+        patch.object(settings, "LLM_HEDGE_MIN_SAMPLES", 5),
+        patch.object(settings, "LLM_BREAKER_FAILURES", 3),
+        patch.object(settings, "LLM_BREAKER_COOLDOWN", 60.0),
+    ):
+        yield
+
+
+def test_fast_primary_is_not_hedged():
+    primary, fallback = Provider("primary"), Provider("fallback")
+    assert _call(LLMRouter(), primary, fallback) == ("primary", "primary")
+    assert fallback.calls == 0
+
+
+def test_slow_primary_is_hedged():
+    primary, fallback = Provider("primary", delay=1.0), Provider("fallback")
+    hedged = llm_hedged_calls_total.get("fallback")
+    assert _call(LLMRouter(), primary, fallback) == ("fallback", "fallback")
+    # The loser is cancelled, the hedge is counted
+    assert primary.cancelled == 1
+    assert llm_hedged_calls_total.get("fallback") == hedged + 1
+
+
+def test_hedge_delay_follows_the_latency_quantile():
+    router = LLMRouter()
+    assert router.hedge_delay("primary") == settings.LLM_HEDGE_DEFAULT_DELAY
+    stats = router.get_stats("primary")
+    for latency in [0.1] * 19 + [2.0]:
+        stats.record_success(latency)
+    with patch.object(settings, "LLM_HEDGE_QUANTILE", 0.95):
+        assert router.hedge_delay("primary") == 0.1
+    with patch.object(settings, "LLM_HEDGE_MIN_DELAY", 0.5):
+        assert router.hedge_delay("primary") == 0.5
+
+
+def test_failed_primary_falls_back_right_away():
+    primary, fallback = Provider("primary", fails=True), Provider("fallback")
+    with patch.object(settings, "LLM_HEDGE_DEFAULT_DELAY", 10.0):
+        assert _call(LLMRouter(), primary, fallback) == ("fallback", "fallback")
+    with pytest.raises(RuntimeError, match="primary is down"):
+        _call(LLMRouter(), primary)
+
+
+def test_circuit_breaker():
+    router = LLMRouter()
+    primary, fallback = Provider("primary", fails=True), Provider("fallback")
+    for _ in range(settings.LLM_BREAKER_FAILURES):
+        _call(router, primary, fallback)
+    assert router.get_stats("primary").is_open
+    assert router.get_stats("primary").error_rate == 1.0
+
+    # Skipped while open
+    _call(router, primary, fallback)
+    assert primary.calls == settings.LLM_BREAKER_FAILURES
+    with pytest.raises(LLMUnavailableError):
+        _call(router, primary)
+
+    # After the cooldown, one trial call: a success closes the circuit
+    primary.fails = False
+    with patch.object(settings, "LLM_BREAKER_COOLDOWN", 0.0):
+        assert _call(router, primary, fallback) == ("primary", "primary")
+    assert not router.get_stats("primary").is_open
+
+
+def test_failed_trial_opens_the_circuit_again():
+    router = LLMRouter()
+    primary = Provider("primary", fails=True)
+    for _ in range(settings.LLM_BREAKER_FAILURES):
+        with pytest.raises(RuntimeError):
+            _call(router, primary)
+    with patch.object(settings, "LLM_BREAKER_COOLDOWN", 0.0):
+        with pytest.raises(RuntimeError):
+            _call(router, primary)
+    assert primary.calls == settings.LLM_BREAKER_FAILURES + 1
+    with pytest.raises(LLMUnavailableError):
+        _call(router, primary)
+
+
+def test_caller_timeout_cancels_the_calls():
+    router = LLMRouter()
+    primary, fallback = Provider("primary", delay=1.0), Provider("fallback", delay=1.0)
+
+    async def main():
+        await asyncio.wait_for(
+            router.call([(p.name, p) for p in (primary, fallback)]), timeout=0.2
+        )
+
+    with pytest.raises(TimeoutError):
+        asyncio.run(main())
+    assert primary.cancelled == fallback.cancelled == 1
+    assert router.get_stats("primary").outcomes.count(False) == 1
+    assert router.get_stats("fallback").outcomes.count(False) == 1
+
+
+def test_fallback_provider_from_the_settings():
+    with (
+        patch.object(settings, "LLM_PROVIDER", "auto"),
+        patch.object(settings, "GEMINI_API_KEY", "gemini-key"),
+        patch.object(settings, "OPENAI_API_KEY", "openai-key"),
+    ):
+        with patch.object(settings, "LLM_FALLBACK_PROVIDER", "auto"):
+            assert [p[0] for p in get_llm_providers()] == ["gemini", "openai"]
+        with patch.object(settings, "LLM_FALLBACK_PROVIDER", "none"):
+            assert [p[0] for p in get_llm_providers()] == ["gemini"]
+        with patch.object(settings, "OPENAI_API_KEY", ""):
+            assert [p[0] for p in get_llm_providers()] == ["gemini"]
+    with (
+        patch.object(settings, "LLM_PROVIDER", "auto"),
+        patch.object(settings, "GEMINI_API_KEY", ""),
+        patch.object(settings, "OPENAI_API_KEY", ""),
+    ):
+        assert get_llm_providers() == []
+
+
+class FakeLLM:
+    def __init__(self, answer: SmartTagResult | None):
+        self.answer = answer
+
+    async def ainvoke(self, prompt: str):
+        if self.answer is None:
+            raise RuntimeError("provider error")
+        return self.answer
+
+
+def test_call_llm_falls_back_on_the_other_provider():
+    llms = {
+        "gemini": FakeLLM(None),
+        "openai": FakeLLM(SmartTagResult(tag_name="Work", is_new=False)),
+    }
+    llm_router.reset()
+    with (
+        patch.object(settings, "LLM_PROVIDER", "auto"),
+        patch.object(settings, "LLM_FALLBACK_PROVIDER", "auto"),
+        patch.object(settings, "GEMINI_API_KEY", "gemini-key"),
+        patch.object(settings, "OPENAI_API_KEY", "openai-key"),
+        patch(
+            "app.services.ai_service.get_llm",
+            side_effect=lambda schema, config: llms[config[0]],
+        ),
+    ):
+        result = asyncio.run(call_llm("prompt"))
+    assert result.tag_name == "Work"
+    assert llm_router.get_stats("gemini").outcomes.count(False) == 1
+    llm_router.reset()
@@ -0,0 +1,179 @@
+import asyncio
+import logging
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+
+from app.config.config import settings
+from app.schemas.task_tag import Tag, Task
+from app.services.prompts import (
+    BATCH_SMART_TAG_PREFIX,
+    SMART_TAG_PREFIX,
+    ApproxTokenizer,
+    build_batch_prompt,
+    build_smart_tag_prompt,
+    format_tags,
+    get_tokenizer,
+    llm_prompt_tokens,
+    llm_prompt_truncations_total,
+    load_tokenizer,
+    report,
+)
+
+
+@pytest.fixture(name="tokenizer")
+def tokenizer_fixture():
+    # The estimate, whether or not the tiktoken encoding can be downloaded here
+    with patch("app.services.prompts.get_tokenizer", return_value=ApproxTokenizer()):
+        yield
+
+
+def test_static_prefix_then_the_task(tokenizer):
+    tasks = [
+        Task(id=1, title="Pay {rent}", description="before {friday}"),
+        Task(id=2, title="Gym", description=None, tags=[Tag(tag="Sport")]),
+    ]
+    prompts = [
+        build_smart_tag_prompt(task, [t.tag for t in task.tags], ["Work", "Home"])
+        for task in tasks
+    ]
+    for prompt in prompts:
+        # Byte-identical prefix on every call, for the provider-side prompt cache
+        assert prompt.text.startswith(SMART_TAG_PREFIX)
+        assert not prompt.truncated
+    first = prompts[0].text[len(SMART_TAG_PREFIX) :]
+    # No escaping of the braces, compact tag lists
+    assert first == (
+        "Title: Pay {rent}\n"
+        "Description: before {friday}\n"
+        "Currently assigned tags: []\n"
+        'Available tag list: ["Work","Home"]\n'
+        "Response: "
+    )
+    assert 'Currently assigned tags: ["Sport"]' in prompts[1].text
+
+
+def test_format_tags():
+    assert format_tags(["Work", 'Say "hi"', "Café"]) == '["Work","Say \\"hi\\"","Café"]'
+    assert format_tags([]) == "[]"
+
+
+def test_description_cut_to_the_token_budget(tokenizer):
+    task = Task(id=1, title="Read", description="word " * 5000)
+    with patch.object(settings, "PROMPT_MAX_TOKENS", 600):
+        prompt = build_smart_tag_prompt(task, [], ["Work"])
+    assert prompt.truncated
+    assert prompt.tokens <= 600
+    assert ApproxTokenizer().count(prompt.text) <= 600
+    assert "Title: Read\nDescription: word word" in prompt.text
+    assert prompt.text.endswith('Available tag list: ["Work"]\nResponse: ')
+
+    # Nothing left for the task: it is cut entirely, the instructions stay
+    with patch.object(settings, "PROMPT_MAX_TOKENS", 10):
+        prompt = build_smart_tag_prompt(task, [], ["Work"])
+    assert "Title: \nDescription: \n" in prompt.text
+
+
+def test_batch_prompt(tokenizer):
+    tasks = [
+        Task(id=7, title="Call mom", description="x" * 4000, tags=[Tag(tag="Family")]),
+        Task(id=8, title="Run", description="5 km"),
+    ]
+    with patch.object(settings, "PROMPT_BATCH_TASK_TOKENS", 40):
+        prompt = build_batch_prompt(tasks, ["Sport"])
+    assert prompt.text.startswith(BATCH_SMART_TAG_PREFIX)
+    assert prompt.truncated
+    assert "    - Description: xxxx" in prompt.text
+    assert "x" * 100 not in prompt.text
+    assert "- task_id: 8\n    - Title: Run\n    - Description: 5 km\n" in prompt.text
+    assert '    - Currently assigned tags: ["Family"]' in prompt.text
+    assert '# Available tag list: ["Sport"]' in prompt.text
+
+
+def test_batch_prompt_title_and_tags_cut(tokenizer):
+    tag_names = [f"Tag{i}" for i in range(100)]
+    tasks = [
+        Task(
+            id=7,
+            title="word " * 1000,
+            description="x" * 4000,
+            tags=[Tag(tag=name) for name in tag_names],
+        ),
+        Task(id=8, title="Run", tags=[Tag(tag=name) for name in tag_names]),
+    ]
+    with patch.object(settings, "PROMPT_BATCH_TASK_TOKENS", 60):
+        prompt = build_batch_prompt(tasks, ["Sport"])
+    assert prompt.truncated
+    # Every task within its budget, whatever part of it is long
+    for part in prompt.text.split("# Tasks:\n")[1].split("\n- task_id"):
+        assert ApproxTokenizer().count(part) <= 60
+    # The title fills the budget, nothing left for the description and the tags
+    assert "    - Description: \n    - Currently assigned tags: []" in prompt.text
+    # The leading tags are kept
+    assert (
+        '    - Title: Run\n    - Description: \n    - Currently assigned tags: ["Tag0",'
+        in (prompt.text)
+    )
+    assert "Tag99" not in prompt.text
+
+
+def test_prompt_tokens_reported(tokenizer):
+    prompt = build_smart_tag_prompt(Task(id=1, title="Read"), [], [])
+    count = llm_prompt_tokens.count("single")
+    truncations = llm_prompt_truncations_total.get("single")
+    report(prompt, "single")
+    assert llm_prompt_tokens.count("single") == count + 1
+    assert llm_prompt_truncations_total.get("single") == truncations
+
+
+def test_tokenizer_falls_back_on_the_estimate():
+    get_tokenizer.cache_clear()
+    try:
+        with patch.object(settings, "PROMPT_TOKENIZER_ENCODING", "no-such-encoding"):
+            assert isinstance(get_tokenizer(), ApproxTokenizer)
+    finally:
+        get_tokenizer.cache_clear()
+
+
+def test_tokenizer_estimated_by_default(caplog):
+    # Nothing to download unless an encoding is configured, and the choice is logged
+    get_tokenizer.cache_clear()
+    try:
+        with (
+            patch("tiktoken.get_encoding") as get_encoding,
+            caplog.at_level(logging.INFO),
+        ):
+            assert isinstance(get_tokenizer(), ApproxTokenizer)
+        get_encoding.assert_not_called()
+        assert "Prompt tokens estimated" in caplog.text
+    finally:
+        get_tokenizer.cache_clear()
+
+
+def test_tokenizer_loaded_off_the_event_loop():
+    threads = []
+
+    def get_encoding(name):
+        threads.append(threading.current_thread())
+        time.sleep(0.05)  # the download
+        raise ValueError("offline")
+
+    async def load_concurrently():
+        await asyncio.gather(*[load_tokenizer() for _ in range(4)])
+
+    get_tokenizer.cache_clear()
+    try:
+        with (
+            patch.object(settings, "PROMPT_TOKENIZER_ENCODING", "o200k_base"),
+            patch("tiktoken.get_encoding", side_effect=get_encoding),
+        ):
+            asyncio.run(load_concurrently())
+            asyncio.run(load_tokenizer())
+        assert isinstance(get_tokenizer(), ApproxTokenizer)
+    finally:
+        get_tokenizer.cache_clear()
+    # Loaded once, in a worker thread, even when asked for concurrently
+    assert len(threads) == 1
+    assert threads[0] is not threading.main_thread()
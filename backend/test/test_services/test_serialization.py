@@ -0,0 +1,54 @@
+from datetime import datetime
+from unittest.mock import patch
+
+from pydantic import TypeAdapter
+
+from app.config.config import settings
+from app.schemas.task_tag import (
+    Tag,
+    TagResponseWithTasks,
+    Task,
+    TaskResponseWithTags,
+)
+from app.services.serialization import serialize
+
+
+def _make_rows():
+    tags = [Tag(id=1, tag="Work"), Tag(id=2, tag="Café ☕")]
+    tasks = [
+        Task(
+            id=1,
+            title="Report",
+            description='with "quotes"\nand a new line',
+            scheduled_for=datetime(2025, 6, 1, 9, 30, 0, 123456),
+            created_at=datetime(2025, 5, 1, 8, 0),
+            tags=tags,
+        ),
+        Task(id=2, title="No tags", created_at=datetime(2025, 5, 2, 8, 0, 1)),
+    ]
+    return tasks, tags
+
+
+def _validated(content, response_model) -> bytes:
+    # FastAPI's path: the rows are validated into the response model, then encoded
+    adapter = TypeAdapter(response_model)
+    return adapter.dump_json(adapter.validate_python(content, from_attributes=True))
+
+
+def test_fast_json_matches_the_response_models():
+    tasks, tags = _make_rows()
+    cases = [
+        (tasks, list[TaskResponseWithTags]),
+        (tasks[0], TaskResponseWithTags),
+        (tags, list[TagResponseWithTasks]),
+        ([], list[TaskResponseWithTags]),
+    ]
+    for content, response_model in cases:
+        assert serialize(content, response_model) == _validated(content, response_model)
+
+
+def test_fast_json_off():
+    tasks, _ = _make_rows()
+    with patch.object(settings, "FAST_JSON", False):
+        body = serialize(tasks, list[TaskResponseWithTags])
+    assert body == _validated(tasks, list[TaskResponseWithTags])
@@ -0,0 +1,48 @@
+import asyncio
+from unittest.mock import patch
+
+from app.services.smart_tag_cache import SmartTagCache, get_default_cache_path
+
+
+def test_cache_key_normalization():
+    key = SmartTagCache.make_key("Buy  Milk", None, ["Home", "food"], "v1")
+    assert key == SmartTagCache.make_key(" buy milk ", "", ["Food", "home"], "v1")
+    assert key != SmartTagCache.make_key("buy milk", "", ["home"], "v1")
+    assert key != SmartTagCache.make_key("buy milk", "", ["food", "home"], "v2")
+
+
+def test_cache_hit_miss_and_ttl(tmp_path):
+    cache = SmartTagCache(path=str(tmp_path / "cache.db"), ttl=60, max_entries=10)
+
+    async def run():
+        assert await cache.get("k") is None
+        await cache.put("k", '{"tag_name": "Work", "is_new": false}')
+        assert await cache.get("k") == '{"tag_name": "Work", "is_new": false}'
+        # Expired entries are misses
+        with patch("app.services.smart_tag_cache.time.time", return_value=1e12):
+            assert await cache.get("k") is None
+
+    asyncio.run(run())
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_cache_lru_eviction(tmp_path):
+    cache = SmartTagCache(path=str(tmp_path / "cache.db"), ttl=60, max_entries=2)
+
+    async def run():
+        await cache.put("a", "A")
+        await cache.put("b", "B")
+        await cache.get("a")  # "b" is now the least recently used
+        await cache.put("c", "C")
+        return [await cache.get(key) for key in ("a", "b", "c")]
+
+    with patch("app.services.smart_tag_cache.time.time", side_effect=range(100, 200)):
+        assert asyncio.run(run()) == ["A", None, "C"]
+
+
+def test_cache_persists_and_default_path(tmp_path):
+    path = str(tmp_path / "cache.db")
+    asyncio.run(SmartTagCache(path=path, ttl=60, max_entries=10).put("k", "v"))
+    assert asyncio.run(SmartTagCache(path=path, ttl=60, max_entries=10).get("k")) == "v"
+    assert get_default_cache_path("sqlite:///data/todo.db") == "data/llm_cache.db"
+    assert get_default_cache_path("postgresql://db/todo") == "data/llm_cache.db"
@@ -0,0 +1,100 @@
+from unittest.mock import patch
+
+import numpy as np
+
+from app.services.tag_index import (
+    WORD_PATTERN,
+    TagIndex,
+    char_ngrams,
+    get_tag_index,
+    preselect,
+)
+
+
+def test_rank_tags():
+    index = TagIndex(["Work", "Machine Learning", "Home", "Sport"])
+    ranked = index.rank("Read a machine learning paper for work")
+    assert {name for name, score in ranked if score > 0.99} == {
+        "Work",
+        "Machine Learning",
+    }
+    assert ranked[-1][1] < 0.5
+    # Typos and inflections still score close to the tag
+    assert index.rank("sports day")[0][0] == "Sport"
+    assert index.rank("nothing relevant here")[0][1] < 0.5
+
+
+def test_rank_excludes_current_tags():
+    index = TagIndex(["Work", "Home"])
+    assert [name for name, _ in index.rank("work", exclude={"work"})] == ["Home"]
+
+
+def test_rank_limit():
+    index = TagIndex(["Work", "Home", "Sport", "Garden"])
+    # The matching tags first, then the others in the vocabulary order
+    assert [name for name, _ in index.rank("gardening", limit=3)] == [
+        "Garden",
+        "Work",
+        "Home",
+    ]
+    assert index.rank("gardening", exclude={"garden"}, limit=1) == [("Work", 0.0)]
+
+
+def _brute_force_scores(names: list[str], text: str) -> np.ndarray:
+    # The definition: TF-IDF trigram vectors, the best cosine similarity over the words and word pairs
+    grams = sorted({gram for name in names for gram in char_ngrams(name.casefold())})
+    column = {gram: i for i, gram in enumerate(grams)}
+
+    def vectorize(texts):
+        counts = np.zeros((len(texts), len(grams)))
+        for row, unit in enumerate(texts):
+            for gram in char_ngrams(unit):
+                if gram in column:
+                    counts[row, column[gram]] += 1
+        return counts
+
+    tags = vectorize([name.casefold() for name in names])
+    idf = np.log((1 + len(names)) / (1 + (tags > 0).sum(axis=0))) + 1
+    words = WORD_PATTERN.findall(text.casefold())
+    units = vectorize(words + [f"{a} {b}" for a, b in zip(words, words[1:])]) * idf
+    tags = tags * idf
+    tags /= np.linalg.norm(tags, axis=1, keepdims=True)
+    norms = np.linalg.norm(units, axis=1, keepdims=True)
+    units = np.divide(units, norms, out=np.zeros_like(units), where=norms > 0)
+    return (units @ tags.T).max(axis=0)
+
+
+def test_scores_match_the_brute_force_similarity():
+    names = ["Work", "Machine Learning", "Home", "Sport", "Home Work", "Garden"]
+    index = TagIndex(names)
+    for text in ["Do the homework then go to the garden", "sport sport sport", "x"]:
+        np.testing.assert_allclose(
+            index.scores(text), _brute_force_scores(names, text), atol=1e-6
+        )
+
+
+def test_scored_units_capped():
+    index = TagIndex(["Work", "Garden"])
+    # Repeated words are scored once, the units past the cap not at all
+    assert index.scores("work " * 10_000)[0] > 0.99
+    with patch.object(TagIndex, "MAX_UNITS", 4):
+        scores = index.scores("one two three four garden")
+    assert scores[1] < 0.5
+
+
+def test_empty_index():
+    assert TagIndex([]).rank("anything") == []
+    assert preselect([], top_k=5, threshold=0.9) == (None, [])
+
+
+def test_preselect():
+    ranked = [("Work", 0.97), ("Home", 0.4), ("Sport", 0.1)]
+    assert preselect(ranked, top_k=2, threshold=0.95) == ("Work", [])
+    # A threshold above 1 never skips the LLM
+    assert preselect(ranked, top_k=2, threshold=1.01) == (None, ["Work", "Home"])
+
+
+def test_index_rebuilt_on_vocabulary_change():
+    index = get_tag_index(["Work"], "v1")
+    assert get_tag_index(["Work"], "v1") is index
+    assert get_tag_index(["Work", "Home"], "v2").names == ["Work", "Home"]
@@ -1,2 +1,2 @@
 #! /bin/bash
-docker compose --env-file ./backend/.env --env-file ./frontend/.env -f docker-compose.yml -f docker-compose.prod.yml up -d --build
\ No newline at end of file
+docker compose --env-file ./backend/.env --env-file ./frontend/.env -f compose.yml -f compose.prod.yml up -d --build
\ No newline at end of file